@@ -2,20 +2,30 @@
 Flask Web Application for MachineLearningStocks
 Provides a full-stack interface for stock prediction and backtesting
 Supports both US (S&P 500) and Indian (NIFTY 50) stock markets
+Set PREWARM=1 to load the data and the model in a background thread when the app starts;
+/api/ready reports when they are loaded. sklearn is only imported when it is first needed.
 """
 
+import time
+
+# Start of the app's import, to measure the cold start
+STARTED_AT = time.perf_counter()
+
 from flask import Flask, render_template, jsonify, request
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import precision_score, accuracy_score
-from utils import status_calc
-import plotly.graph_objs as go
-import plotly.utils
+import pandas as pd
+from feature_store import FeatureStore
+import storage
+import model_registry
+import model_factory
+import portfolio
+import predictions
+import jobs
+from cache_manager import CacheManager
 import json
 import os
+import threading
 
 app = Flask(__name__)
 CORS(app)
@@ -45,75 +55,113 @@ MARKET_CONFIG = {
 # Get current market config
 config = MARKET_CONFIG.get(MARKET, MARKET_CONFIG['INDIAN'])
 
-# Global variables to cache models
-cached_model = None
-cached_data = None
+# Cached training data, features, model and forward sample, shared by all of the request threads.
+# Each is loaded once per version of its files, see load_data, load_features, load_model and load_forward.
+cache = CacheManager()
+
+# Scores of the forward sample's tickers, cached per model and forward sample version
+predictor = predictions.Predictor(cache_size=int(os.environ.get('PREDICTION_CACHE_SIZE', 4096)))
+
+# Backtests run in the background, and are memoized by their inputs (the most recently used
+# BACKTEST_RESULTS results are kept)
+backtest_jobs = jobs.JobQueue(
+    max_workers=int(os.environ.get('BACKTEST_WORKERS', 2)),
+    max_finished=int(os.environ.get('BACKTEST_RESULTS', 256))
+)
 
 # Optimized outperformance threshold for high precision (25% instead of 10%)
 # This ensures we only predict stocks that significantly outperform the market
-OUTPERFORMANCE = 25
+# Both thresholds can be set from the environment, e.g with values chosen by parameter_sweep.py
+OUTPERFORMANCE = float(os.environ.get('OUTPERFORMANCE', 25))
 
 # Minimum probability threshold for predictions (70% confidence required)
 # This filters out low-confidence predictions and reduces false positives
-MIN_PROBABILITY_THRESHOLD = 0.70
+MIN_PROBABILITY_THRESHOLD = float(os.environ.get('MIN_PROBABILITY_THRESHOLD', 0.70))
+
+# Improved Random Forest with better hyperparameters for higher precision
+MODEL_PARAMS = model_factory.PROFILES['high_precision']
+
+
+def training_data_version():
+    """The training data file in use, and its modification time"""
+    keystats_file = config['keystats_file']
+    if not os.path.exists(keystats_file):
+        keystats_file = "keystats.csv"
+    return keystats_file, os.path.getmtime(keystats_file) if os.path.exists(keystats_file) else None
+
+
+def read_training_data():
+    keystats_file = config['keystats_file']
+    if os.path.exists(keystats_file):
+        data = storage.load_keystats(keystats_file)
+        # Only drop rows where core columns are missing (not fundamental features)
+        core_cols = ['Date', 'Unix', 'Ticker', 'Price', 'stock_p_change', config['index_column']]
+        data.dropna(subset=core_cols, inplace=True)
+        # Set Date as index if it exists
+        if 'Date' in data.columns:
+            data = data.set_index('Date')
+    else:
+        # Fallback to US data if Indian data not available
+        data = storage.load_keystats("keystats.csv", index_col="Date")
+        data.dropna(axis=0, how="any", inplace=True)
+    return data
 
 
 def load_data():
-    """Load and cache the training data"""
-    global cached_data
-    if cached_data is None:
-        keystats_file = config['keystats_file']
-        if os.path.exists(keystats_file):
-            cached_data = pd.read_csv(keystats_file)
-            # Only drop rows where core columns are missing (not fundamental features)
-            core_cols = ['Date', 'Unix', 'Ticker', 'Price', 'stock_p_change', config['index_column']]
-            cached_data.dropna(subset=core_cols, inplace=True)
-            # Set Date as index if it exists
-            if 'Date' in cached_data.columns:
-                cached_data = cached_data.set_index('Date')
-        else:
-            # Fallback to US data if Indian data not available
-            cached_data = pd.read_csv("keystats.csv", index_col="Date")
-            cached_data.dropna(axis=0, how="any", inplace=True)
-    return cached_data
+    """The training data, reloaded when the file changes. The dataframe is shared: do not modify it."""
+    return cache.get('data', training_data_version(), read_training_data)
 
 
-def train_model():
-    """Train and cache the ML model"""
-    global cached_model
-    if cached_model is None:
+def load_features():
+    """
+    The feature matrix (with NaN features filled with 0), labels and returns of the training data,
+    built once per version of the data and shared, read-only, by training, prediction and backtests.
+    """
+    def build():
         data = load_data()
-        features = data.columns[6:]
-        
-        # Fill NaN values in features with 0
-        data[features] = data[features].fillna(0)
-        
-        X_train = data[features].values
-        
         # Use the appropriate index column based on market
         index_col = config['index_column']
         if index_col not in data.columns:
             index_col = 'SP500_p_change'  # Fallback
-        
-        y_train = list(
-            status_calc(
-                data["stock_p_change"],
-                data[index_col],
-                OUTPERFORMANCE,
-            )
-        )
-        # Improved Random Forest with better hyperparameters for higher precision
-        cached_model = RandomForestClassifier(
-            n_estimators=200,  # More trees for better accuracy
-            max_depth=10,  # Limit depth to prevent overfitting
-            min_samples_split=20,  # Require more samples to split
-            min_samples_leaf=10,  # Require more samples in leaf nodes
-            max_features='sqrt',  # Use sqrt of features for each split
-            class_weight='balanced',  # Handle class imbalance
-            random_state=42
-        )
-        cached_model.fit(X_train, y_train)
-    return cached_model
+        return FeatureStore(data, index_column=index_col)
+
+    return cache.get('features', training_data_version(), build)
+
+
+def fit_model():
+    """
+    :return: the model for the current training data, its model registry key and the FeatureStore
+             it was trained on
+    """
+    store = load_features()
+    X_train = store.X
+    y_train = store.labels(OUTPERFORMANCE)
+    key = model_registry.fingerprint(
+        X_train, y_train, MODEL_PARAMS, outperformance=OUTPERFORMANCE
+    )
+    model = model_factory.use_n_jobs(model_registry.load_or_train(
+        'app-' + MARKET.lower(), key,
+        lambda: model_factory.build_classifier(MODEL_PARAMS).fit(X_train, y_train)
+    ))
+    return model, key, store
+
+
+def load_model():
+    """
+    Train and cache the ML model. Fitted models are also stored on disk, keyed by a fingerprint
+    of the training data, hyperparameters and OUTPERFORMANCE, so a restarted process or a new
+    worker loads the model instead of refitting it.
+    Only one thread trains the model; the others wait for it. When the training data changes, the
+    previous model is served until the new one is ready.
+    :return: (model, model registry key, FeatureStore the model was trained on), which are consistent
+             with each other even while a new model is swapped in
+    """
+    return cache.get('model', training_data_version(), fit_model, stale_ok=True)
+
+
+def train_model():
+    """Train (or load) and cache the ML model"""
+    return load_model()[0]
 
 
 @app.route('/')
@@ -125,142 +173,245 @@ def index():
                          currency=config['currency'])
 
 
+def records(df):
+    """
+    :return: the rows of a dataframe indexed by date, as JSON-serialisable dicts (NaN becomes None)
+    """
+    df = df.astype(float).replace({np.nan: None})
+    return [
+        dict(period=str(period.date()), **row)
+        for period, row in zip(df.index, df.to_dict('records'))
+    ]
+
+
+def run_backtest(X, y, z, dates, tickers, params, threshold, window, weighting):
+    """
+    Walk-forward backtest: every year is predicted by a model trained only on earlier data, and a
+    portfolio of its confident predictions is held for the year.
+    :param params: the RandomForest hyperparameters
+    :param threshold: minimum predicted probability for a stock to be bought
+    :param window: number of years to train on, or None for all earlier years
+    :param weighting: 'equal' or 'probability' weighting of the portfolio
+    :return: dict of the backtest's metrics over all years, the portfolio's risk metrics, and the
+             metrics of each year
+    """
+    # walk_forward imports sklearn, so it is only imported when a backtest runs
+    import walk_forward
+
+    folds, probabilities = walk_forward.walk_forward_predict(X, y, dates, params, window=window)
+    results = walk_forward.score_folds(folds, probabilities, y, z, threshold)
+    summary = walk_forward.summarize(results)
+    summary['by_period'] = records(results)
+
+    tested = ~np.isnan(probabilities)
+    periods = portfolio.simulate(
+        dates[tested], tickers[tested], z[tested, 0], z[tested, 1],
+        probabilities[tested] >= threshold, probabilities[tested], weighting=weighting
+    )
+    summary['portfolio'] = portfolio.risk_metrics(periods)
+    summary['portfolio_by_period'] = records(periods)
+    return summary
+
+
+def backtest_options(options):
+    """
+    :param options: dict-like with optional 'threshold', 'window' and 'weighting' values, e.g the
+                    query string of a request
+    :return: the threshold, window (None for an expanding window) and weighting of a backtest.
+             Raises ValueError if they are not valid.
+    """
+    try:
+        threshold = float(options.get('threshold', MIN_PROBABILITY_THRESHOLD))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid threshold: {options.get('threshold')}")
+    if not 0 <= threshold <= 1:
+        raise ValueError('threshold must be a probability between 0 and 1')
+    window = options.get('window')
+    if window is not None:
+        try:
+            window = int(window)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid window: {window}')
+        if window < 1:
+            raise ValueError('window must be a positive number of years')
+    weighting = options.get('weighting', 'equal')
+    if weighting not in ('equal', 'probability'):
+        raise ValueError(f'Unknown weighting: {weighting}')
+    return threshold, window, weighting
+
+
+def submit_backtest(threshold, window, weighting):
+    """
+    Start a backtest job, or find the one already run with the same inputs.
+    :param threshold, window, weighting: see backtest_options
+    :return: the Job
+    """
+    store = load_features()
+    key = (
+        store.fingerprint, OUTPERFORMANCE, json.dumps(MODEL_PARAMS, sort_keys=True),
+        threshold, window, weighting
+    )
+    return backtest_jobs.submit(
+        key, run_backtest, store.X, store.labels(OUTPERFORMANCE), store.returns, store.dates,
+        store.tickers, MODEL_PARAMS, threshold, window, weighting
+    )
+
+
 @app.route('/api/backtest', methods=['GET'])
 def backtest():
-    """Run backtesting and return results"""
+    """Run backtesting (or reuse the result of an identical backtest) and return results"""
     try:
-        data = load_data()
-        features = data.columns[6:]
-        
-        # Fill NaN values in features with 0
-        data[features] = data[features].fillna(0)
-        
-        X = data[features].values
-        
-        # Use the appropriate index column based on market
-        index_col = config['index_column']
-        if index_col not in data.columns:
-            index_col = 'SP500_p_change'  # Fallback
-        
-        y = list(
-            status_calc(
-                data["stock_p_change"], data[index_col], OUTPERFORMANCE
-            )
-        )
-        z = np.array(data[["stock_p_change", index_col]])
-
-        # Split the data with stratification to maintain class balance
-        X_train, X_test, y_train, y_test, z_train, z_test = train_test_split(
-            X, y, z, test_size=0.2, random_state=42, stratify=y
-        )
-
-        # Train improved model
-        clf = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            min_samples_split=20,
-            min_samples_leaf=10,
-            max_features='sqrt',
-            class_weight='balanced',
-            random_state=42
-        )
-        clf.fit(X_train, y_train)
-
-        # Get probability predictions
-        y_proba = clf.predict_proba(X_test)
-        
-        # Only predict stocks with high confidence (>60% probability)
-        y_pred = np.zeros(len(y_test), dtype=int)
-        y_pred[y_proba[:, 1] >= MIN_PROBABILITY_THRESHOLD] = 1
-        
-        accuracy = accuracy_score(y_test, y_pred)
-        precision = precision_score(y_test, y_pred, zero_division=0)
-
-        # Calculate returns
-        stock_returns = []
-        market_returns = []
-        for i in range(len(y_pred)):
-            if y_pred[i] == 1:
-                stock_returns.append((z_test[i][0] / 100) + 1)
-                market_returns.append((z_test[i][1] / 100) + 1)
-
-        num_positive_predictions = len(stock_returns)
-        if num_positive_predictions > 0:
-            avg_stock_return = (sum(stock_returns) / num_positive_predictions - 1) * 100
-            avg_market_return = (sum(market_returns) / num_positive_predictions - 1) * 100
-            outperformance = avg_stock_return - avg_market_return
-        else:
-            avg_stock_return = 0
-            avg_market_return = 0
-            outperformance = 0
+        options = backtest_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job = submit_backtest(*options)
+        job.finished.wait()
+        if job.status == jobs.FAILED:
+            return jsonify({'error': job.error}), 500
+        return jsonify(job.result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({
-            'accuracy': float(accuracy),
-            'precision': float(precision),
-            'total_trades': num_positive_predictions,
-            'avg_stock_return': float(avg_stock_return),
-            'avg_market_return': float(avg_market_return),
-            'outperformance': float(outperformance)
-        })
+
+@app.route('/api/backtest/jobs', methods=['POST'])
+def create_backtest_job():
+    """Start a backtest in the background and return its job ID"""
+    try:
+        options = backtest_options(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job = submit_backtest(*options)
+        return jsonify(job.to_dict()), 200 if job.status == jobs.DONE else 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/backtest/jobs/<job_id>', methods=['GET'])
+def backtest_job_status(job_id):
+    """Get the status of a backtest job"""
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/backtest/jobs/<job_id>/result', methods=['GET'])
+def backtest_job_result(job_id):
+    """Get the results of a backtest job (202 while it is still running)"""
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status == jobs.FAILED:
+        return jsonify(job.to_dict()), 500
+    if job.status != jobs.DONE:
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
+
+
+def forward_file_path():
+    """The forward sample file in use"""
+    forward_file = config['forward_file']
+    if not os.path.exists(forward_file):
+        forward_file = "forward_sample.csv"  # Fallback
+    return forward_file
+
+
+def load_forward(store):
+    """
+    The forward sample's feature matrix, built once per version of the forward file and of the
+    training features.
+    :param store: the FeatureStore of the model which will score the forward sample
+    """
+    forward_file = forward_file_path()
+    version = (store.fingerprint, forward_file, os.path.getmtime(forward_file))
+    return cache.get('forward', version, lambda: predictions.ForwardSample.from_frame(
+        storage.load_forward_sample(forward_file), store, version
+    ))
+
+
+def prediction(ticker, probability):
+    return {
+        'ticker': ticker,
+        'probability': probability,
+        'predicted': probability >= MIN_PROBABILITY_THRESHOLD
+    }
+
+
 @app.route('/api/predict', methods=['GET'])
 def predict():
     """Generate stock predictions"""
     try:
         # Train model
-        model = train_model()
-        
-        # Load forward data
-        forward_file = config['forward_file']
-        if not os.path.exists(forward_file):
-            forward_file = "forward_sample.csv"  # Fallback
-        
-        forward_data = pd.read_csv(forward_file)
-        if "Date" in forward_data.columns:
-            forward_data = forward_data.set_index("Date")
-        
-        # Only drop rows where Ticker is missing, keep rows with NaN features
-        forward_data = forward_data[forward_data["Ticker"].notna()]
-        
-        # Get features from training data to match
-        training_data = load_data()
-        features = training_data.columns[6:]
-        
-        # Fill NaN values in features with 0 for prediction
-        forward_data[features] = forward_data[features].fillna(0)
-        
-        X_test = forward_data[features].values
-        tickers = forward_data["Ticker"].values
+        model, model_key, store = load_model()
+        forward = load_forward(store)
+
+        # Get prediction probabilities of every ticker (cached per model and forward sample version)
+        scores = predictor.predict_tickers(model, model_key, forward, forward.tickers)
+
+        # Only predict stocks with high confidence
+        predicted_stocks = [
+            ticker for ticker in forward.tickers if scores[ticker] >= MIN_PROBABILITY_THRESHOLD
+        ]
+
+        # Create detailed predictions, sorted by probability
+        predictions_list = [
+            {'ticker': ticker, 'probability': scores[ticker]}
+            for ticker in sorted(set(predicted_stocks), key=scores.get, reverse=True)
+        ]
 
-        # Get prediction probabilities first
-        y_proba = model.predict_proba(X_test)
-        
-        # Only predict stocks with high confidence (>60% probability)
-        y_pred = np.zeros(len(X_test), dtype=int)
-        y_pred[y_proba[:, 1] >= MIN_PROBABILITY_THRESHOLD] = 1
-        
-        # Get predicted stocks
-        predicted_stocks = tickers[y_pred == 1].tolist()
-        
-        # Create detailed predictions
-        predictions = []
-        for i, ticker in enumerate(tickers):
-            if y_pred[i] == 1:
-                predictions.append({
-                    'ticker': ticker,
-                    'probability': float(y_proba[i][1])
-                })
-        
-        # Sort by probability
-        predictions.sort(key=lambda x: x['probability'], reverse=True)
-        
         return jsonify({
             'total_stocks': len(predicted_stocks),
             'predicted_stocks': predicted_stocks,
-            'detailed_predictions': predictions
+            'detailed_predictions': predictions_list
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/predict/<ticker>', methods=['GET'])
+def predict_ticker(ticker):
+    """Get the prediction for one ticker of the forward sample"""
+    try:
+        model, model_key, store = load_model()
+        scores = predictor.predict_tickers(model, model_key, load_forward(store), [ticker])
+        if ticker not in scores:
+            return jsonify({'error': f'Unknown ticker: {ticker}'}), 404
+        return jsonify(prediction(ticker, scores[ticker]))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Get the predictions for a list of tickers of the forward sample, {"tickers": [...]}, or for raw
+    feature vectors, {"features": [...]}, given as lists in the order of the training features or
+    as dicts mapping feature names to values (missing features are filled with 0).
+    All of the uncached rows are scored with one predict_proba call.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        model, model_key, store = load_model()
+        if 'features' in body:
+            rows = [
+                row if isinstance(row, dict) else dict(zip(store.features, row))
+                for row in body['features']
+            ]
+            X = store.matrix(pd.DataFrame(rows, columns=store.features, dtype=float))
+            probabilities = predictions.outperform_probabilities(model, X) if len(X) else []
+            return jsonify({
+                'predictions': [
+                    dict(prediction(None, p), row=i) for i, p in enumerate(map(float, probabilities))
+                ]
+            })
+
+        tickers = [str(ticker) for ticker in body.get('tickers', [])]
+        scores = predictor.predict_tickers(model, model_key, load_forward(store), tickers)
+        return jsonify({
+            'predictions': [prediction(t, scores[t]) for t in tickers if t in scores],
+            'unknown_tickers': [t for t in tickers if t not in scores]
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -270,9 +421,8 @@ def predict():
 def feature_importance():
     """Get feature importance from the trained model"""
     try:
-        model = train_model()
-        data = load_data()
-        features = data.columns[6:]
+        model, _, store = load_model()
+        features = store.features
         
         importances = model.feature_importances_
         
@@ -306,15 +456,17 @@ def dataset_info():
         if not os.path.exists(forward_file):
             forward_file = "forward_sample.csv"
         
-        forward_data = pd.read_csv(forward_file)
+        forward_data = storage.load_forward_sample(forward_file)
         
-        # Get date range info
-        if hasattr(data.index, 'min'):
+        # Get date range info, formatted as in the CSV file (the dates are parsed when they are loaded)
+        dates = data.index if 'Date' not in data.columns else pd.DatetimeIndex(data['Date'])
+        if isinstance(dates, pd.DatetimeIndex):
+            date_format = storage.csv_date_format(dates)
+            date_start = dates.min().strftime(date_format)
+            date_end = dates.max().strftime(date_format)
+        elif hasattr(data.index, 'min'):
             date_start = str(data.index.min())
             date_end = str(data.index.max())
-        elif 'Date' in data.columns:
-            date_start = str(data['Date'].min())
-            date_end = str(data['Date'].max())
         else:
             date_start = "N/A"
             date_end = "N/A"
@@ -335,6 +487,43 @@ def dataset_info():
         return jsonify({'error': str(e)}), 500
 
 
+def prewarm():
+    """Load the training data, the model and the forward sample, and record how long it took"""
+    warmup['status'] = 'warming'
+    try:
+        load_forward(load_model()[2])
+        warmup['status'] = 'ready'
+    except Exception as e:
+        warmup['status'] = 'failed'
+        warmup['error'] = str(e)
+    warmup['seconds'] = time.perf_counter() - STARTED_AT
+    app.logger.warning(
+        f"Prewarm {warmup['status']} {warmup['seconds']:.1f}s after start "
+        f"(import took {IMPORT_SECONDS:.2f}s)"
+    )
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness check: 200 once the data and the model are loaded, else 503"""
+    warm = cache.peek('model') is not None and cache.peek('forward') is not None
+    return jsonify({
+        'ready': warm,
+        'status': 'ready' if warm else warmup['status'],
+        'error': warmup['error'],
+        'import_seconds': IMPORT_SECONDS,
+        'warmup_seconds': warmup['seconds']
+    }), 200 if warm else 503
+
+
+# Load the caches in the background at startup, so that the first request does not pay for it
+PREWARM = os.environ.get('PREWARM', '0') == '1'
+warmup = {'status': 'cold', 'seconds': None, 'error': None}
+IMPORT_SECONDS = time.perf_counter() - STARTED_AT
+if PREWARM:
+    threading.Thread(target=prewarm, name='prewarm', daemon=True).start()
+
+
 if __name__ == '__main__':
     print("Starting MachineLearningStocks Web Application...")
     print("Access the application at: http://localhost:5000")
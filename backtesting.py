@@ -1,86 +1,113 @@
 # Preprocessing
+import argparse
+
 import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import precision_score
-from utils import status_calc
+import model_factory
+from feature_store import FeatureStore
+import walk_forward
+import portfolio
 
 
-def backtest():
+def backtest(window=None, warm_start=False, weighting="equal"):
     """
-    A simple backtest, which splits the dataset into a train set and test set,
-    then fits a Random Forest classifier to the train set. We print the precision and accuracy
-    of the classifier on the test set, then run a backtest comparing this strategy's performance
-    to passive investment in the S&P500.
-    Please note that there is a methodological flaw in this backtest which will give deceptively
-    good results, so the results here should not encourage you to live trade.
+    A walk-forward backtest: the dataset is ordered by date and split into years, and each year is
+    predicted by a Random Forest classifier trained only on the stocks whose returns were already
+    known at the start of that year, on an expanding window (or the last `window` years).
+    We print the precision and accuracy of the classifier on every out-of-sample year, then compare
+    this strategy's returns in each year to passive investment in the S&P500, and the risk of holding
+    an (equal or probability weighted) portfolio of the predicted stocks for each year.
     """
     # Build the dataset, and drop any rows with missing values
-    data_df = pd.read_csv("keystats.csv", index_col="Date")
-    data_df.dropna(axis=0, how="any", inplace=True)
-
-    features = data_df.columns[6:]
-    X = data_df[features].values
+    store = FeatureStore.load("keystats.csv")
+    X = store.X
 
-    # The labels are generated by applying the status_calc to the dataframe.
+    # The labels are generated from the returns (see labels.outperformed):
     # '1' if a stock beats the S&P500 by more than x%, else '0'. Here x is the
     # outperformance parameter, which is set to 10 by default but can be redefined.
-    y = list(
-        status_calc(
-            data_df["stock_p_change"], data_df["SP500_p_change"], outperformance=10
-        )
-    )
+    y = store.labels(outperformance=10)
 
     # z is required for us to track returns
-    z = np.array(data_df[["stock_p_change", "SP500_p_change"]])
+    z = store.returns
 
-    # Generate the train set and test set by randomly splitting the dataset
-    X_train, X_test, y_train, y_test, z_train, z_test = train_test_split(
-        X, y, z, test_size=0.2
+    # Fit a RandomForestClassifier with 100 trees for every year, then predict that year
+    folds, probabilities = walk_forward.walk_forward_predict(
+        X,
+        y,
+        store.dates,
+        model_factory.PROFILES["baseline"],
+        window=window,
+        warm_start=warm_start,
     )
+    results = walk_forward.score_folds(folds, probabilities, y, z)
+    if results.empty:
+        print("Not enough data for a walk-forward backtest!")
+        return results
 
-    # Instantiate a RandomForestClassifier with 100 trees, then fit it to the training data
-    clf = RandomForestClassifier(n_estimators=100, random_state=0)
-    clf.fit(X_train, y_train)
-
-    # Generate the predictions, then print test set accuracy and precision
-    y_pred = clf.predict(X_test)
-    print("Classifier performance\n", "=" * 20)
-    print(f"Accuracy score: {clf.score(X_test, y_test): .2f}")
-    print(f"Precision score: {precision_score(y_test, y_pred): .2f}")
-
-    # Because y_pred is an array of 1s and 0s, the number of positive predictions
-    # is equal to the sum of the array
-    num_positive_predictions = sum(y_pred)
-    if num_positive_predictions < 0:
-        print("No stocks predicted!")
-
-    # Recall that z_test stores the change in stock price in column 0, and the
-    # change in S&P500 price in column 1.
-    # Whenever a stock is predicted to outperform (y_pred = 1), we 'buy' that stock
-    # and simultaneously `buy` the index for comparison.
-    stock_returns = 1 + z_test[y_pred, 0] / 100
-    market_returns = 1 + z_test[y_pred, 1] / 100
-
-    # Calculate the average growth for each stock we predicted 'buy'
-    # and the corresponding index growth
-    avg_predicted_stock_growth = sum(stock_returns) / num_positive_predictions
-    index_growth = sum(market_returns) / num_positive_predictions
-    percentage_stock_returns = 100 * (avg_predicted_stock_growth - 1)
-    percentage_market_returns = 100 * (index_growth - 1)
-    total_outperformance = percentage_stock_returns - percentage_market_returns
+    # Whenever a stock is predicted to outperform, we 'buy' that stock and simultaneously
+    # `buy` the index for comparison. Returns are the average over the year's trades.
+    print("Out-of-sample performance by year\n", "=" * 40)
+    print(
+        results[
+            ["n_train", "n_test", "n_trades", "accuracy", "precision",
+             "stock_return", "market_return", "excess_return"]
+        ].to_string(float_format=lambda x: f"{x:.2f}")
+    )
 
+    summary = walk_forward.summarize(results)
     print("\n Stock prediction performance report \n", "=" * 40)
-    print(f"Total Trades:", num_positive_predictions)
-    print(f"Average return for stock predictions: {percentage_stock_returns: .1f} %")
+    print(f"Total Trades:", summary["total_trades"])
+    print(f"Precision score: {summary['precision']: .2f}")
+    print(f"Average return for stock predictions: {summary['avg_stock_return']: .1f} %")
     print(
-        f"Average market return in the same period: {percentage_market_returns: .1f}% "
+        f"Average market return in the same period: {summary['avg_market_return']: .1f}% "
     )
     print(
-        f"Compared to the index, our strategy earns {total_outperformance: .1f} percentage points more"
+        f"Compared to the index, our strategy earns {summary['outperformance']: .1f} percentage points more"
+    )
+
+    # Hold a portfolio of each year's predicted stocks for a year
+    tested = ~np.isnan(probabilities)
+    periods = portfolio.simulate(
+        store.dates[tested],
+        store.tickers[tested],
+        z[tested, 0],
+        z[tested, 1],
+        probabilities[tested] >= 0.5,
+        probabilities[tested],
+        weighting=weighting,
     )
+    metrics = portfolio.risk_metrics(periods)
+    print("\n Portfolio report \n", "=" * 40)
+    print(f"Cumulative return: {metrics['cumulative_return']: .1f}%")
+    print(f"Cumulative index return: {metrics['index_cumulative_return']: .1f}%")
+    print(f"Maximum drawdown: {metrics['max_drawdown']: .1f}%")
+    print(f"Sharpe ratio: {metrics['sharpe']: .2f}")
+    print(f"Hit rate: {metrics['hit_rate']: .2f}")
+    print(f"Average turnover: {metrics['turnover']: .2f}")
+    return results
 
 
 if __name__ == "__main__":
-    backtest()
+    parser = argparse.ArgumentParser(description="Backtest the stock prediction strategy.")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="train on the WINDOW years of rows before each test year whose labels are known, i.e "
+        "ending a year before it (default: all of them)",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="grow one forest by adding trees for each year, instead of refitting",
+    )
+    parser.add_argument(
+        "--weighting",
+        choices=["equal", "probability"],
+        default="equal",
+        help="weighting of the stocks in the portfolio",
+    )
+    model_factory.add_n_jobs_argument(parser)
+    args = parser.parse_args()
+    model_factory.set_default_n_jobs(args.n_jobs)
+    backtest(window=args.window, warm_start=args.warm_start, weighting=args.weighting)
@@ -0,0 +1,62 @@
+"""
+Cold start of the web app, each case in a fresh process: the import time of app.py, and the latency
+of the first /api/predict request without prewarming and after PREWARM=1 reports ready, with an empty
+and with a populated model directory. Run from the repository root:
+python benchmarks/bench_cold_start.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+client = app.app.test_client()
+ready = None
+if app.PREWARM:
+    while client.get('/api/ready').status_code != 200 and app.warmup['status'] != 'failed':
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+request_start = time.perf_counter()
+status = client.get('/api/predict').status_code
+print(json.dumps({'import': imported, 'ready': ready, 'first_request': time.perf_counter() - request_start,
+                  'status': status}))
+"""
+
+
+def run(prewarm, model_dir):
+    env = dict(os.environ, PREWARM="1" if prewarm else "0", MODEL_DIR=model_dir)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as model_dir:
+        for registry in ["empty", "populated"]:
+            for prewarm in [False, True]:
+                if registry == "empty":
+                    for name in os.listdir(model_dir):
+                        os.remove(os.path.join(model_dir, name))
+                result = run(prewarm, model_dir)
+                ready = f"ready after {result['ready']:5.2f} s" if prewarm else " " * 19
+                print(
+                    f"models {registry:9s} prewarm {'on ' if prewarm else 'off'} | "
+                    f"import {result['import']:5.2f} s {ready} | first /api/predict "
+                    f"{result['first_request'] * 1000:7.1f} ms (HTTP {result['status']})"
+                )
+            # Leave a trained model for the populated runs
+            run(False, model_dir)
+
+
+if __name__ == "__main__":
+    main()
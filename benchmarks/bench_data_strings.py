@@ -0,0 +1,84 @@
+"""
+Benchmark converting regex captures to floats: data_string_to_float called once per string versus
+data_strings_to_floats on the whole batch, and check that both produce identical values.
+Run from the repository root: python benchmarks/bench_data_strings.py
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import random_value  # noqa: E402
+from utils import data_string_to_float, data_strings_to_floats  # noqa: E402
+
+N_STRINGS = 1_000_000
+REPEATS = 3
+
+
+def captured_strings(n_strings, seed=0):
+    """
+    :return: n_strings regex captures, in the formats of synthetic snapshots. They are far more varied
+             than real captures, which repeat a lot: only about a fifth of the values in keystats.csv
+             are distinct.
+    """
+    rng = random.Random(seed)
+    captures = []
+    for _ in range(n_strings):
+        kind = rng.random()
+        if kind < 0.05:
+            captures.append(None)
+        elif kind < 0.1:
+            captures.append(">0")
+        else:
+            captures.append(random_value(rng).replace(",", "").rstrip("%"))
+    return captures
+
+
+def scalar(strings):
+    """
+    :return: the values of data_string_to_float, as the object array it leaves us with
+    """
+    return np.array(
+        ["N/A" if s is None else data_string_to_float(s) for s in strings], dtype=object
+    )
+
+
+def scalar_to_float64(strings):
+    """
+    :return: the values of data_string_to_float, with 'N/A' replaced to get a float64 array
+    """
+    return pd.Series(scalar(strings)).replace("N/A", np.nan).to_numpy(dtype=np.float64)
+
+
+def best_time(func, *args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    strings = captured_strings(N_STRINGS)
+
+    scalar_time, _ = best_time(scalar, strings)
+    float64_time, reference = best_time(scalar_to_float64, strings)
+    batch_time, values = best_time(data_strings_to_floats, strings)
+
+    np.testing.assert_array_equal(values, reference)
+
+    print(f"{N_STRINGS:,} strings ({len(set(strings)):,} distinct), best of {REPEATS}")
+    print(f"data_string_to_float per string:            {scalar_time:.3f} s")
+    print(f"data_string_to_float, then float64 array:   {float64_time:.3f} s")
+    print(f"data_strings_to_floats batch:               {batch_time:.3f} s")
+    print(f"Speedup: {scalar_time / batch_time:.1f}x ({float64_time / batch_time:.1f}x to float64)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark the vectorized consecutive duplicate audit against the original row-by-row duplicate_error_check
+loop, on keystats.csv. The loop is only timed on the first rows, as it takes minutes on the whole file.
+Run from the repository root: python benchmarks/bench_duplicate_check.py
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import utils  # noqa: E402
+
+LOOP_ROWS = 500
+REPEATS = 3
+
+
+def row_by_row(df):
+    """
+    :return: the rows reported by the original duplicate_error_check
+    """
+    df = df.drop(utils.DUPLICATE_CHECK_EXCLUDED_COLUMNS, axis=1)
+    reported = []
+    for i in range(len(df)):
+        if pd.Series(df.iloc[i] == df.iloc[i].shift()).any():
+            duplicates = set([x for x in list(df.iloc[i]) if list(df.iloc[i]).count(x) > 1])
+            if duplicates != {0}:
+                reported.append(i)
+    return reported
+
+
+def best_time(func, *args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    df = pd.read_csv("keystats.csv", index_col="Date")
+
+    vectorized_time, duplicates = best_time(utils.find_consecutive_duplicates, df)
+    loop_time, _ = best_time(row_by_row, df.iloc[:LOOP_ROWS])
+
+    print(f"{len(df)} rows, {len(df.columns)} columns, best of {REPEATS}")
+    print(f"{duplicates['row'].nunique()} rows with consecutive duplicates")
+    print(f"find_consecutive_duplicates: {vectorized_time * 1000:.1f} ms")
+    print(
+        f"Row-by-row loop: {loop_time:.2f} s for {LOOP_ROWS} rows, "
+        f"about {loop_time * len(df) / LOOP_ROWS:.0f} s for all of them"
+    )
+
+
+if __name__ == "__main__":
+    main()
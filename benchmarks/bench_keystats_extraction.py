@@ -0,0 +1,50 @@
+"""
+Benchmark the single-pass KeystatsExtractor against the original per-feature regex loop,
+and check that both produce identical values.
+Run from the repository root: python benchmarks/bench_keystats_extraction.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import parsing_keystats  # noqa: E402
+from keystats_extraction import (  # noqa: E402
+    KeystatsExtractor,
+    FALLBACK_LABELS,
+    extract_features_regex_loop,
+)
+from synthetic import make_keystats_html  # noqa: E402
+
+N_DOCUMENTS = 500
+
+
+def main():
+    rng = random.Random(0)
+    features = parsing_keystats.features
+    documents = [
+        make_keystats_html(features, rng).replace(",", "") for _ in range(N_DOCUMENTS)
+    ]
+
+    start = time.perf_counter()
+    reference = [extract_features_regex_loop(doc, features) for doc in documents]
+    loop_time = time.perf_counter() - start
+
+    extractor = KeystatsExtractor(features, fallbacks=FALLBACK_LABELS)
+    start = time.perf_counter()
+    single_pass = [extractor.extract(doc) for doc in documents]
+    single_pass_time = time.perf_counter() - start
+
+    assert single_pass == reference, "Parsed values differ from the per-feature regex loop"
+
+    print(f"{N_DOCUMENTS} documents, {len(features)} features")
+    print(f"Per-feature regex loop: {loop_time:.3f} s")
+    print(f"Single-pass extractor:  {single_pass_time:.3f} s")
+    print(f"Speedup: {loop_time / single_pass_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Fit and predict_proba time of the web app's classifier by number of jobs, on keystats.csv (or, if it
+is missing, a random dataset of the same shape). Run from the repository root:
+python benchmarks/bench_model_fit.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import model_factory  # noqa: E402
+import storage  # noqa: E402
+
+N_ROWS = 10000
+N_FEATURES = 40
+
+
+def load_dataset():
+    if os.path.exists("keystats.csv"):
+        df = storage.load_keystats("keystats.csv", index_col="Date").dropna()
+        X = df[df.columns[6:]].values
+        y = (df["stock_p_change"] - df["SP500_p_change"] > 10).values
+        return X, y
+    print(f"keystats.csv not found, using random data ({N_ROWS} x {N_FEATURES})")
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(N_ROWS, N_FEATURES)).astype(np.float32)
+    y = X[:, 0] + rng.normal(size=N_ROWS) > 1
+    return X, y
+
+
+def main():
+    X, y = load_dataset()
+    n_cores = os.cpu_count()
+    n_jobs_options = sorted({1, 2, 4, n_cores} & set(range(1, n_cores + 1)))
+    baseline = None
+    for n_jobs in n_jobs_options:
+        clf = model_factory.classifier("high_precision", n_jobs=n_jobs)
+        start = time.perf_counter()
+        clf.fit(X, y)
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        clf.predict_proba(X)
+        predict_time = time.perf_counter() - start
+        baseline = baseline or fit_time
+        print(
+            f"n_jobs={n_jobs:3d} fit {fit_time:6.2f} s (speedup {baseline / fit_time:4.1f}x) "
+            f"predict_proba {predict_time * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
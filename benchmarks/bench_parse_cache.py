@@ -0,0 +1,60 @@
+"""
+Measure rebuilding keystats.csv with the parse cache, on a synthetic intraQuarter tree: a first build
+which parses every file (and fills the cache), a rebuild without changes, and a rebuild after new
+snapshots of one ticker were written. Run from the repository root: python benchmarks/bench_parse_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import parsing_keystats  # noqa: E402
+from bench_parse_keystats import synthetic_prices  # noqa: E402
+from synthetic import write_keystats_tree  # noqa: E402
+
+N_TICKERS = 200
+N_SNAPSHOTS = 50
+N_WORKERS = 1
+
+
+def timed_build(sp500_df, stock_df, cache_path):
+    start = time.perf_counter()
+    df = parsing_keystats.parse_keystats(
+        sp500_df, stock_df, n_workers=N_WORKERS, cache_path=cache_path
+    )
+    return time.perf_counter() - start, df
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        statspath = os.path.join(tmp, "_KeyStats") + "/"
+        tickers = write_keystats_tree(
+            statspath, parsing_keystats.features, N_TICKERS, N_SNAPSHOTS, padding=50
+        )
+        sp500_df, stock_df = synthetic_prices(tickers)
+        parsing_keystats.statspath = statspath
+        os.chdir(tmp)
+        cache_path = os.path.join(tmp, "parse_cache.sqlite")
+
+        print(f"{N_TICKERS} tickers x {N_SNAPSHOTS} snapshots, {N_WORKERS} worker(s)")
+        uncached, reference = timed_build(sp500_df, stock_df, None)
+        print(f"Without the cache:  {uncached:.2f} s")
+        first, _ = timed_build(sp500_df, stock_df, cache_path)
+        print(f"First cached build: {first:.2f} s")
+        unchanged, df = timed_build(sp500_df, stock_df, cache_path)
+        print(f"No changes:         {unchanged:.2f} s")
+        assert df.equals(reference), "The cached build differs from parsing every file"
+
+        # New snapshots for the first ticker
+        write_keystats_tree(
+            statspath, parsing_keystats.features, 1, N_SNAPSHOTS, seed=1, padding=50
+        )
+        one_changed, _ = timed_build(sp500_df, stock_df, cache_path)
+        print(f"One ticker updated: {one_changed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Measure how parse_keystats scales with the number of worker processes, on a synthetic
+intraQuarter tree, parsing every file (without the parse cache).
+Run from the repository root: python benchmarks/bench_parse_keystats.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import parsing_keystats  # noqa: E402
+from synthetic import write_keystats_tree  # noqa: E402
+
+N_TICKERS = 64
+N_SNAPSHOTS = 40
+
+
+def synthetic_prices(tickers):
+    idx = pd.date_range("2003-01-01", "2015-01-01")
+    rng = np.random.default_rng(0)
+    walk = lambda: 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(idx))))  # noqa: E731
+    sp500_df = pd.DataFrame({"Adj Close": walk()}, index=idx)
+    stock_df = pd.DataFrame({t.upper(): walk() for t in tickers}, index=idx)
+    return sp500_df, stock_df
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        statspath = os.path.join(tmp, "_KeyStats") + "/"
+        tickers = write_keystats_tree(
+            statspath, parsing_keystats.features, N_TICKERS, N_SNAPSHOTS
+        )
+        sp500_df, stock_df = synthetic_prices(tickers)
+        parsing_keystats.statspath = statspath
+        os.chdir(tmp)
+
+        print(f"{N_TICKERS} tickers x {N_SNAPSHOTS} snapshots")
+        worker_counts = sorted({1, 2, 4, os.cpu_count()})
+        baseline = None
+        for n_workers in worker_counts:
+            start = time.perf_counter()
+            parsing_keystats.parse_keystats(
+                sp500_df, stock_df, n_workers=n_workers, cache_path=None
+            )
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"workers={n_workers:3d}: {elapsed:.2f} s (speedup {baseline / elapsed:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
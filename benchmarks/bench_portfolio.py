@@ -0,0 +1,55 @@
+"""
+Time of portfolio.simulate and portfolio.risk_metrics on daily data for all tickers: 15 years of
+trading days for 50 tickers (like the Indian dataset) and for 500 tickers, rebalanced yearly and daily.
+Run from the repository root: python benchmarks/bench_portfolio.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import portfolio  # noqa: E402
+
+N_YEARS = 15
+REPEATS = 5
+
+
+def make_rows(n_tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2010-01-01", periods=252 * N_YEARS)
+    dates = np.repeat(days, n_tickers)
+    tickers = np.tile([f"T{i}.NS" for i in range(n_tickers)], len(days))
+    n = len(dates)
+    probabilities = rng.random(n)
+    stock_change = rng.normal(10, 30, n)
+    index_change = np.repeat(rng.normal(8, 15, len(days)), n_tickers)
+    return dates, tickers, stock_change, index_change, probabilities >= 0.7, probabilities
+
+
+def main():
+    for n_tickers in [50, 500]:
+        dates, tickers, stock_change, index_change, selected, probabilities = make_rows(n_tickers)
+        for freq, periods_per_year in [("Y", 1), (None, 252)]:
+            for weighting in ["equal", "probability"]:
+                times = []
+                for _ in range(REPEATS):
+                    start = time.perf_counter()
+                    periods = portfolio.simulate(
+                        dates, tickers, stock_change, index_change, selected, probabilities,
+                        weighting=weighting, freq=freq,
+                    )
+                    portfolio.risk_metrics(periods, periods_per_year)
+                    times.append(time.perf_counter() - start)
+                print(
+                    f"{len(dates):9d} rows {n_tickers:3d} tickers rebalance {freq or 'daily':5s} "
+                    f"{weighting:11s} {min(times) * 1000:7.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
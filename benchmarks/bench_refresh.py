@@ -0,0 +1,64 @@
+"""
+Time an end-to-end price and fundamentals refresh offline, against a local stand-in for Yahoo Finance
+with simulated network latency, for different thread pool sizes.
+Run from the repository root: python benchmarks/bench_refresh.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fetch_indian_data  # noqa: E402
+from downloader import LocalFileSource  # noqa: E402
+
+LATENCY = 0.1
+N_DATES = 3700
+
+
+def write_canned_data(path):
+    dates = pd.bdate_range("2010-10-11", periods=N_DATES)
+    rng = np.random.default_rng(0)
+    for ticker in fetch_indian_data.NIFTY_50_STOCKS:
+        prices = pd.DataFrame(
+            {"Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, N_DATES)))}, index=dates
+        )
+        prices.index.name = "Date"
+        prices.to_csv(os.path.join(path, f"{ticker}.csv"))
+        with open(os.path.join(path, f"{ticker}.json"), "w") as f:
+            json.dump({"currentPrice": 100.0, "marketCap": 1e12}, f)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_canned_data(tmp)
+        source = LocalFileSource(tmp, latency=LATENCY)
+        print(f"{len(fetch_indian_data.NIFTY_50_STOCKS)} tickers, {LATENCY * 1000:.0f} ms latency")
+        # With the default rate limits the refresh takes about 50/10 + 50/5 = 15 s (less the burst),
+        # so also time it with the limits lifted, to see the effect of the thread pool alone.
+        for rate_scale in (1, 100):
+            for max_workers in (1, 4, 8, 16):
+                start = time.perf_counter()
+                fetch_indian_data.fetch_stock_prices(
+                    source, fetch_indian_data.START_DATE, fetch_indian_data.END_DATE,
+                    max_workers=max_workers,
+                    rate=fetch_indian_data.PRICE_REQUESTS_PER_SECOND * rate_scale,
+                )
+                fetch_indian_data.fetch_stock_info(
+                    source, max_workers=max_workers,
+                    rate=fetch_indian_data.INFO_REQUESTS_PER_SECOND * rate_scale,
+                )
+                print(
+                    f"rate x{rate_scale:3d}, max_workers={max_workers:2d}: "
+                    f"{time.perf_counter() - start:.2f} s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Scaling benchmark for building the keystats dataframe: RowAccumulator versus growing a dataframe one row
+at a time (the old df.append loop, emulated with pd.concat since DataFrame.append no longer exists).
+Run from the repository root: python benchmarks/bench_row_accumulator.py
+"""
+
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import parsing_keystats  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000]
+# Row-by-row appending is quadratic (about two minutes at 10k rows), so only time it for the smaller sizes.
+MAX_ROW_BY_ROW = 10_000
+
+
+def synthetic_rows(n_rows, seed=0):
+    """
+    :return: a list of keystats rows, as parse_ticker_directory produces them.
+    """
+    rng = random.Random(seed)
+    date = pd.Timestamp("2005-01-03 10:00:00")
+    n_features = len(parsing_keystats.features)
+    return [
+        [date, 1104746400.0, f"t{i % 500}"]
+        + [rng.random() if rng.random() > 0.1 else "N/A" for _ in range(n_features)]
+        for i in range(n_rows)
+    ]
+
+
+def build_row_by_row(rows):
+    df_columns = parsing_keystats.parsed_columns
+    df = pd.DataFrame(columns=df_columns)
+    for row in rows:
+        df = pd.concat([df, pd.DataFrame([row], columns=df_columns)], ignore_index=True)
+    return df
+
+
+def build_with_accumulator(rows):
+    accumulator = parsing_keystats.new_keystats_accumulator()
+    for row in rows:
+        accumulator.append(row)
+    return accumulator.to_frame()
+
+
+def main():
+    for n_rows in SIZES:
+        rows = synthetic_rows(n_rows)
+        start = time.perf_counter()
+        build_with_accumulator(rows)
+        accumulator_time = time.perf_counter() - start
+        line = f"{n_rows:>7d} snapshots: accumulator {accumulator_time:7.3f} s ({1e6 * accumulator_time / n_rows:.1f} us/row)"
+
+        if n_rows <= MAX_ROW_BY_ROW:
+            start = time.perf_counter()
+            build_row_by_row(rows)
+            line += f", row-by-row {time.perf_counter() - start:7.3f} s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
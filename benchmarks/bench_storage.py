@@ -0,0 +1,65 @@
+"""
+Load time and memory of the datasets read with pd.read_csv (the old loaders) versus the typed Parquet
+files of the storage module. Run from the repository root: python benchmarks/bench_storage.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import storage  # noqa: E402
+
+REPEATS = 5
+
+
+def best_time(func):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def report(name, csv_load, storage_load):
+    csv_time, csv_df = best_time(csv_load)
+    storage_time, storage_df = best_time(storage_load)
+    csv_mb = csv_df.memory_usage(deep=True).sum() / 1e6
+    storage_mb = storage_df.memory_usage(deep=True).sum() / 1e6
+    print(
+        f"{name:25s} read_csv {csv_time * 1000:7.1f} ms {csv_mb:6.1f} MB | "
+        f"storage {storage_time * 1000:7.1f} ms {storage_mb:6.1f} MB"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ["keystats.csv", "indian_stock_prices.csv", "sp500_index.csv"]:
+            if not os.path.exists(name):
+                continue
+            path = os.path.join(tmp, name)
+            shutil.copy(name, path)
+            storage.convert_to_columnar(path)
+
+            if name == "keystats.csv":
+                report(
+                    name,
+                    lambda: pd.read_csv(path, index_col="Date"),
+                    lambda: storage.load_keystats(path, index_col="Date"),
+                )
+            else:
+                report(
+                    name,
+                    lambda: pd.read_csv(path, index_col="Date", parse_dates=True),
+                    lambda: storage.load_prices(path),
+                )
+
+
+if __name__ == "__main__":
+    main()
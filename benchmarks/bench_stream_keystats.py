@@ -0,0 +1,68 @@
+"""
+Compare the peak memory of building keystats.csv in memory (parse_keystats) and as a stream of chunks
+(stream_keystats), for synthetic intraQuarter trees of increasing size. The price data, which both
+need in full, is loaded before measuring.
+Run from the repository root: python benchmarks/bench_stream_keystats.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import parsing_keystats  # noqa: E402
+from bench_parse_keystats import synthetic_prices  # noqa: E402
+from synthetic import write_keystats_tree  # noqa: E402
+
+TICKER_COUNTS = [100, 200, 400]
+N_SNAPSHOTS = 50
+CHUNK_ROWS = 5_000
+
+
+def peak_memory(func, *args, **kwargs):
+    """
+    :return: the time taken by func, and the peak memory it allocated (in MB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    print(f"{N_SNAPSHOTS} snapshots per ticker, chunks of {CHUNK_ROWS} rows, without the parse cache")
+    for n_tickers in TICKER_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            statspath = os.path.join(tmp, "_KeyStats") + "/"
+            tickers = write_keystats_tree(
+                statspath, parsing_keystats.features, n_tickers, N_SNAPSHOTS, padding=10
+            )
+            sp500_df, stock_df = synthetic_prices(tickers)
+            parsing_keystats.statspath = statspath
+            os.chdir(tmp)
+
+            in_memory = peak_memory(
+                parsing_keystats.parse_keystats, sp500_df, stock_df, cache_path=None
+            )
+            streamed = peak_memory(
+                parsing_keystats.stream_keystats,
+                sp500_df,
+                stock_df,
+                cache_path=None,
+                chunk_rows=CHUNK_ROWS,
+            )
+            print(
+                f"{n_tickers * N_SNAPSHOTS:6d} snapshots: "
+                f"parse_keystats {in_memory[1]:6.1f} MB ({in_memory[0]:.1f} s), "
+                f"stream_keystats {streamed[1]:6.1f} MB ({streamed[0]:.1f} s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Synthetic Yahoo Finance key statistics snapshots, shaped like the files in intraQuarter/_KeyStats/,
+for benchmarking the parsing pipeline without the real dataset.
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+ROW_TEMPLATE = (
+    '<tr><td class="yfnc_tablehead1" width="74%">{label}<font size="-1"><sup>{note}</sup></font>:</td>'
+    '<td class="yfnc_tabledata1"><span id="yfs_{note}">{value}</span></td></tr>\n'
+)
+
+
+def random_value(rng):
+    """
+    :param rng: a random.Random instance
+    :return: a value string in one of the formats that Yahoo used.
+    """
+    kind = rng.random()
+    if kind < 0.1:
+        return "N/A"
+    if kind < 0.15:
+        return "0"
+    number = f"{rng.uniform(-500, 5000):.2f}"
+    if kind < 0.55:
+        return number + rng.choice(["K", "M", "B"])
+    if kind < 0.7:
+        return number + "%"
+    return number.replace("000", ",000")
+
+
+def make_keystats_html(features, rng, padding=200):
+    """
+    :param features: the feature labels to include in the snapshot.
+    :param rng: a random.Random instance
+    :param padding: number of filler lines before the table, so documents are realistically large.
+    :return: an html string.
+    """
+    filler = "<div class='nav'><a href='#'>Quotes & Info</a> 123 <b>menu</b></div>\n" * padding
+    rows = "".join(
+        ROW_TEMPLATE.format(label=label, note=rng.randint(1, 9), value=random_value(rng))
+        for label in features
+        if rng.random() > 0.05
+    )
+    return "<html><body>" + filler + "<table>" + rows + "</table></body></html>"
+
+
+def write_keystats_tree(path, features, n_tickers, n_snapshots, seed=0, padding=200):
+    """
+    Write a directory tree like intraQuarter/_KeyStats/, with one folder per ticker
+    and one html file per snapshot.
+    :return: the list of ticker names
+    """
+    rng = random.Random(seed)
+    tickers = [f"t{i:03d}" for i in range(n_tickers)]
+    for ticker in tickers:
+        os.makedirs(os.path.join(path, ticker), exist_ok=True)
+        date = datetime(2004, 1, 5, 12, 0, 0)
+        for _ in range(n_snapshots):
+            date += timedelta(days=rng.randint(20, 60))
+            filename = date.strftime("%Y%m%d%H%M%S.html")
+            with open(os.path.join(path, ticker, filename), "w") as f:
+                f.write(make_keystats_html(features, rng, padding))
+    return tickers
@@ -0,0 +1,152 @@
+"""
+Shared caches for multi-threaded serving. Each cached value has a name (e.g "model") and a version
+(e.g the modification time of the file it was built from). Loading is single-flight: when several
+threads ask for a value which is not cached, one of them builds it while the others wait for its
+result. A newly built version replaces the previous one atomically, so readers always get a complete
+value, and a reader which already holds the previous value keeps a consistent snapshot. Expensive
+values can be rebuilt in the background while the previous version is still served (stale_ok).
+Versions are only compared for equality, so "newer" means requested later: a build is only swapped in
+if no version requested after its own has been cached already.
+Cached values are shared between threads, and must not be modified by their users.
+"""
+
+import itertools
+import threading
+import time
+
+
+class _Build:
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Failure:
+    def __init__(self, version, error, retry_at, attempts):
+        self.version = version
+        self.error = error
+        self.retry_at = retry_at
+        self.attempts = attempts
+
+
+class CacheManager:
+    def __init__(self, retry_after=30.0, max_retry_after=3600.0):
+        """
+        :param retry_after: after a background (stale_ok) build of a version fails, the seconds to wait
+                            before building it again, doubled after each consecutive failure
+        :param max_retry_after: the longest wait between background builds of a failing version
+        """
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.lock = threading.Lock()
+        # name -> (version, value, generation)
+        self.entries = {}
+        # (name, version) -> _Build in progress
+        self.builds = {}
+        # name -> _Failure of the last failed background build
+        self.failures = {}
+        # Numbers the builds and puts in the order they were requested
+        self.generations = itertools.count(1)
+
+    def get(self, name, version, build, stale_ok=False):
+        """
+        :param name: the name of the value
+        :param version: hashable version of the inputs of the value
+        :param build: function with no arguments which builds the value. If it raises, the exception
+                      is raised in every waiting thread and nothing is cached.
+        :param stale_ok: if a previous version is cached, return it at once and build this version in
+                         a background thread, which swaps it in when it is done. If that build fails,
+                         the previous version is served, and the build is only retried after a backoff
+                         (see retry_after).
+        :return: the value of this version (or, with stale_ok, possibly of the previous version), built
+                 at most once however many threads ask for it
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            failure = self.failures.get(name)
+            if stale_ok and entry is not None and failure is not None and failure.version == version:
+                if time.monotonic() < failure.retry_at:
+                    return entry[1]
+            in_progress = self.builds.get((name, version))
+            builder = in_progress is None
+            if builder:
+                in_progress = self.builds[(name, version)] = _Build(next(self.generations))
+
+        if stale_ok and entry is not None:
+            if builder:
+                threading.Thread(
+                    target=self._build, args=(name, version, build, in_progress, True), daemon=True
+                ).start()
+            return entry[1]
+        if builder:
+            self._build(name, version, build, in_progress)
+        else:
+            in_progress.done.wait()
+        if in_progress.error is not None:
+            raise in_progress.error
+        return in_progress.value
+
+    def _build(self, name, version, build, in_progress, background=False):
+        try:
+            in_progress.value = build()
+            self._install(name, version, in_progress.value, in_progress.generation)
+        except Exception as e:
+            in_progress.error = e
+            if background:
+                self._record_failure(name, version, e)
+        finally:
+            with self.lock:
+                del self.builds[(name, version)]
+            in_progress.done.set()
+
+    def _install(self, name, version, value, generation):
+        """
+        Cache a value, unless a version requested after this one is cached already.
+        :return: whether the value was cached
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[2] > generation:
+                return False
+            self.entries[name] = (version, value, generation)
+            failure = self.failures.get(name)
+            if failure is not None and failure.version == version:
+                del self.failures[name]
+            return True
+
+    def _record_failure(self, name, version, error):
+        with self.lock:
+            failure = self.failures.get(name)
+            attempts = failure.attempts + 1 if failure is not None and failure.version == version else 1
+            wait = min(self.retry_after * 2 ** (attempts - 1), self.max_retry_after)
+            self.failures[name] = _Failure(version, error, time.monotonic() + wait, attempts)
+
+    def put(self, name, version, value):
+        """
+        Hot-swap a value, e.g one built in the background from refreshed data. It replaces any cached
+        version, and is only replaced by versions requested after it.
+        """
+        self._install(name, version, value, next(self.generations))
+
+    def last_failure(self, name):
+        """
+        :return: the exception of the last failed background build of name, or None if it succeeded
+        """
+        failure = self.failures.get(name)
+        return None if failure is None else failure.error
+
+    def peek(self, name):
+        """
+        :return: the current value of name, whatever its version, or None if there is none
+        """
+        entry = self.entries.get(name)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.failures.clear()
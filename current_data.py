@@ -1,11 +1,11 @@
-import pandas as pd
 import os
-import re
 import time
 import requests
-import numpy as np
 from tqdm import tqdm
-from utils import data_string_to_float
+from keystats_extraction import KeystatsExtractor
+from utils import RowAccumulator, data_strings_to_floats
+import parse_cache
+import storage
 
 # The path to your fundamental data
 statspath = "intraQuarter/_KeyStats/"
@@ -89,9 +89,11 @@ def check_yahoo():
             time.sleep(2)
 
 
-def forward():
+def forward(cache_path=None):
     """
     Creates the forward sample by parsing the current data html files that we downloaded in check_yahoo().
+    :param cache_path: optionally, a parse cache file (see parse_cache), so that only the new or changed
+                       html files are parsed. By default, every file is parsed without a cache.
     :return: a pandas dataframe containing all of the current data for each ticker.
     """
     # Creating an empty dataframe which we will later fill. In addition to the features, we need some index variables
@@ -106,7 +108,8 @@ def forward():
         "SP500_p_change",
     ] + features
 
-    df = pd.DataFrame(columns=df_columns)
+    # Rows are collected column by column, and the dataframe is built once at the end.
+    rows = RowAccumulator(df_columns, numeric_columns=features)
 
     tickerfile_list = os.listdir("forward/")
 
@@ -114,43 +117,42 @@ def forward():
     if ".DS_Store" in tickerfile_list:
         tickerfile_list.remove(".DS_Store")
 
+    # Compile the regex for all of the features once, rather than once per file and feature.
+    extractor = KeystatsExtractor(features)
+
+    paths = [f"forward/{tickerfile}" for tickerfile in tickerfile_list]
+    if cache_path is None:
+        values, signatures = {}, {}
+    else:
+        cache = parse_cache.ParseCache(cache_path, parse_cache.extractor_key(extractor))
+        values, signatures = cache.lookup(paths)
+
     # This is the actual parsing. This needs to be fixed every time yahoo changes their UI.
-    for tickerfile in tqdm(tickerfile_list, desc="Parsing progress:", unit="tickers"):
-        ticker = tickerfile.split(".html")[0].upper()
-        source = open(f"forward/{tickerfile}").read()
+    # The raw strings of the features are converted to floats in one batch at the end.
+    new_paths = [path for path in paths if path not in values]
+    raw_values = []
+    for path in tqdm(new_paths, desc="Parsing progress:", unit="tickers"):
+        source = open(path).read()
         # Remove commas from the html to make parsing easier.
         source = source.replace(",", "")
 
-        # Regex search for the different variables in the html file, then append to value_list
-        value_list = []
-        for variable in features:
-            try:
-                # Basically, look for the first number present after we an occurence of the variable
-                regex = (
-                    r">"
-                    + re.escape(variable)
-                    + r".*?(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0|NaN)%?"
-                    r"(</td>|</span>)"
-                )
-                value = re.search(regex, source, flags=re.DOTALL).group(1)
-
-                # Dealing with number formatting
-                value_list.append(data_string_to_float(value))
-
-            # The data may not be present. Process accordingly.
-            except AttributeError:
-                value_list.append("N/A")
-                # print(ticker, variable)
-
-        # Append the ticker and the features to the dataframe
-        new_df_row = [0, 0, ticker, 0, 0, 0, 0] + value_list
-
-        df = df.append(dict(zip(df_columns, new_df_row)), ignore_index=True)
-
-    return df.replace("N/A", np.nan)
+        # Search for all of the variables in one pass over the html file.
+        raw_values.append(extractor.extract_strings(source))
+    new_values = data_strings_to_floats(raw_values).reshape(len(new_paths), len(features))
+    new_values = dict(zip(new_paths, new_values))
+    if cache_path is not None:
+        cache.store(signatures, new_values)
+        cache.close()
+    values.update(new_values)
+
+    # Append the ticker and the features to the dataframe. Missing features are NaN.
+    for tickerfile, path in zip(tickerfile_list, paths):
+        ticker = tickerfile.split(".html")[0].upper()
+        rows.append([0, 0, ticker, 0, 0, 0, 0] + values[path].tolist())
+    return rows.to_frame()
 
 
 if __name__ == "__main__":
     check_yahoo()
-    current_df = forward()
-    current_df.to_csv("forward_sample.csv", index=False)
+    current_df = forward(cache_path=parse_cache.DEFAULT_PATH)
+    storage.save_keystats(current_df, "forward_sample.csv", parse_dates=False)
@@ -1,8 +1,11 @@
 import os
+import argparse
 from pandas_datareader import data as pdr
 import pandas as pd
 import fix_yahoo_finance as yf
 
+import storage
+
 yf.pdr_override()
 
 START_DATE = "2003-08-01"
@@ -36,7 +39,7 @@ def build_stock_dataset(start=START_DATE, end=END_DATE):
     print(f"{len(missing_tickers)} tickers are missing: \n {missing_tickers} ")
     # If there are only some missing datapoints, forward fill.
     stock_data.ffill(inplace=True)
-    stock_data.to_csv("stock_prices.csv")
+    storage.save_prices(stock_data, "stock_prices.csv")
 
 
 def build_sp500_dataset(start=START_DATE, end=END_DATE):
@@ -45,7 +48,7 @@ def build_sp500_dataset(start=START_DATE, end=END_DATE):
     :returns: sp500_index.csv
     """
     index_data = pdr.get_data_yahoo("SPY", start=START_DATE, end=END_DATE)
-    index_data.to_csv("sp500_index.csv")
+    storage.save_prices(index_data, "sp500_index.csv")
 
 
 def build_dataset_iteratively(
@@ -76,9 +79,65 @@ def build_dataset_iteratively(
             continue
         adj_close = stock_ohlc["Adj Close"].rename(ticker)
         df = pd.concat([df, adj_close], axis=1)
-    df.to_csv("stock_prices.csv")
+    df.index.name = "Date"
+    storage.save_prices(df, "stock_prices.csv")
+
+
+def update_stock_dataset(end=None):
+    """
+    Incrementally updates stock_prices.csv: only the days after the last stored date are downloaded,
+    then appended to the stored prices. The Parquet file and the PriceStore are rewritten with it.
+    :param end: the date up to which to update (default: today)
+    :returns: stock_prices.csv
+    """
+    stored = storage.load_prices("stock_prices.csv")
+    start = stored.index[-1] + pd.Timedelta(days=1)
+    end = end or pd.Timestamp.today()
+    if start > pd.Timestamp(end):
+        print("stock_prices.csv is up to date")
+        return
+
+    all_data = pdr.get_data_yahoo([t.lower() for t in stored.columns], start, end)
+    new_data = all_data["Adj Close"]
+    new_data.columns = [ticker.upper() for ticker in new_data.columns]
+
+    stock_data = pd.concat([stored, new_data[~new_data.index.isin(stored.index)]])
+    # As in build_stock_dataset, forward fill the missing datapoints.
+    stock_data.ffill(inplace=True)
+    storage.save_prices(stock_data, "stock_prices.csv")
+    print(f"Added {len(stock_data) - len(stored)} days to stock_prices.csv")
+
+
+def update_sp500_dataset(end=None):
+    """
+    Incrementally updates sp500_index.csv (and its Parquet file) with the days after the last stored date.
+    :param end: the date up to which to update (default: today)
+    :returns: sp500_index.csv
+    """
+    stored = storage.load_prices("sp500_index.csv")
+    start = stored.index[-1] + pd.Timedelta(days=1)
+    end = end or pd.Timestamp.today()
+    if start > pd.Timestamp(end):
+        print("sp500_index.csv is up to date")
+        return
+
+    new_data = pdr.get_data_yahoo("SPY", start=start, end=end)
+    index_data = pd.concat([stored, new_data[~new_data.index.isin(stored.index)]])
+    storage.save_prices(index_data, "sp500_index.csv")
 
 
 if __name__ == "__main__":
-    build_stock_dataset()
-    build_sp500_dataset()
+    parser = argparse.ArgumentParser(description="Download stock and S&P500 prices")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only download the days since the stored files were last written",
+    )
+    args = parser.parse_args()
+
+    if args.incremental:
+        update_stock_dataset()
+        update_sp500_dataset()
+    else:
+        build_stock_dataset()
+        build_sp500_dataset()
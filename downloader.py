@@ -0,0 +1,128 @@
+"""
+Download engine for market data: a token-bucket rate limiter, retries with backoff and a bounded
+thread pool, with pluggable data sources so that refreshes can be run and timed offline.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import yfinance as yf
+from tqdm import tqdm
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average, with bursts of up to `capacity` calls.
+    Thread-safe: acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_retries(func, *args, retries=3, backoff=0.5, limiter=None):
+    """
+    Call func(*args), retrying with exponential backoff (backoff, 2*backoff, ...) if it raises.
+    :param limiter: optional TokenBucket, acquired before every attempt.
+    :return: the result of func. The last exception is raised if every attempt fails.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def download_all(func, keys, max_workers=8, rate=10, retries=3, backoff=0.5, desc=None):
+    """
+    Call func(key) for every key on a bounded thread pool, sharing one rate limiter.
+    Keys whose download still fails after all retries are reported and left out.
+    :return: dict mapping key to result, in the order of keys.
+    """
+    limiter = TokenBucket(rate, capacity=max_workers)
+
+    def fetch(key):
+        try:
+            return call_with_retries(
+                func, key, retries=retries, backoff=backoff, limiter=limiter
+            )
+        except Exception as e:
+            print(f"\nError fetching {key}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(tqdm(executor.map(fetch, keys), total=len(keys), desc=desc))
+    return {key: result for key, result in zip(keys, results) if result is not None}
+
+
+class YahooFinanceSource:
+    """Downloads prices and fundamentals from Yahoo Finance with yfinance"""
+
+    def fetch_prices(self, ticker, start, end):
+        """
+        :return: Series of daily close prices indexed by date (empty if there is no data).
+        """
+        data = yf.download(ticker, start=start, end=end, progress=False)
+        if data.empty:
+            return pd.Series(dtype=float)
+        close = data["Close"]
+        # Recent versions of yfinance return one column per ticker
+        if isinstance(close, pd.DataFrame):
+            close = close.iloc[:, 0]
+        return close
+
+    def fetch_info(self, ticker):
+        """
+        :return: dict of fundamental data, as yfinance's Ticker.info
+        """
+        return yf.Ticker(ticker).info
+
+
+class LocalFileSource:
+    """
+    Serves canned data from a directory, for tests and offline benchmarks:
+    prices from <ticker>.csv (Date and Close columns) and fundamentals from <ticker>.json.
+    An optional latency (in seconds) per request emulates the network.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+
+    def fetch_prices(self, ticker, start, end):
+        time.sleep(self.latency)
+        prices = pd.read_csv(
+            os.path.join(self.path, f"{ticker}.csv"), index_col="Date", parse_dates=True
+        )["Close"]
+        return prices[(prices.index >= start) & (prices.index < end)]
+
+    def fetch_info(self, ticker):
+        time.sleep(self.latency)
+        with open(os.path.join(self.path, f"{ticker}.json")) as f:
+            return json.load(f)
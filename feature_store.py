@@ -0,0 +1,106 @@
+"""
+The model inputs of a keystats dataset, built once and shared by every consumer: the feature matrix
+as a C-contiguous float32 array (the dtype the forests train on, so fitting does not copy it again),
+the labels for each outperformance level, and the stock and index returns. All of the arrays are
+read-only, so a consumer cannot change the data seen by the others; missing features are filled
+while building the matrix, never in the dataset itself.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import labels
+import model_registry
+import storage
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+class FeatureStore:
+    def __init__(self, data, index_column=None, fill_value=0.0):
+        """
+        :param data: a keystats dataframe indexed by date, whose features start at its 7th column
+        :param index_column: the index's percentage change column, by default NIFTY50_p_change if it
+                             exists, else SP500_p_change
+        :param fill_value: the value of missing features
+        """
+        if index_column is None:
+            index_column = labels.index_change_column(data)
+        self.features = list(data.columns[6:])
+        self.fill_value = fill_value
+        self.X = _read_only(self.matrix(data))
+        self.stock_change = _read_only(data["stock_p_change"].to_numpy(dtype=np.float64))
+        self.index_change = _read_only(data[index_column].to_numpy(dtype=np.float64))
+        # Stock and index returns side by side, as used to compute a backtest's returns
+        self.returns = _read_only(np.column_stack([self.stock_change, self.index_change]))
+        self.dates = pd.DatetimeIndex(data.index)
+        self.tickers = _read_only(data["Ticker"].astype(str).to_numpy())
+        self._labels = {}
+        self._fingerprint = None
+
+    @classmethod
+    def load(cls, path="keystats.csv"):
+        """
+        Build the store of a keystats file, without the rows which have missing values.
+        """
+        data = storage.load_keystats(path, index_col="Date")
+        data.dropna(axis=0, how="any", inplace=True)
+        return cls(data)
+
+    def __len__(self):
+        return len(self.X)
+
+    def matrix(self, df):
+        """
+        :param df: a dataframe with the store's features, e.g a forward sample
+        :return: its feature matrix, as a new C-contiguous float32 array with missing values (and
+                 missing features) filled
+        """
+        # to_numpy may return a read-only view of df's data (e.g a single row of float32 features,
+        # which is already C-contiguous), so the matrix is always copied before it is filled in place
+        X = np.array(df.reindex(columns=self.features).to_numpy(dtype=np.float32), order="C")
+        np.nan_to_num(X, copy=False, nan=self.fill_value)
+        return X
+
+    def labels(self, outperformance):
+        """
+        :return: boolean array, whether each stock beat the index by at least outperformance percent.
+                 Computed once per outperformance level.
+        """
+        y = self._labels.get(outperformance)
+        if y is None:
+            y = _read_only(labels.outperformed(self.stock_change, self.index_change, outperformance))
+            self._labels[outperformance] = y
+        return y
+
+    def label_matrix(self, outperformance_levels):
+        """
+        Compute the labels of several outperformance levels in one pass, e.g before a sweep, so that
+        labels(outperformance) returns them at once.
+        :return: boolean (rows x levels) array, see labels.label_matrix
+        """
+        matrix = _read_only(
+            labels.label_matrix(self.stock_change, self.index_change, outperformance_levels)
+        )
+        for j, outperformance in enumerate(outperformance_levels):
+            # Each level's labels are stored contiguously, as the forests expect
+            self._labels.setdefault(outperformance, _read_only(matrix[:, j].copy()))
+        return matrix
+
+    @property
+    def fingerprint(self):
+        """
+        A hex digest of the features, returns, dates and tickers, to key results computed from them.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update(model_registry.fingerprint(self.X, self.returns, self.features).encode())
+            digest.update(self.dates.asi8.tobytes())
+            digest.update("\0".join(self.tickers).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
@@ -3,12 +3,13 @@ Fetch Indian Stock Market Data using yfinance
 Downloads NIFTY 50 stocks data from NSE for the period 10/10/2010 to 20/10/2025
 """
 
-import yfinance as yf
+import argparse
+import os
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from tqdm import tqdm
-import time
+from downloader import YahooFinanceSource, call_with_retries, download_all
+import storage
 
 # NIFTY 50 stocks (as of 2024) with NSE suffixes
 NIFTY_50_STOCKS = [
@@ -28,62 +29,67 @@ NIFTY_50_STOCKS = [
 START_DATE = '2010-10-10'
 END_DATE = '2025-10-20'  # Will fetch up to current date
 
-def fetch_nifty_index():
+# Downloads run on a thread pool, rate limited to stay within Yahoo Finance's limits
+MAX_WORKERS = 8
+PRICE_REQUESTS_PER_SECOND = 10
+INFO_REQUESTS_PER_SECOND = 5
+
+def fetch_nifty_index(source=None, start=START_DATE, end=END_DATE):
     """Fetch NIFTY 50 index data"""
     print("Fetching NIFTY 50 index data...")
+    source = source or YahooFinanceSource()
     try:
-        nifty = yf.download('^NSEI', start=START_DATE, end=END_DATE, progress=False)
-        nifty = nifty[['Close']].copy()
-        nifty.columns = ['NIFTY50']
+        nifty = call_with_retries(source.fetch_prices, '^NSEI', start, end)
+        nifty = nifty.to_frame('NIFTY50')
         nifty.index.name = 'Date'
         return nifty
     except Exception as e:
         print(f"Error fetching NIFTY 50 data: {e}")
         return None
 
-def fetch_stock_prices():
-    """Fetch historical price data for all NIFTY 50 stocks"""
+def fetch_stock_prices(source=None, start=START_DATE, end=END_DATE,
+                       max_workers=MAX_WORKERS, rate=PRICE_REQUESTS_PER_SECOND):
+    """
+    Fetch historical price data for all NIFTY 50 stocks, concurrently and rate limited.
+    The wide price matrix is assembled once all of the downloads are done.
+    """
     print(f"Fetching price data for {len(NIFTY_50_STOCKS)} stocks...")
-    
-    all_prices = pd.DataFrame()
-    
-    for ticker in tqdm(NIFTY_50_STOCKS, desc="Downloading stocks"):
-        try:
-            # Download stock data
-            stock = yf.download(ticker, start=START_DATE, end=END_DATE, progress=False)
-            
-            if not stock.empty:
-                # Extract close price
-                stock_close = stock[['Close']].copy()
-                # Remove .NS suffix for cleaner ticker names
-                clean_ticker = ticker.replace('.NS', '')
-                stock_close.columns = [clean_ticker]
-                
-                if all_prices.empty:
-                    all_prices = stock_close
-                else:
-                    all_prices = all_prices.join(stock_close, how='outer')
-            
-            time.sleep(0.1)  # Rate limiting
-            
-        except Exception as e:
-            print(f"\nError fetching {ticker}: {e}")
-            continue
-    
+    starts = {ticker: start for ticker in NIFTY_50_STOCKS}
+    return _download_price_matrix(source, starts, end, max_workers, rate)
+
+def _download_price_matrix(source, starts, end, max_workers, rate):
+    """Download each ticker's prices from its own start date, and assemble the wide matrix"""
+    source = source or YahooFinanceSource()
+    prices = download_all(
+        lambda ticker: source.fetch_prices(ticker, starts[ticker], end),
+        list(starts), max_workers=max_workers, rate=rate, desc="Downloading stocks"
+    )
+    # Remove .NS suffix for cleaner ticker names
+    columns = [
+        close.rename(ticker.replace('.NS', ''))
+        for ticker, close in prices.items() if not close.empty
+    ]
+    if not columns:
+        return pd.DataFrame()
+
+    all_prices = pd.concat(columns, axis=1, join='outer', sort=True)
     all_prices.index.name = 'Date'
     return all_prices
 
-def fetch_stock_info():
-    """Fetch fundamental data for stocks using yfinance"""
+def fetch_stock_info(source=None, max_workers=MAX_WORKERS, rate=INFO_REQUESTS_PER_SECOND):
+    """Fetch fundamental data for stocks, concurrently and rate limited"""
     print(f"Fetching fundamental data for {len(NIFTY_50_STOCKS)} stocks...")
-    
+    source = source or YahooFinanceSource()
+
+    infos = download_all(
+        source.fetch_info, NIFTY_50_STOCKS, max_workers=max_workers, rate=rate,
+        desc="Fetching fundamentals"
+    )
+
     fundamental_data = []
     
-    for ticker in tqdm(NIFTY_50_STOCKS, desc="Fetching fundamentals"):
+    for ticker, info in infos.items():
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
             clean_ticker = ticker.replace('.NS', '')
             
             # Extract key fundamental metrics
@@ -133,7 +139,6 @@ def fetch_stock_info():
             }
             
             fundamental_data.append(data_point)
-            time.sleep(0.2)  # Rate limiting
             
         except Exception as e:
             print(f"\nError fetching fundamentals for {ticker}: {e}")
@@ -141,81 +146,213 @@ def fetch_stock_info():
     
     return pd.DataFrame(fundamental_data)
 
-def calculate_returns(prices_df, index_df):
-    """Calculate 1-year forward returns for stocks and index"""
-    returns_data = []
-    
-    for date in prices_df.index[:-252]:  # Skip last year for forward returns
-        try:
-            future_date_idx = prices_df.index.get_loc(date) + 252  # ~1 year ahead
-            if future_date_idx < len(prices_df):
-                future_date = prices_df.index[future_date_idx]
-                
-                for ticker in prices_df.columns:
-                    current_price = prices_df.loc[date, ticker]
-                    future_price = prices_df.loc[future_date, ticker]
-                    
-                    if pd.notna(current_price) and pd.notna(future_price):
-                        stock_return = ((future_price - current_price) / current_price) * 100
-                        
-                        # Get NIFTY return
-                        if date in index_df.index and future_date in index_df.index:
-                            index_current = index_df.loc[date, 'NIFTY50']
-                            index_future = index_df.loc[future_date, 'NIFTY50']
-                            index_return = ((index_future - index_current) / index_current) * 100
-                            
-                            returns_data.append({
-                                'Date': date.strftime('%Y-%m-%d'),
-                                'Unix': int(date.timestamp()),
-                                'Ticker': ticker,
-                                'Price': current_price,
-                                'stock_p_change': stock_return,
-                                'NIFTY50': index_current,
-                                'NIFTY50_p_change': index_return
-                            })
-        except:
-            continue
-    
-    return pd.DataFrame(returns_data)
+def calculate_returns(prices_df, index_df, horizon=252):
+    """
+    Calculate forward returns for stocks and index over `horizon` trading days
+    (252 is ~1 year; use e.g 63 or 126 for quarterly or half-yearly labels).
+    The future prices come from shifting the whole price matrix, and the result is
+    built in long form (one row per date and ticker, in date order) in one go.
+    """
+    dates = prices_df.index
+    n_dates = len(dates)
+
+    current_prices = prices_df.to_numpy(dtype=float)
+    future_prices = prices_df.shift(-horizon).to_numpy(dtype=float)
+
+    # NIFTY values on the same dates. A date only counts if both it and its
+    # future date are in the index data.
+    in_index = dates.isin(index_df.index)
+    nifty = index_df['NIFTY50'].reindex(dates)
+    index_current = nifty.to_numpy(dtype=float)
+    index_future = nifty.shift(-horizon).to_numpy(dtype=float)
+    future_in_index = np.zeros(n_dates, dtype=bool)
+    future_in_index[:max(n_dates - horizon, 0)] = in_index[horizon:]
+
+    valid = (
+        (in_index & future_in_index)[:, None]
+        & ~np.isnan(current_prices)
+        & ~np.isnan(future_prices)
+    )
+    # np.nonzero returns positions in row-major order, i.e by date then by ticker
+    date_pos, ticker_pos = np.nonzero(valid)
+
+    current = current_prices[date_pos, ticker_pos]
+    future = future_prices[date_pos, ticker_pos]
+    row_dates = dates[date_pos]
+    index_now = index_current[date_pos]
+
+    return pd.DataFrame({
+        'Date': row_dates.strftime('%Y-%m-%d'),
+        'Unix': (row_dates - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+        'Ticker': prices_df.columns[ticker_pos],
+        'Price': current,
+        'stock_p_change': (future - current) / current * 100,
+        'NIFTY50': index_now,
+        'NIFTY50_p_change': (index_future[date_pos] - index_now) / index_now * 100,
+    })
+
+# Columns of the training data, in addition to the fundamental features
+TRAINING_BASE_COLS = ['Date', 'Unix', 'Ticker', 'Price', 'stock_p_change', 'NIFTY50', 'NIFTY50_p_change']
+
+
+def fundamental_feature_columns(fundamentals_df):
+    """The feature columns of the fundamentals (excluding base columns)"""
+    return [col for col in fundamentals_df.columns if col not in TRAINING_BASE_COLS]
+
+
+def create_training_data_with_fundamentals(returns_df, fundamentals_df, point_in_time=False):
+    """
+    Merge returns data with fundamental data to create complete training dataset.
+    By default each ticker's fundamentals (the last row per ticker) are used for all of its historical
+    rows. With point_in_time=True and dated fundamentals (several rows per ticker), each return row instead
+    gets the latest fundamentals dated on or before it, and NaN if there are none yet.
+    """
+    feature_cols = fundamental_feature_columns(fundamentals_df)
+
+    if point_in_time:
+        enhanced_df = _merge_fundamentals_as_of(returns_df, fundamentals_df, feature_cols)
+    else:
+        # Use current values for all historical data. Tickers without fundamentals get NaN.
+        ticker_fundamentals = fundamentals_df.drop_duplicates('Ticker', keep='last')
+        enhanced_df = returns_df.merge(
+            ticker_fundamentals[['Ticker'] + feature_cols], on='Ticker', how='left'
+        )
 
-def create_training_data_with_fundamentals(returns_df, fundamentals_df):
-    """Merge returns data with fundamental data to create complete training dataset"""
-    print("Creating comprehensive training dataset with fundamental features...")
-    
-    # Get the feature columns from fundamentals (excluding base columns)
-    base_cols = ['Ticker', 'Date', 'Unix', 'Price', 'NIFTY50', 'NIFTY50_p_change', 'stock_p_change']
-    feature_cols = [col for col in fundamentals_df.columns if col not in base_cols]
-    
-    # Create a mapping of ticker to fundamental values (use current values for all historical data)
-    ticker_fundamentals = {}
-    for _, row in fundamentals_df.iterrows():
-        ticker = row['Ticker']
-        ticker_fundamentals[ticker] = {col: row[col] for col in feature_cols}
-    
-    # Add fundamental features to each row of returns data
-    enhanced_data = []
-    for _, row in tqdm(returns_df.iterrows(), total=len(returns_df), desc="Adding fundamentals"):
-        ticker = row['Ticker']
-        new_row = row.to_dict()
-        
-        # Add fundamental data for this ticker
-        if ticker in ticker_fundamentals:
-            new_row.update(ticker_fundamentals[ticker])
-        else:
-            # Add NaN for missing fundamentals
-            for col in feature_cols:
-                new_row[col] = np.nan
-        
-        enhanced_data.append(new_row)
-    
-    # Create final dataframe with proper column order
-    final_cols = ['Date', 'Unix', 'Ticker', 'Price', 'stock_p_change', 'NIFTY50', 'NIFTY50_p_change'] + feature_cols
-    enhanced_df = pd.DataFrame(enhanced_data)
-    
     # Reorder columns
-    enhanced_df = enhanced_df[final_cols]
-    
-    return enhanced_df
+    return enhanced_df[TRAINING_BASE_COLS + feature_cols]
+
+
+def _merge_fundamentals_as_of(returns_df, fundamentals_df, feature_cols):
+    """As-of join of dated fundamentals onto the returns, keeping the order of returns_df"""
+    left = returns_df.assign(
+        _as_of=pd.to_datetime(returns_df['Date']), _row=np.arange(len(returns_df))
+    ).sort_values('_as_of', kind='stable')
+    right = fundamentals_df[['Ticker'] + feature_cols].assign(
+        _as_of=pd.to_datetime(fundamentals_df['Date'])
+    ).sort_values('_as_of', kind='stable')
+
+    merged = pd.merge_asof(left, right, on='_as_of', by='Ticker', direction='backward')
+    return merged.sort_values('_row').drop(columns=['_as_of', '_row']).reset_index(drop=True)
+
+
+def write_training_data_with_fundamentals(returns_df, fundamentals_df, path,
+                                          chunksize=100_000, point_in_time=False, append=False):
+    """
+    Merge returns with fundamentals chunk by chunk, streaming each chunk straight to disk (CSV and
+    Parquet row groups) rather than holding the whole training dataset in memory.
+    With append=True the rows are added to the end of an existing CSV file.
+    :return: the number of rows written
+    """
+    with storage.KeystatsChunkWriter(path, append=append) as writer:
+        for start in range(0, max(len(returns_df), 1), chunksize):
+            writer.write(create_training_data_with_fundamentals(
+                returns_df.iloc[start:start + chunksize], fundamentals_df, point_in_time
+            ))
+    return writer.n_rows
+
+def next_day(date):
+    """The day after a date, as 'YYYY-MM-DD'"""
+    return (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+def fetch_new_prices(stored_prices, source=None, end=None,
+                     max_workers=MAX_WORKERS, rate=PRICE_REQUESTS_PER_SECOND):
+    """
+    Fetch only the trading days after each ticker's last stored date (the full history for
+    tickers that are not stored yet). By default, fetch up to and including today.
+    """
+    end = end or next_day(pd.Timestamp.today())
+    last_dates = stored_prices.apply(lambda prices: prices.last_valid_index())
+    starts = {}
+    for ticker in NIFTY_50_STOCKS:
+        last_date = last_dates.get(ticker.replace('.NS', ''))
+        starts[ticker] = START_DATE if last_date is None or pd.isna(last_date) else next_day(last_date)
+    print(f"Fetching new price data for {len(starts)} stocks...")
+    return _download_price_matrix(source, starts, end, max_workers, rate)
+
+def append_prices(stored_df, new_df):
+    """Append newly fetched rows (and any new tickers) to a stored price matrix"""
+    if new_df is None or new_df.empty:
+        return stored_df
+    columns = list(stored_df.columns) + [c for c in new_df.columns if c not in stored_df.columns]
+    combined = stored_df.combine_first(new_df)[columns]
+    combined.index.name = 'Date'
+    return combined
+
+def last_labelled_dates(path):
+    """
+    :return: Series of the last labelled date of each ticker of the training data at path
+    """
+    labelled = storage.load_keystats(path, columns=['Date', 'Ticker'])
+    labelled['Ticker'] = labelled['Ticker'].astype(str)
+    return pd.to_datetime(labelled['Date']).groupby(labelled['Ticker']).max()
+
+def calculate_new_returns(prices_df, index_df, last_labelled=None, horizon=252):
+    """
+    Returns for the dates after each ticker's last labelled date only: these are the rows whose
+    forward window may have resolved since the training data was last written. Tickers which
+    have no labelled rows (e.g added to the universe since) are labelled over their full history.
+    :param last_labelled: Series of the last labelled date of each ticker, see last_labelled_dates,
+                          or None to label everything
+    """
+    if last_labelled is None:
+        return calculate_returns(prices_df, index_df, horizon)
+    cutoffs = last_labelled.reindex(prices_df.columns)
+    # Only the dates after the earliest cutoff are needed (all of them if a ticker is new)
+    first = 0
+    if cutoffs.notna().all():
+        first = prices_df.index.searchsorted(cutoffs.min(), side='right')
+    returns_df = calculate_returns(prices_df.iloc[first:], index_df, horizon)
+    row_cutoffs = cutoffs.reindex(returns_df['Ticker']).to_numpy()
+    new = pd.isna(row_cutoffs) | (pd.to_datetime(returns_df['Date']).to_numpy() > row_cutoffs)
+    return returns_df[new].reset_index(drop=True)
+
+def refresh_incremental(source=None, end=None, horizon=252):
+    """
+    Update the stored price files with the trading days since they were last written, then
+    append the training rows whose forward window now resolves, for every ticker since its own
+    last labelled row. The fundamentals are taken from the stored forward sample.
+    The training data then holds the rows of a full rebuild, but the rows of a ticker added
+    since the last build come after the rows written before.
+    """
+    prices_df = storage.load_prices('indian_stock_prices.csv')
+    nifty_df = storage.load_prices('nifty50_index.csv')
+
+    new_prices = fetch_new_prices(prices_df, source, end)
+    prices_df = append_prices(prices_df, new_prices)
+    storage.save_prices(prices_df, 'indian_stock_prices.csv')
+    print(f"✅ Stock prices updated: {len(new_prices)} new dates")
+
+    new_nifty = fetch_nifty_index(
+        source, start=next_day(nifty_df.index[-1]), end=end or next_day(pd.Timestamp.today())
+    )
+    nifty_df = append_prices(nifty_df, new_nifty)
+    storage.save_prices(nifty_df, 'nifty50_index.csv')
+
+    last_labelled = None
+    if os.path.exists('indian_keystats.csv'):
+        last_labelled = last_labelled_dates('indian_keystats.csv')
+
+    returns_df = calculate_new_returns(prices_df, nifty_df, last_labelled, horizon)
+    fundamentals_df = storage.load_forward_sample('indian_forward_sample.csv')
+    n_rows = write_training_data_with_fundamentals(
+        returns_df, fundamentals_df, 'indian_keystats.csv', append=last_labelled is not None
+    )
+    print(f"✅ Training data updated: {n_rows} new records")
+
+def relabel(horizon=252, point_in_time=False):
+    """
+    Rebuild the training data from the stored prices, e.g for a different horizon, without
+    downloading anything. The price matrix is memory-mapped rather than parsed.
+    """
+    prices_df = storage.load_price_store('indian_stock_prices.csv').to_frame()
+    nifty_df = storage.load_prices('nifty50_index.csv')
+    fundamentals_df = storage.load_forward_sample('indian_forward_sample.csv')
+
+    returns_df = calculate_returns(prices_df, nifty_df, horizon)
+    n_rows = write_training_data_with_fundamentals(
+        returns_df, fundamentals_df, 'indian_keystats.csv', point_in_time=point_in_time
+    )
+    print(f"✅ Training data saved: {n_rows} records with a {horizon}-day horizon")
 
 def main():
     """Main function to fetch and prepare Indian stock data"""
@@ -227,13 +364,13 @@ def main():
     # Fetch NIFTY 50 index
     nifty_df = fetch_nifty_index()
     if nifty_df is not None:
-        nifty_df.to_csv('nifty50_index.csv')
+        storage.save_prices(nifty_df, 'nifty50_index.csv')
         print(f"✅ NIFTY 50 index saved: {len(nifty_df)} data points")
     
     # Fetch stock prices
     prices_df = fetch_stock_prices()
     if not prices_df.empty:
-        prices_df.to_csv('indian_stock_prices.csv')
+        storage.save_prices(prices_df, 'indian_stock_prices.csv')
         print(f"✅ Stock prices saved: {len(prices_df)} dates, {len(prices_df.columns)} stocks")
     
     # Fetch current fundamental data
@@ -244,7 +381,7 @@ def main():
         fundamentals_df['NIFTY50_p_change'] = np.nan
         fundamentals_df['stock_p_change'] = np.nan
         
-        fundamentals_df.to_csv('indian_forward_sample.csv', index=False)
+        storage.save_keystats(fundamentals_df, 'indian_forward_sample.csv', parse_dates=False)
         print(f"✅ Forward sample saved: {len(fundamentals_df)} stocks with {len(fundamentals_df.columns)} features")
     
     # Calculate historical returns and create training dataset
@@ -253,10 +390,14 @@ def main():
         returns_df = calculate_returns(prices_df, nifty_df)
         
         if not returns_df.empty:
-            # Merge returns with fundamental data to create complete training dataset
-            keystats_df = create_training_data_with_fundamentals(returns_df, fundamentals_df)
-            keystats_df.to_csv('indian_keystats.csv', index=False)
-            print(f"✅ Training data saved: {len(keystats_df)} records with {len(keystats_df.columns)} features")
+            # Merge returns with fundamental data to create complete training dataset,
+            # streaming it to disk in chunks
+            print("Creating comprehensive training dataset with fundamental features...")
+            n_rows = write_training_data_with_fundamentals(
+                returns_df, fundamentals_df, 'indian_keystats.csv'
+            )
+            n_cols = len(TRAINING_BASE_COLS) + len(fundamental_feature_columns(fundamentals_df))
+            print(f"✅ Training data saved: {n_rows} records with {n_cols} features")
     
     print("\n" + "="*80)
     print("✅ Data fetching complete!")
@@ -270,4 +411,24 @@ def main():
     print("Run with: export MARKET=INDIAN && python app.py")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fetch NIFTY 50 data")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="only fetch the trading days since the stored files were last written"
+    )
+    parser.add_argument(
+        "--labels-only", action="store_true",
+        help="rebuild indian_keystats.csv from the stored prices without downloading"
+    )
+    parser.add_argument(
+        "--horizon", type=int, default=252,
+        help="forward return horizon in trading days for --labels-only (e.g 63, 126, 252)"
+    )
+    args = parser.parse_args()
+
+    if args.labels_only:
+        relabel(args.horizon)
+    elif args.incremental:
+        refresh_incremental()
+    else:
+        main()
@@ -0,0 +1,110 @@
+"""
+Background jobs for the web app: long computations such as backtests run on a bounded worker pool
+instead of in the request thread, and are memoized by a key describing their inputs, so that
+repeated requests share one job and are served from its stored result. Only the most recently used
+finished jobs are kept, so that jobs with ever new inputs do not accumulate for the life of the process.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def to_dict(self):
+        """
+        :return: the job's id and status (and error message, if it failed), e.g for a JSON response.
+        """
+        job = {"job_id": self.id, "status": self.status}
+        if self.error is not None:
+            job["error"] = self.error
+        return job
+
+
+class JobQueue:
+    """
+    Runs func(*args) jobs on a thread pool. A job submitted with the key of a pending, running or
+    completed job is not run again: the existing job is returned. Failed jobs are forgotten by key,
+    so that submitting them again retries them. At most max_finished finished jobs are kept: when
+    there are more, the least recently used ones are evicted, and are run again if they are resubmitted.
+    Pending and running jobs are never evicted.
+    """
+
+    def __init__(self, max_workers=2, max_finished=256):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.jobs_by_key = {}
+        # The ids of the finished jobs, from the least to the most recently used
+        self.finished = OrderedDict()
+
+    def submit(self, key, func, *args):
+        """
+        :param key: hashable description of the job's inputs
+        :return: the Job, which may already be done.
+        """
+        with self.lock:
+            job = self.jobs_by_key.get(key)
+            if job is not None:
+                self._touch(job)
+                return job
+            job = Job(key)
+            self.jobs[job.id] = job
+            self.jobs_by_key[key] = job
+        self.executor.submit(self._run, job, func, args)
+        return job
+
+    def get(self, job_id):
+        """
+        :return: the Job with this id, or None (also if it was evicted).
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                self._touch(job)
+            return job
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def _touch(self, job):
+        if job.id in self.finished:
+            self.finished.move_to_end(job.id)
+
+    def _finish(self, job):
+        """Record that a job has finished, and evict the least recently used finished jobs."""
+        with self.lock:
+            if job.status == FAILED and self.jobs_by_key.get(job.key) is job:
+                del self.jobs_by_key[job.key]
+            self.finished[job.id] = None
+            while len(self.finished) > self.max_finished:
+                evicted = self.jobs.pop(self.finished.popitem(last=False)[0])
+                if self.jobs_by_key.get(evicted.key) is evicted:
+                    del self.jobs_by_key[evicted.key]
+
+    def _run(self, job, func, args):
+        job.status = RUNNING
+        try:
+            job.result = func(*args)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            self._finish(job)
+            job.finished.set()
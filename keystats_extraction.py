@@ -0,0 +1,132 @@
+import re
+from utils import data_string_to_float
+
+
+# The value that follows a feature label: the first number (possibly abbreviated, e.g '25M'),
+# 'N/A', '>0' or 'NaN' that is closed by a table cell or span.
+VALUE_REGEX = r"(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0|NaN)%?(</td>|</span>)"
+
+# In the past, 'Avg Vol' was instead named 'Average Volume'. The old label does not accept 'NaN'.
+FALLBACK_LABELS = {"Avg Vol (3 month)": "Average Volume (3 month)"}
+FALLBACK_VALUE_REGEX = r"(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0)%?(</td>|</span>)"
+
+_value_pattern = re.compile(VALUE_REGEX)
+_fallback_value_pattern = re.compile(FALLBACK_VALUE_REGEX)
+
+
+class KeystatsExtractor:
+    """
+    Extracts all of the key statistics from an html snapshot in a single pass.
+    All of the feature labels are compiled once into one alternation, which we use to find the
+    first occurrence of every label while walking the document once. The value for each feature is
+    then the first match of VALUE_REGEX after its label, which is exactly what the old per-feature
+    regex (label, lazy .*?, value) found.
+    """
+
+    def __init__(self, features, fallbacks=None):
+        """
+        :param features: the list of feature labels to extract, in output order.
+        :param fallbacks: dict mapping a feature to an older label to try if the feature is not found,
+                          e.g FALLBACK_LABELS.
+        """
+        self.features = list(features)
+        self.fallbacks = {
+            f: old for f, old in (fallbacks or {}).items() if f in self.features
+        }
+        labels = list(dict.fromkeys(self.features + list(self.fallbacks.values())))
+
+        # Longest labels first, so that e.g 'Enterprise Value/Revenue' is not swallowed by
+        # 'Enterprise Value'. A match then implies that all labels which are prefixes of it
+        # also occur at the same position.
+        alternation = "|".join(
+            re.escape(label) for label in sorted(labels, key=len, reverse=True)
+        )
+        self.label_pattern = re.compile(">(" + alternation + ")")
+        self.prefixes = {
+            label: [other for other in labels if label.startswith(other)]
+            for label in labels
+        }
+        self.n_labels = len(labels)
+
+    def find_labels(self, source):
+        """
+        Walk the document once, recording where each label's text ends the first time it occurs.
+        :param source: the html string, with commas removed.
+        :return: dict mapping label to the end position of its first occurrence.
+        """
+        positions = {}
+        for match in self.label_pattern.finditer(source):
+            start = match.start()
+            for label in self.prefixes[match.group(1)]:
+                if label not in positions:
+                    # +1 for the leading '>'
+                    positions[label] = start + 1 + len(label)
+            if len(positions) == self.n_labels:
+                break
+        return positions
+
+    def extract_strings(self, source):
+        """
+        :param source: the html string, with commas removed.
+        :return: list of the raw value strings (or None if not found) in the order of self.features.
+        """
+        positions = self.find_labels(source)
+        values = []
+        for variable in self.features:
+            match = None
+            if variable in positions:
+                match = _value_pattern.search(source, positions[variable])
+            if match is None and variable in self.fallbacks:
+                fallback = self.fallbacks[variable]
+                if fallback in positions:
+                    match = _fallback_value_pattern.search(source, positions[fallback])
+            values.append(match.group(1) if match is not None else None)
+        return values
+
+    def extract(self, source):
+        """
+        :param source: the html string, with commas removed.
+        :return: list of parsed values in the order of self.features, with 'N/A' for missing data.
+        """
+        return [
+            "N/A" if value is None else data_string_to_float(value)
+            for value in self.extract_strings(source)
+        ]
+
+
+def extract_features_regex_loop(source, features, use_fallback=True):
+    """
+    The original extraction loop, which runs a separate regex over the whole document per feature.
+    It is kept as the reference implementation for tests and benchmarks.
+    :param source: the html string, with commas removed.
+    :param features: the list of feature labels to extract.
+    :param use_fallback: whether to retry 'Avg Vol (3 month)' as 'Average Volume (3 month)'.
+    :return: list of parsed values, with 'N/A' for missing data.
+    """
+    value_list = []
+    for variable in features:
+        try:
+            regex = (
+                r">"
+                + re.escape(variable)
+                + r".*?(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0|NaN)%?"
+                r"(</td>|</span>)"
+            )
+            value = re.search(regex, source, flags=re.DOTALL).group(1)
+            value_list.append(data_string_to_float(value))
+        except AttributeError:
+            if use_fallback and variable == "Avg Vol (3 month)":
+                try:
+                    new_variable = ">Average Volume (3 month)"
+                    regex = (
+                        re.escape(new_variable)
+                        + r".*?(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0)%?"
+                        r"(</td>|</span>)"
+                    )
+                    value = re.search(regex, source, flags=re.DOTALL).group(1)
+                    value_list.append(data_string_to_float(value))
+                except AttributeError:
+                    value_list.append("N/A")
+            else:
+                value_list.append("N/A")
+    return value_list
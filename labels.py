@@ -0,0 +1,55 @@
+"""
+The training labels: whether a stock beat its index by at least an outperformance level, in percentage
+points, over the year after a snapshot. A negative level is an underperformance bound: e.g -5 labels the
+stocks which did not trail the index by more than 5 points. Labels are computed from the stock_p_change
+and index change columns as NumPy arrays (bool, or uint8 for a compact numeric matrix), for one level or
+for many levels at once, as one (rows x levels) array.
+"""
+
+import numpy as np
+
+
+def index_change_column(df):
+    """
+    :return: the name of the index's percentage change column of a keystats dataframe:
+             NIFTY50_p_change if it exists, else SP500_p_change
+    """
+    return "NIFTY50_p_change" if "NIFTY50_p_change" in df.columns else "SP500_p_change"
+
+
+def outperformed(stock_change, index_change, outperformance=10, dtype=bool):
+    """
+    :param stock_change: array of the stocks' percentage changes
+    :param index_change: array of the index's percentage changes over the same periods
+    :param outperformance: a stock is labelled 1 if stock_change >= index_change + outperformance
+    :param dtype: the dtype of the labels, e.g bool or np.uint8
+    :return: 1-D array of labels. Rows with a missing change are labelled 0.
+    """
+    excess = np.asarray(stock_change, dtype=np.float64) - np.asarray(index_change, dtype=np.float64)
+    return (excess >= outperformance).astype(dtype, copy=False)
+
+
+def label_matrix(stock_change, index_change, outperformance_levels, dtype=bool):
+    """
+    The labels of several outperformance levels, from one pass over the returns.
+    :param outperformance_levels: list of outperformance levels, which may be negative
+    :return: (rows x levels) array, whose column j holds the labels of outperformance_levels[j]
+    """
+    excess = np.asarray(stock_change, dtype=np.float64) - np.asarray(index_change, dtype=np.float64)
+    levels = np.asarray(outperformance_levels, dtype=np.float64)
+    return (excess[:, np.newaxis] >= levels[np.newaxis, :]).astype(dtype, copy=False)
+
+
+def frame_labels(df, outperformance_levels, index_column=None, dtype=bool):
+    """
+    :param df: a keystats dataframe
+    :param index_column: the index's percentage change column, by default index_change_column(df)
+    :return: the label_matrix of the stock_p_change and index change columns of df
+    """
+    index_column = index_change_column(df) if index_column is None else index_column
+    return label_matrix(
+        df["stock_p_change"].to_numpy(dtype=np.float64),
+        df[index_column].to_numpy(dtype=np.float64),
+        outperformance_levels,
+        dtype,
+    )
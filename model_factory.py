@@ -0,0 +1,73 @@
+"""
+The classifiers used by the backtest, the stock predictions and the web app, built from one set of
+hyperparameter profiles. Trees are fitted (and predict_proba is run) in parallel, with the number of
+jobs taken from the MLS_N_JOBS environment variable (default -1, i.e all cores) unless the entry
+point overrides it, e.g with --n-jobs.
+"""
+
+import os
+
+# Hyperparameter profiles. None of them set n_jobs, which does not change the fitted model.
+PROFILES = {
+    # The original backtest and stock prediction scripts
+    "baseline": {"n_estimators": 100, "random_state": 0},
+    # Fewer, more confident buy signals, as used by the web app
+    "high_precision": {
+        "n_estimators": 200,  # More trees for better accuracy
+        "max_depth": 10,  # Limit depth to prevent overfitting
+        "min_samples_split": 20,  # Require more samples to split
+        "min_samples_leaf": 10,  # Require more samples in leaf nodes
+        "max_features": "sqrt",  # Use sqrt of features for each split
+        "class_weight": "balanced",  # Handle class imbalance
+        "random_state": 42,
+    },
+}
+
+# Number of parallel jobs for fitting and prediction (-1 means all cores)
+N_JOBS = int(os.environ.get("MLS_N_JOBS", -1))
+
+
+def add_n_jobs_argument(parser):
+    """
+    Add the --n-jobs option to an argparse parser. Pass the parsed value to set_default_n_jobs.
+    """
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=N_JOBS,
+        help="parallel jobs for training and prediction, -1 for all cores (default: $MLS_N_JOBS or -1)",
+    )
+
+
+def set_default_n_jobs(n_jobs):
+    global N_JOBS
+    N_JOBS = n_jobs
+
+
+def build_classifier(params, n_jobs=None):
+    """
+    :param params: dict of RandomForestClassifier hyperparameters, e.g PROFILES["baseline"]
+    :param n_jobs: number of parallel jobs, by default N_JOBS
+    :return: an unfitted RandomForestClassifier
+    """
+    # Imported here, so that importing this module (e.g when the web app starts) does not load sklearn
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(**params, n_jobs=N_JOBS if n_jobs is None else n_jobs)
+
+
+def classifier(profile="baseline", n_jobs=None):
+    """
+    :param profile: the name of one of the PROFILES
+    :return: an unfitted RandomForestClassifier
+    """
+    return build_classifier(PROFILES[profile], n_jobs)
+
+
+def use_n_jobs(model, n_jobs=None):
+    """
+    Set the parallelism of a fitted model, e.g one loaded from disk which was fitted elsewhere.
+    :return: the model
+    """
+    model.n_jobs = N_JOBS if n_jobs is None else n_jobs
+    return model
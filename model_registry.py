@@ -0,0 +1,67 @@
+"""
+On-disk registry of trained models, keyed by a fingerprint of the training data, the hyperparameters and
+any other settings that change the model (e.g the outperformance threshold). A new process loads the
+model for the current fingerprint from disk instead of refitting it, and a different fingerprint (e.g
+because the keystats file changed) means a new model is trained.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+
+# The directory in which models are stored
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+
+
+def fingerprint(X, y, params, **settings):
+    """
+    :param X: the training features
+    :param y: the training labels
+    :param params: dict of the model's hyperparameters
+    :param settings: anything else that determines the model, e.g outperformance=25
+    :return: a hex digest identifying the model that would be trained.
+    """
+    digest = hashlib.sha256()
+    for array in (X, y):
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype.str)).encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps([params, settings], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def model_path(name, key, directory=None):
+    return os.path.join(directory or MODEL_DIR, f"{name}-{key[:16]}.joblib")
+
+
+def load_or_train(name, key, train, directory=None):
+    """
+    Load the model stored under (name, key), or train and store it.
+    Older models with the same name are removed when a new one is stored.
+    :param name: the name of the model, e.g "app"
+    :param key: the model's fingerprint
+    :param train: function with no arguments which returns a fitted model
+    :return: the fitted model
+    """
+    path = model_path(name, key, directory)
+    if os.path.exists(path):
+        return joblib.load(path)
+
+    model = train()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temporary file first, so that other processes never load a partial model.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path, compress=3)
+    os.replace(tmp_path, path)
+
+    for old_path in glob.glob(model_path(name, "?" * 16, directory)):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return model
@@ -0,0 +1,183 @@
+"""
+Parameter sweeps: runs the walk-forward backtest over a grid of outperformance levels, probability
+thresholds and forest hyperparameters, and collects the results in one table.
+Every (outperformance level, hyperparameters) combination needs its own fits, and these run in a
+process pool; the probability thresholds only change which predictions are bought, so each fitted
+model's out-of-sample probabilities are reused for all of them.
+Example: python parameter_sweep.py --outperformance 10 25 --thresholds 0.5 0.6 0.7 --max-depth 10 0
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import labels
+import model_factory
+import portfolio
+import storage
+import walk_forward
+from feature_store import FeatureStore
+
+# The dataset, shared with the worker processes when they start (see _init_worker)
+_dataset = None
+
+
+def load_dataset(path="keystats.csv"):
+    """
+    :return: the FeatureStore of a keystats file. Missing features are filled with 0, as in the web app.
+    """
+    data = storage.load_keystats(path, index_col="Date")
+    index_col = labels.index_change_column(data)
+    data = data.dropna(subset=["Ticker", "stock_p_change", index_col])
+    return FeatureStore(data, index_column=index_col)
+
+
+def parameter_grid(outperformance_levels, params_grid, base_params=None):
+    """
+    :param outperformance_levels: the outperformance levels, in percent
+    :param params_grid: dict mapping a hyperparameter to the list of values to try
+    :param base_params: the hyperparameters which are not swept, by default the high_precision profile
+    :return: list of (outperformance, params) combinations, which each need their own fits
+    """
+    base_params = model_factory.PROFILES["high_precision"] if base_params is None else base_params
+    names = list(params_grid)
+    return [
+        (outperformance, dict(base_params, **dict(zip(names, values))))
+        for outperformance in outperformance_levels
+        for values in itertools.product(*(params_grid[name] for name in names))
+    ]
+
+
+def _init_worker(dataset):
+    global _dataset
+    _dataset = dataset
+
+
+def evaluate(outperformance, params, thresholds, dataset=None, n_jobs=None):
+    """
+    Fit the walk-forward models for one combination, and score them at every threshold.
+    :param dataset: the FeatureStore, by default the dataset of the worker process
+    :param n_jobs: see walk_forward.walk_forward_predict
+    :return: list of result rows, one per threshold
+    """
+    dataset = _dataset if dataset is None else dataset
+    y = dataset.labels(outperformance)
+    z = dataset.returns
+    folds, probabilities = walk_forward.walk_forward_predict(
+        dataset.X, y, dataset.dates, params, n_jobs=n_jobs
+    )
+    tested = ~np.isnan(probabilities)
+
+    rows = []
+    for threshold in thresholds:
+        results = walk_forward.score_folds(folds, probabilities, y, z, threshold)
+        periods = portfolio.simulate(
+            dataset.dates[tested],
+            dataset.tickers[tested],
+            z[tested, 0],
+            z[tested, 1],
+            probabilities[tested] >= threshold,
+        )
+        summary = walk_forward.summarize(results)
+        rows.append(
+            dict(
+                outperformance_level=outperformance,
+                probability_threshold=threshold,
+                **params,
+                **{"excess_return" if k == "outperformance" else k: v for k, v in summary.items()},
+                **portfolio.risk_metrics(periods),
+            )
+        )
+    return rows
+
+
+def _evaluate_combination(combination, thresholds):
+    outperformance, params = combination
+    # The pool already uses every core, so the folds are fitted one after another.
+    return evaluate(outperformance, params, thresholds, n_jobs=1)
+
+
+def sweep(dataset, outperformance_levels, thresholds, params_grid, base_params=None, n_workers=1):
+    """
+    :param dataset: the FeatureStore, see load_dataset
+    :param n_workers: number of processes across which the combinations are run. Use n_workers=1 to
+                      run them in this process, fitting the folds of each combination in parallel.
+    :return: dataframe with one row per (outperformance level, hyperparameters, threshold)
+    """
+    combinations = parameter_grid(outperformance_levels, params_grid, base_params)
+    # The labels of every level in one pass, before the dataset is sent to the workers
+    dataset.label_matrix(outperformance_levels)
+    if n_workers == 1:
+        results = [
+            evaluate(outperformance, params, thresholds, dataset)
+            for outperformance, params in tqdm(combinations, desc="Sweep")
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(dataset,)
+        ) as executor:
+            results = list(
+                tqdm(
+                    executor.map(
+                        _evaluate_combination, combinations, itertools.repeat(thresholds)
+                    ),
+                    total=len(combinations),
+                    desc="Sweep",
+                )
+            )
+    return pd.DataFrame([row for rows in results for row in rows])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backtest a grid of outperformance levels, thresholds and hyperparameters."
+    )
+    parser.add_argument("--keystats", default="keystats.csv", help="the training dataset")
+    parser.add_argument(
+        "--outperformance", type=float, nargs="+", default=[10, 25], help="outperformance levels (%%)"
+    )
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=[0.5, 0.6, 0.7],
+        help="minimum predicted probabilities for a stock to be bought",
+    )
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=[200])
+    parser.add_argument(
+        "--max-depth", type=int, nargs="+", default=[10], help="use 0 for unlimited depth"
+    )
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=[10])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of parallel processes (default: one per CPU)",
+    )
+    parser.add_argument("--output", default="sweep_results.csv", help="the results table")
+    args = parser.parse_args()
+
+    params_grid = {
+        "n_estimators": args.n_estimators,
+        "max_depth": [depth or None for depth in args.max_depth],
+        "min_samples_leaf": args.min_samples_leaf,
+    }
+    table = sweep(
+        load_dataset(args.keystats),
+        args.outperformance,
+        args.thresholds,
+        params_grid,
+        n_workers=args.workers,
+    )
+    table.to_csv(args.output, index=False)
+    columns = (
+        ["outperformance_level", "probability_threshold"]
+        + list(params_grid)
+        + ["total_trades", "precision", "excess_return", "cumulative_return", "max_drawdown", "sharpe"]
+    )
+    print(table[columns].sort_values("sharpe", ascending=False).to_string(index=False))
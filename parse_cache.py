@@ -0,0 +1,103 @@
+"""
+A persistent cache of the features parsed from html snapshots, so that parsing again only reads the
+files which are new or have changed. A file's entry is valid while its path, size and modification
+time (in nanoseconds) are unchanged, and was parsed by an extractor with the same labels and regexes
+(see extractor_key). The feature vectors are stored as float64 blobs in one SQLite file.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+import keystats_extraction
+
+DEFAULT_PATH = ".parse_cache.sqlite"
+
+# SQLite limits the number of parameters of a statement
+_BATCH_SIZE = 500
+
+
+def extractor_key(extractor):
+    """
+    :param extractor: a KeystatsExtractor
+    :return: a digest of what the extractor parses, so that entries parsed differently are not used
+    """
+    config = [
+        extractor.features,
+        sorted(extractor.fallbacks.items()),
+        keystats_extraction.VALUE_REGEX,
+        keystats_extraction.FALLBACK_VALUE_REGEX,
+    ]
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()[:16]
+
+
+def signature(path):
+    """
+    :return: the (size, mtime_ns) of a file, which must be unchanged for its entry to be used
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ParseCache:
+    def __init__(self, path=DEFAULT_PATH, key=""):
+        """
+        :param path: the SQLite file, which is created if it does not exist
+        :param key: the extractor_key of the extractor whose results are cached
+        """
+        self.path = path
+        self.key = key
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "key TEXT NOT NULL, features BLOB NOT NULL)"
+        )
+
+    def lookup(self, paths):
+        """
+        :param paths: the html files to be parsed
+        :return: a dict mapping the paths whose entries are valid to their float64 feature vectors, and
+                 a dict mapping every path to its signature, to store the entries of the others with
+        """
+        signatures = {path: signature(path) for path in paths}
+        cached = {}
+        for i in range(0, len(paths), _BATCH_SIZE):
+            batch = paths[i : i + _BATCH_SIZE]
+            query = (
+                "SELECT path, size, mtime_ns, features FROM snapshots "
+                f"WHERE key = ? AND path IN ({', '.join('?' * len(batch))})"
+            )
+            for path, size, mtime_ns, features in self.connection.execute(query, [self.key] + batch):
+                if signatures[path] == (size, mtime_ns):
+                    cached[path] = np.frombuffer(features, dtype=np.float64)
+        return cached, signatures
+
+    def store(self, signatures, values):
+        """
+        :param signatures: dict mapping each path to its signature, from lookup
+        :param values: dict mapping paths to their feature vectors
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (
+                    (path, *signatures[path], self.key, np.asarray(v, dtype=np.float64).tobytes())
+                    for path, v in values.items()
+                ),
+            )
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
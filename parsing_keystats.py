@@ -1,9 +1,16 @@
+import numpy as np
 import pandas as pd
 import os
 import time
-import re
+import argparse
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from utils import data_string_to_float
+from keystats_extraction import KeystatsExtractor, FALLBACK_LABELS
+from utils import RowAccumulator, data_strings_to_floats, find_consecutive_duplicates
+import parse_cache
+import storage
 from tqdm import tqdm
 
 
@@ -67,8 +74,8 @@ def preprocess_price_data():
     :return: SP500 and stock dataframes, with no missing rows.
     """
     # Read in SP500 data and stock data, parsing the dates.
-    sp500_raw_data = pd.read_csv("sp500_index.csv", index_col="Date", parse_dates=True)
-    stock_raw_data = pd.read_csv("stock_prices.csv", index_col="Date", parse_dates=True)
+    sp500_raw_data = storage.load_prices("sp500_index.csv")
+    stock_raw_data = storage.load_prices("stock_prices.csv")
 
     # We will reindex to include the weekends.
     start_date = str(stock_raw_data.index[0])
@@ -85,143 +92,420 @@ def preprocess_price_data():
     return sp500_raw_data, stock_raw_data
 
 
-def parse_keystats(sp500_df, stock_df):
+# Columns of the keystats dataset, in addition to the features.
+index_columns = [
+    "Date",
+    "Unix",
+    "Ticker",
+    "Price",
+    "stock_p_change",
+    "SP500",
+    "SP500_p_change",
+]
+
+# Compile the regex for all of the features once, rather than once per file and feature.
+extractor = KeystatsExtractor(features, fallbacks=FALLBACK_LABELS)
+
+# The columns produced by parsing the html files, before the prices are looked up.
+parsed_columns = ["Date", "Unix", "Ticker"] + features
+
+
+def list_ticker_directories():
+    """
+    :return: sorted list of the ticker directories in statspath, so that the row order of keystats.csv
+             does not depend on the filesystem.
+    """
+    return sorted(
+        os.path.join(statspath, ticker)
+        for ticker in os.listdir(statspath)
+        if os.path.isdir(os.path.join(statspath, ticker))
+    )
+
+
+def new_keystats_accumulator(capacity=1024):
+    """
+    :return: an empty RowAccumulator for the parsed columns. Everything except the date and ticker is numeric.
+    """
+    return RowAccumulator(
+        parsed_columns,
+        numeric_columns=["Unix"] + features,
+        capacity=capacity,
+    )
+
+
+def snapshot_files(stock_directory):
+    """
+    :return: the sorted names of the html snapshots in a ticker directory
+    """
+    keystats_html_files = sorted(os.listdir(stock_directory))
+
+    # Snippet to get rid of the .DS_Store file in macOS
+    if ".DS_Store" in keystats_html_files:
+        keystats_html_files.remove(".DS_Store")
+    return keystats_html_files
+
+
+def parse_snapshots(paths):
+    """
+    :param paths: paths of html snapshots
+    :return: float64 array of their features (a row per snapshot), with NaN for missing values
+    """
+    # The raw strings of the features, which are converted to floats in one batch at the end.
+    raw_values = []
+    for full_file_path in paths:
+        # Read in the html file as a string.
+        with open(full_file_path, "r") as source:
+            source = source.read()
+            # Remove commas from the html to make parsing easier.
+            source = source.replace(",", "")
+
+            # Search for all of the variables in one pass over the html file.
+            raw_values.append(extractor.extract_strings(source))
+    return data_strings_to_floats(raw_values).reshape(len(paths), len(features))
+
+
+def ticker_chunk(stock_directory, files, values):
+    """
+    :param files: the names of the snapshots of the ticker, see snapshot_files
+    :param values: their features, see parse_snapshots
+    :return: a columnar chunk of rows (date, unix time, ticker and features), as a RowAccumulator.
+    """
+    chunk = new_keystats_accumulator(capacity=max(len(files), 1))
+    ticker = os.path.basename(stock_directory)
+    for file, value_list in zip(files, values.tolist()):
+        # Convert the datetime format of our file to unix time
+        date_stamp = datetime.strptime(file, "%Y%m%d%H%M%S.html")
+        unix_time = time.mktime(date_stamp.timetuple())
+        chunk.append([date_stamp, unix_time, ticker] + value_list)
+    return chunk
+
+
+def parse_ticker_directory(stock_directory):
+    """
+    Parses all of the html snapshots of one ticker.
+    :param stock_directory: the directory containing the html files of the ticker.
+    :return: a columnar chunk of rows (date, unix time, ticker and features), as a RowAccumulator.
+    """
+    files = snapshot_files(stock_directory)
+    values = parse_snapshots([stock_directory + "/" + file for file in files])
+    return ticker_chunk(stock_directory, files, values)
+
+
+def _parse_in_order(tasks, n_workers):
+    """
+    :param tasks: iterable of (stock_directory, files, paths, values, ...) tuples, where values maps the
+                  paths which do not need parsing (e.g cached) to their features
+    :return: generator of (task, features of the task's other paths), in the order of the tasks. With
+             several workers, at most a few tasks per worker are parsed ahead of the consumer.
+    """
+
+    def missing(task):
+        _, _, paths, values = task[:4]
+        return [path for path in paths if path not in values]
+
+    if n_workers == 1:
+        for task in tasks:
+            yield task, parse_snapshots(missing(task))
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append((task, executor.submit(parse_snapshots, missing(task))))
+            if len(pending) > 2 * n_workers:
+                task, future = pending.popleft()
+                yield task, future.result()
+        while pending:
+            task, future = pending.popleft()
+            yield task, future.result()
+
+
+def iter_ticker_chunks(stock_list, n_workers=1, cache_path=None):
+    """
+    Parse the snapshots of each ticker directory, one ticker at a time, so that only a few tickers are
+    in memory whatever the size of the dataset.
+    :param stock_list: the ticker directories, see list_ticker_directories
+    :param n_workers: number of processes across which the ticker directories are sharded.
+    :param cache_path: optionally, a parse cache file, see parse_keystats
+    :return: generator of (stock_directory, chunk), in the order of stock_list, where the chunk is
+             a RowAccumulator of the ticker's parsed rows (see ticker_chunk)
+    """
+    cache = None
+    if cache_path is not None:
+        cache = parse_cache.ParseCache(cache_path, parse_cache.extractor_key(extractor))
+
+    def tasks():
+        # tqdm is a simple progress bar
+        for stock_directory in tqdm(stock_list, desc="Parsing progress:", unit="tickers"):
+            files = snapshot_files(stock_directory)
+            paths = [stock_directory + "/" + file for file in files]
+            values, signatures = ({}, None) if cache is None else cache.lookup(paths)
+            yield stock_directory, files, paths, values, signatures
+
+    try:
+        for task, new_values in _parse_in_order(tasks(), n_workers):
+            stock_directory, files, paths, values, signatures = task
+            new_values = dict(zip([path for path in paths if path not in values], new_values))
+            if cache is not None and new_values:
+                cache.store(signatures, new_values)
+            values.update(new_values)
+            ticker_values = np.array([values[path] for path in paths])
+            ticker_values = ticker_values.reshape(len(paths), len(features))
+            yield stock_directory, ticker_chunk(stock_directory, files, ticker_values)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def iter_batches(ticker_chunks, chunk_rows):
+    """
+    :param ticker_chunks: iterable of (stock_directory, chunk), see iter_ticker_chunks
+    :param chunk_rows: the minimum number of rows of a batch (except the last one)
+    :return: generator of (last stock_directory of the batch, RowAccumulator of the batch's rows).
+             A batch always holds all of the rows of its tickers, and is never empty.
+    """
+    batch = new_keystats_accumulator(capacity=chunk_rows)
+    for stock_directory, chunk in ticker_chunks:
+        batch.extend(chunk)
+        if len(batch) >= chunk_rows:
+            yield stock_directory, batch
+            batch = new_keystats_accumulator(capacity=chunk_rows)
+    if len(batch):
+        yield stock_directory, batch
+
+
+def iter_labeled_chunks(batches, sp500_df, stock_df):
+    """
+    :param batches: iterable of (stock_directory, RowAccumulator of parsed rows), see iter_batches
+    :return: generator of (stock_directory, dataframe of the labelled rows), without the rows with
+             missing stock price data
+    """
+    for stock_directory, batch in batches:
+        df = label_keystats(batch.to_frame(), sp500_df, stock_df)
+        yield stock_directory, df.dropna(axis=0, subset=["Price", "stock_p_change"])
+
+
+def label_keystats(parsed_df, sp500_df, stock_df):
+    """
+    Adds the stock price and SP500 price now and one year from now, and their percentage changes, to the
+    parsed (ticker, date) table. Rather than looking up each snapshot separately, we resolve the row and
+    column positions of every price with one get_indexer call each, then compute the changes as arrays.
+    Snapshots for which a price is missing (unknown ticker, or a date outside the price data) are
+    skipped, as before.
+    :param parsed_df: dataframe with the parsed_columns, e.g from parse_ticker_directory
+    :param sp500_df: dataframe containing SP500 prices, with a row for every day
+    :param stock_df: dataframe containing stock prices, with a row for every day
+    :return: a dataframe with the index_columns followed by the features.
+    """
+    # The snapshot date and the date one year (365 days) later.
+    current_dates = pd.DatetimeIndex(parsed_df["Date"]).normalize()
+    one_year_later = current_dates + pd.Timedelta(days=365)
+
+    sp500_prices = sp500_df["Adj Close"].to_numpy(dtype=float)
+    sp500_now = sp500_df.index.get_indexer(current_dates)
+    sp500_later = sp500_df.index.get_indexer(one_year_later)
+
+    stock_prices = stock_df.to_numpy(dtype=float)
+    stock_now = stock_df.index.get_indexer(current_dates)
+    stock_later = stock_df.index.get_indexer(one_year_later)
+    stock_column = stock_df.columns.get_indexer(parsed_df["Ticker"].str.upper())
+
+    # get_indexer returns -1 where a date or ticker is missing: we must skip these datapoints.
+    found = (
+        (sp500_now >= 0)
+        & (sp500_later >= 0)
+        & (stock_now >= 0)
+        & (stock_later >= 0)
+        & (stock_column >= 0)
+    )
+    df = parsed_df[found].reset_index(drop=True)
+    sp500_now, sp500_later = sp500_now[found], sp500_later[found]
+    stock_now, stock_later, stock_column = (
+        stock_now[found],
+        stock_later[found],
+        stock_column[found],
+    )
+
+    sp500_price = sp500_prices[sp500_now]
+    sp500_1y_price = sp500_prices[sp500_later]
+    stock_price = stock_prices[stock_now, stock_column]
+    stock_1y_price = stock_prices[stock_later, stock_column]
+
+    df["Price"] = stock_price
+    df["stock_p_change"] = np.round((stock_1y_price - stock_price) / stock_price * 100, 2)
+    df["SP500"] = sp500_price
+    df["SP500_p_change"] = np.round(
+        (sp500_1y_price - sp500_price) / sp500_price * 100, 2
+    )
+    return df[index_columns + features]
+
+
+def check_duplicates(df, max_fraction):
+    """
+    A quality gate after parsing: consecutive duplicate values in a row are a symptom of failed parsing
+    (see utils.find_consecutive_duplicates), typically after Yahoo changed their html.
+    :param df: the parsed keystats dataframe
+    :param max_fraction: the largest acceptable fraction of rows with consecutive duplicates
+    :return: the table of consecutive duplicates. Raises ValueError if too many rows have duplicates.
+    """
+    duplicates = find_consecutive_duplicates(df)
+    n_rows = duplicates["row"].nunique()
+    if n_rows > max_fraction * len(df):
+        most_common = duplicates["columns"].value_counts().head()
+        raise ValueError(
+            f"{n_rows} of {len(df)} rows have consecutive duplicate values, more than "
+            f"{max_fraction:.1%}. The most common columns are:\n{most_common.to_string()}"
+        )
+    return duplicates
+
+
+def parse_keystats(
+    sp500_df,
+    stock_df,
+    n_workers=1,
+    max_duplicate_fraction=None,
+    cache_path=None,
+):
     """
     We have downloaded a large number of html files, which are snapshots of a ticker at different times,
-    containing the fundamental data (our features). To extract the key statistics, we use regex.
+    containing the fundamental data (our features). To extract the key statistics, we use regex
+    (see keystats_extraction.KeystatsExtractor, which finds every feature in a single pass over the file).
     For supervised machine learning, we also need the data that will form our dependent variable,
-    the performance of the stock compared to the SP500.
+    the performance of the stock compared to the SP500, which label_keystats adds once everything is parsed.
+    The whole dataset is held in memory: stream_keystats (used by the command line) writes it in chunks.
     :sp500_df: dataframe containing SP500 prices
     :stock_df: dataframe containing stock prices
+    :n_workers: number of processes across which the ticker directories are sharded.
+                Use n_workers=1 to parse serially in this process, e.g for debugging.
+    :max_duplicate_fraction: if given, the dataset is not saved (and check_duplicates raises ValueError)
+                             when a larger fraction of its rows have consecutive duplicate values.
+    :cache_path: optionally, a parse cache file (see parse_cache), so that only the new or changed html
+                 files are parsed, e.g parse_cache.DEFAULT_PATH as the command line uses. By default,
+                 every file is parsed without a cache.
     :return: a dataframe of training data (i.e features and the components of our dependent variable)
     """
     # The tickers whose data is to be parsed.
-    stock_list = [x[0] for x in os.walk(statspath)]
-    stock_list = stock_list[1:]
-
-    # Creating a new dataframe which we will later fill.
-    df_columns = [
-        "Date",
-        "Unix",
-        "Ticker",
-        "Price",
-        "stock_p_change",
-        "SP500",
-        "SP500_p_change",
-    ] + features
-
-    df = pd.DataFrame(columns=df_columns)
-
-    # tqdm is a simple progress bar
-    for stock_directory in tqdm(stock_list, desc="Parsing progress:", unit="tickers"):
-        keystats_html_files = os.listdir(stock_directory)
-
-        # Snippet to get rid of the .DS_Store file in macOS
-        if ".DS_Store" in keystats_html_files:
-            keystats_html_files.remove(".DS_Store")
-
-        ticker = stock_directory.split(statspath)[1]
-
-        for file in keystats_html_files:
-            # Convert the datetime format of our file to unix time
-            date_stamp = datetime.strptime(file, "%Y%m%d%H%M%S.html")
-            unix_time = time.mktime(date_stamp.timetuple())
-
-            # Read in the html file as a string.
-            full_file_path = stock_directory + "/" + file
-
-            # This will store the parsed values
-            value_list = []
-
-            with open(full_file_path, "r") as source:
-                source = source.read()
-                # Remove commas from the html to make parsing easier.
-                source = source.replace(",", "")
-
-                # Regex search for the different variables in the html file, then append to value_list
-                for variable in features:
-                    # Search for the table entry adjacent to the variable name.
-                    try:
-                        regex = (
-                            r">"
-                            + re.escape(variable)
-                            + r".*?(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0|NaN)%?"
-                            r"(</td>|</span>)"
-                        )
-                        value = re.search(regex, source, flags=re.DOTALL).group(1)
-
-                        # Dealing with number formatting
-                        value_list.append(data_string_to_float(value))
-
-                    # The data may not be present. Process accordingly
-                    except AttributeError:
-                        # In the past, 'Avg Vol' was instead named 'Average Volume'
-                        # If 'Avg Vol' fails, search for 'Average Volume'.
-                        if variable == "Avg Vol (3 month)":
-                            try:
-                                new_variable = ">Average Volume (3 month)"
-                                regex = (
-                                    re.escape(new_variable)
-                                    + r".*?(\-?\d+\.*\d*K?M?B?|N/A[\\n|\s]*|>0)%?"
-                                    r"(</td>|</span>)"
-                                )
-                                value = re.search(regex, source, flags=re.DOTALL).group(
-                                    1
-                                )
-                                value_list.append(data_string_to_float(value))
-                            except AttributeError:
-                                value_list.append("N/A")
-                        else:
-                            value_list.append("N/A")
-
-            # We need the stock price and SP500 price now and one year from now.
-            # Convert from unix time to YYYY-MM-DD, so we can look for the price in the dataframe
-            # then calculate the percentage change.
-            current_date = datetime.fromtimestamp(unix_time).strftime("%Y-%m-%d")
-            one_year_later = datetime.fromtimestamp(unix_time + 31536000).strftime(
-                "%Y-%m-%d"
-            )
-
-            # SP500 prices now and one year later, and the percentage change
-            sp500_price = float(sp500_df.loc[current_date, "Adj Close"])
-            sp500_1y_price = float(sp500_df.loc[one_year_later, "Adj Close"])
-            sp500_p_change = round(
-                ((sp500_1y_price - sp500_price) / sp500_price * 100), 2
-            )
-
-            # Stock prices now and one year later. We need a try/except because some data is missing
-            stock_price, stock_1y_price = "N/A", "N/A"
-            try:
-                stock_price = float(stock_df.loc[current_date, ticker.upper()])
-                stock_1y_price = float(stock_df.loc[one_year_later, ticker.upper()])
-            except KeyError:
-                # If stock data is missing, we must skip this datapoint
-                # print(f"PRICE RETRIEVAL ERROR for {ticker}")
-                continue
-
-            stock_p_change = round(
-                ((stock_1y_price - stock_price) / stock_price * 100), 2
-            )
-
-            # Append all our data to the dataframe.
-            new_df_row = [
-                date_stamp,
-                unix_time,
-                ticker,
-                stock_price,
-                stock_p_change,
-                sp500_price,
-                sp500_p_change,
-            ] + value_list
+    stock_list = list_ticker_directories()
+    chunks = [chunk for _, chunk in iter_ticker_chunks(stock_list, n_workers, cache_path)]
 
-            df = df.append(dict(zip(df_columns, new_df_row)), ignore_index=True)
+    # Merge the columnar chunks from each ticker, then build the dataframe once.
+    rows = new_keystats_accumulator(capacity=sum(len(chunk) for chunk in chunks))
+    for chunk in chunks:
+        rows.extend(chunk)
+    df = label_keystats(rows.to_frame(), sp500_df, stock_df)
 
     # Remove rows with missing stock price data
     df.dropna(axis=0, subset=["Price", "stock_p_change"], inplace=True)
-    # Output the CSV
-    df.to_csv("keystats.csv", index=False)
+    if max_duplicate_fraction is not None:
+        check_duplicates(df, max_duplicate_fraction)
+    # Output the dataset (Parquet, and CSV for export)
+    storage.save_keystats(df, "keystats.csv")
+    return df
+
+
+def progress_path(path):
+    """
+    :return: the path of the file which records the progress of stream_keystats writing path
+    """
+    return path + ".progress"
+
+
+def stream_keystats(
+    sp500_df,
+    stock_df,
+    path="keystats.csv",
+    n_workers=1,
+    cache_path=None,
+    chunk_rows=50_000,
+    resume=False,
+    max_duplicate_fraction=None,
+):
+    """
+    Build the keystats dataset as a pipeline of generators: ticker directories -> parsed rows ->
+    labelled rows -> a chunked writer (CSV, and Parquet row groups), so that memory use does not grow
+    with the number of snapshots. After each chunk, the last ticker written and the size of the CSV are
+    recorded in progress_path(path), so that a build which was interrupted can be resumed.
+    :param path: the CSV file; the Parquet file is written next to it.
+    :param n_workers: see parse_keystats
+    :param cache_path: see parse_keystats
+    :param chunk_rows: the snapshots are labelled and written in chunks of at least this many parsed
+                       rows (a chunk always holds all of a ticker's rows).
+    :param resume: continue after the last ticker recorded in the progress file (if there is one).
+                   The CSV is extended; the Parquet file is removed, as Parquet files cannot be appended
+                   to, so run `python storage.py` to convert the finished CSV.
+    :param max_duplicate_fraction: if given, check_duplicates is applied to every chunk before it is
+                                   written, and raises ValueError (leaving the build resumable).
+    :return: the number of rows written by this call
+    """
+    stock_list = list_ticker_directories()
+    progress = None
+    if resume and os.path.exists(progress_path(path)):
+        with open(progress_path(path)) as f:
+            progress = json.load(f)
+        # Drop anything written after the last recorded chunk, e.g a chunk interrupted halfway.
+        with open(path, "r+b") as f:
+            f.truncate(progress["csv_size"])
+        if os.path.exists(storage.columnar_path(path)):
+            os.remove(storage.columnar_path(path))
+        stock_list = [d for d in stock_list if os.path.basename(d) > progress["ticker"]]
+
+    labeled = iter_labeled_chunks(
+        iter_batches(iter_ticker_chunks(stock_list, n_workers, cache_path), chunk_rows),
+        sp500_df,
+        stock_df,
+    )
+    with storage.KeystatsChunkWriter(path, append=progress is not None) as writer:
+        for stock_directory, df in labeled:
+            if len(df) == 0:
+                continue
+            if max_duplicate_fraction is not None:
+                check_duplicates(df, max_duplicate_fraction)
+            writer.write(df)
+            with open(progress_path(path), "w") as f:
+                json.dump(
+                    {"ticker": os.path.basename(stock_directory), "csv_size": os.path.getsize(path)},
+                    f,
+                )
+        if writer.n_rows == 0 and progress is None:
+            # A new dataset is written even if it has no rows, with its header
+            writer.write(pd.DataFrame(columns=index_columns + features))
+    if os.path.exists(progress_path(path)):
+        os.remove(progress_path(path))
+    return writer.n_rows
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build keystats.csv from intraQuarter")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of parsing processes (1 parses serially, for debugging)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"parse every html file, rather than only those which are not in {parse_cache.DEFAULT_PATH}",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted build after the last ticker which was written",
+    )
+    parser.add_argument(
+        "--max-duplicate-fraction",
+        type=float,
+        default=0.05,
+        help="stop if more of the rows of a chunk have consecutive duplicate values, "
+        "a symptom of failed parsing (default: 0.05)",
+    )
+    args = parser.parse_args()
+
     sp500_df, stock_df = preprocess_price_data()
-    parse_keystats(sp500_df, stock_df)
+    stream_keystats(
+        sp500_df,
+        stock_df,
+        n_workers=args.workers,
+        cache_path=None if args.no_cache else parse_cache.DEFAULT_PATH,
+        resume=args.resume,
+        max_duplicate_fraction=args.max_duplicate_fraction,
+    )
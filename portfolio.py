@@ -0,0 +1,115 @@
+"""
+Vectorized portfolio simulation. Predictions are turned into an equal-weight or probability-weighted
+portfolio for every rebalance period, which is held for the label horizon (the period over which
+stock_p_change is measured), and compared to the index. All of the computations are NumPy array
+operations over the rows, without Python loops over periods or tickers.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def simulate(
+    dates,
+    tickers,
+    stock_change,
+    index_change,
+    selected,
+    probabilities=None,
+    weighting="equal",
+    freq="Y",
+):
+    """
+    Build a portfolio per rebalance period from the selected rows of that period.
+    :param dates: the date of every row
+    :param tickers: the ticker of every row
+    :param stock_change: the stock's percentage change over the holding period of every row
+    :param index_change: the index's percentage change over the same period
+    :param selected: boolean array, the rows which are bought
+    :param probabilities: the predicted probability of every row, for weighting="probability"
+    :param weighting: "equal" to weight the holdings of a period equally, or "probability" to weight
+                      them by their predicted probability
+    :param freq: the rebalance frequency, as a pandas period frequency, or None to rebalance on every
+                 date. The holding period should match the frequency, e.g yearly for one-year returns.
+    :return: dataframe indexed by the start of each rebalance period, with the portfolio and index
+             returns (in percent), the number of holdings, the hit rate (the fraction of holdings which
+             beat the index) and the turnover (the sum of the absolute changes of the weights, so 1.0
+             when entering from cash and 2.0 when every holding is replaced).
+             A period without holdings is in cash: its portfolio return is zero.
+    """
+    dates = pd.DatetimeIndex(dates)
+    stock_change = np.asarray(stock_change, dtype=np.float64)
+    index_change = np.asarray(index_change, dtype=np.float64)
+    selected = np.asarray(selected, dtype=bool)
+
+    rebalance = dates if freq is None else dates.to_period(freq).start_time
+    period_codes, periods = pd.factorize(rebalance, sort=True)
+    ticker_codes, ticker_names = pd.factorize(np.asarray(tickers))
+    n_periods, n_tickers = len(periods), len(ticker_names)
+
+    if weighting == "equal":
+        scores = selected.astype(np.float64)
+    elif weighting == "probability":
+        scores = np.where(selected, np.asarray(probabilities, dtype=np.float64), 0.0)
+    else:
+        raise ValueError(f"Unknown weighting: {weighting}")
+    totals = np.bincount(period_codes, weights=scores, minlength=n_periods)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = np.where(totals[period_codes] > 0, scores / totals[period_codes], 0.0)
+
+    n_holdings = np.bincount(period_codes, weights=selected, minlength=n_periods)
+    portfolio_return = np.bincount(period_codes, weights=weights * stock_change, minlength=n_periods)
+    # The index return of a period is the average over all of its rows, held or not
+    index_return = np.bincount(period_codes, weights=index_change, minlength=n_periods) / np.bincount(
+        period_codes, minlength=n_periods
+    )
+    hits = np.bincount(
+        period_codes, weights=selected & (stock_change > index_change), minlength=n_periods
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_rate = hits / n_holdings
+
+    # periods x tickers weight matrix, for the turnover between consecutive rebalances
+    weight_matrix = np.bincount(
+        period_codes * n_tickers + ticker_codes, weights=weights, minlength=n_periods * n_tickers
+    ).reshape(n_periods, n_tickers)
+    turnover = np.abs(np.diff(weight_matrix, axis=0, prepend=0)).sum(axis=1)
+
+    return pd.DataFrame(
+        {
+            "portfolio_return": portfolio_return,
+            "index_return": index_return,
+            "excess_return": portfolio_return - index_return,
+            "n_holdings": n_holdings.astype(int),
+            "hit_rate": hit_rate,
+            "turnover": turnover,
+        },
+        index=pd.DatetimeIndex(periods, name="period"),
+    )
+
+
+def risk_metrics(periods, periods_per_year=1, risk_free=0.0):
+    """
+    :param periods: the result of simulate
+    :param periods_per_year: the number of rebalances per year, to annualise the Sharpe ratio
+    :param risk_free: the risk-free return per period, in percent
+    :return: dict with the cumulative returns of the portfolio and the index, the maximum drawdown
+             (all in percent), the annualised Sharpe ratio, the hit rate over all holdings and the
+             average turnover.
+    """
+    returns = periods["portfolio_return"].to_numpy() / 100
+    index_returns = periods["index_return"].to_numpy() / 100
+    wealth = np.cumprod(1 + returns)
+    drawdown = wealth / np.maximum.accumulate(wealth) - 1 if len(wealth) else wealth
+    excess = returns - risk_free / 100
+    std = excess.std(ddof=1) if len(excess) > 1 else 0.0
+    n_holdings = periods["n_holdings"].to_numpy()
+    hits = np.nan_to_num(periods["hit_rate"].to_numpy()) * n_holdings
+    return {
+        "cumulative_return": float(100 * (wealth[-1] - 1)) if len(wealth) else 0.0,
+        "index_cumulative_return": float(100 * (np.prod(1 + index_returns) - 1)),
+        "max_drawdown": float(100 * drawdown.min()) if len(drawdown) else 0.0,
+        "sharpe": float(excess.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        "hit_rate": float(hits.sum() / n_holdings.sum()) if n_holdings.sum() else 0.0,
+        "turnover": float(periods["turnover"].mean()) if len(periods) else 0.0,
+    }
@@ -0,0 +1,108 @@
+"""
+Batched predictions for the web app. The forward sample's feature matrix is built once, and the
+probability that a ticker outperforms is cached per (model version, forward sample version, ticker) in
+an LRU cache, so that a request for many tickers scores only the uncached ones, in one predict_proba
+call.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """A thread-safe mapping which holds at most maxsize items, evicting the least recently used."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        :return: dict of the keys which are cached, and their values
+        """
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.items:
+                    self.items.move_to_end(key)
+                    found[key] = self.items[key]
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            for key, value in items:
+                self.items[key] = value
+                self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Distinguishes forward samples which are not given a version
+_sample_numbers = itertools.count()
+
+
+class ForwardSample:
+    """The feature matrix of the current fundamentals of every ticker, with a ticker -> row lookup."""
+
+    def __init__(self, tickers, X, version=None):
+        """
+        :param tickers: the ticker of every row
+        :param X: the feature matrix, in the order of the training features
+        :param version: hashable version of the data the matrix was built from, e.g the forward file's
+                        modification time. By default, every ForwardSample is a new version.
+        """
+        self.tickers = np.asarray(tickers)
+        self.X = X
+        self.version = ("sample", next(_sample_numbers)) if version is None else version
+        # If a ticker has several rows, the last one is the most recent
+        self.rows = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_frame(cls, df, store, version=None):
+        """
+        :param df: the forward sample dataframe
+        :param store: the training data's FeatureStore, whose features (and fill value) are used
+        :param version: the version of the forward sample dataframe
+        """
+        df = df[df["Ticker"].notna()]
+        return cls(df["Ticker"].astype(str).values, store.matrix(df), version)
+
+
+def outperform_probabilities(model, X):
+    """
+    :return: the probability that each row of X outperforms, from one predict_proba call
+    """
+    return model.predict_proba(X)[:, 1]
+
+
+class Predictor:
+    """Scores tickers of a forward sample, caching the scores per (model version, sample version, ticker)."""
+
+    def __init__(self, cache_size=4096):
+        self.cache = LRUCache(cache_size)
+
+    def predict_tickers(self, model, model_version, forward, tickers):
+        """
+        :param model: the fitted classifier
+        :param model_version: identifies the model, e.g its model registry key
+        :param forward: the ForwardSample, whose scores are cached under its version
+        :param tickers: the tickers to score
+        :return: dict mapping each ticker which is in the forward sample to its probability
+        """
+        keys = [(model_version, forward.version, t) for t in tickers if t in forward.rows]
+        scores = {ticker: p for (_, _, ticker), p in self.cache.get_many(keys).items()}
+        missing = list(dict.fromkeys(ticker for _, _, ticker in keys if ticker not in scores))
+        if missing:
+            rows = [forward.rows[ticker] for ticker in missing]
+            probabilities = outperform_probabilities(model, forward.X[rows])
+            new_scores = dict(zip(missing, probabilities.tolist()))
+            self.cache.put_many(((model_version, forward.version, t), p) for t, p in new_scores.items())
+            scores.update(new_scores)
+        return scores
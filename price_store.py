@@ -0,0 +1,125 @@
+"""
+Memory-mapped store for wide (dates x tickers) price matrices such as indian_stock_prices.csv.
+The prices are kept as a float32 NumPy file in column-major order, next to a date index and a ticker
+index, so that processes which read the matrix (e.g fetch_indian_data.relabel, which labels the
+training data from it) map one physical copy of the data through the page cache instead of parsing it,
+(date, ticker) lookups are O(1) and ticker columns are zero-copy slices. Saving replaces each file atomically, so a reader which has the matrix mapped keeps
+reading the previous version.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+PRICES_FILE = "prices.npy"
+DATES_FILE = "dates.npy"
+TICKERS_FILE = "tickers.json"
+
+
+def store_path(path):
+    """
+    :param path: path of the price dataset's CSV file, e.g indian_stock_prices.csv
+    :return: path of the price store directory, e.g indian_stock_prices.store
+    """
+    return os.path.splitext(path)[0] + ".store"
+
+
+def _replace(path, write):
+    """
+    Atomically replace a file: write(f) writes its new contents to a temporary file in the same
+    directory, which is then renamed over it.
+    """
+    temporary_path = path + ".tmp"
+    try:
+        with open(temporary_path, "wb") as f:
+            write(f)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+class PriceStore:
+    """
+    A dates x tickers float32 price matrix with date and ticker indices.
+    Use PriceStore.open to memory-map a stored matrix, or PriceStore.from_frame to wrap a dataframe.
+    """
+
+    def __init__(self, prices, dates, tickers):
+        """
+        :param prices: 2-D float32 array (dates x tickers), ideally column-major.
+        :param dates: DatetimeIndex of the rows
+        :param tickers: list of the column names
+        """
+        self.prices = prices
+        self.dates = pd.DatetimeIndex(dates, name="Date")
+        self.tickers = list(tickers)
+        self._date_pos = {date: i for i, date in enumerate(self.dates)}
+        self._ticker_pos = {ticker: j for j, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        :param df: price dataframe with a datetime index and one column per ticker
+        """
+        prices = np.asfortranarray(df.to_numpy(dtype=np.float32))
+        return cls(prices, df.index, df.columns)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a stored price matrix (read-only).
+        :param path: the store directory, see store_path
+        """
+        prices = np.load(os.path.join(path, PRICES_FILE), mmap_mode="r")
+        dates = np.load(os.path.join(path, DATES_FILE))
+        with open(os.path.join(path, TICKERS_FILE)) as f:
+            tickers = json.load(f)
+        if prices.shape != (len(dates), len(tickers)):
+            # The store was opened while it was being saved
+            raise ValueError(f"Inconsistent price store {path}: {prices.shape} prices, "
+                             f"{len(dates)} dates and {len(tickers)} tickers")
+        return cls(prices, dates, tickers)
+
+    def save(self, path):
+        """
+        Write the store to a directory. The matrix is written column-major, so that each ticker's
+        prices are contiguous on disk. Each file is written to a temporary file which then replaces
+        it, never in place, as other processes may have the matrix memory-mapped. The matrix is
+        replaced last, as its modification time is the store's (see storage.load_price_store).
+        """
+        os.makedirs(path, exist_ok=True)
+        _replace(os.path.join(path, DATES_FILE), lambda f: np.save(f, self.dates.values))
+        _replace(
+            os.path.join(path, TICKERS_FILE),
+            lambda f: f.write(json.dumps(self.tickers).encode()),
+        )
+        _replace(
+            os.path.join(path, PRICES_FILE), lambda f: np.save(f, np.asfortranarray(self.prices))
+        )
+
+    @property
+    def shape(self):
+        return self.prices.shape
+
+    def price(self, date, ticker):
+        """
+        :return: the price of ticker on date (NaN if there was none). Raises KeyError for an unknown
+                 date or ticker.
+        """
+        return self.prices[self._date_pos[pd.Timestamp(date)], self._ticker_pos[ticker]]
+
+    def column(self, ticker):
+        """
+        :return: all of the prices of one ticker, as a zero-copy view of the matrix.
+        """
+        return self.prices[:, self._ticker_pos[ticker]]
+
+    def to_frame(self):
+        """
+        :return: a dataframe over the matrix. For a memory-mapped store, this does not copy the data,
+                 so the dataframe is read-only.
+        """
+        return pd.DataFrame(self.prices, index=self.dates, columns=self.tickers, copy=False)
@@ -1,6 +1,8 @@
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from utils import data_string_to_float, status_calc
+import argparse
+
+import storage
+import model_factory
+from feature_store import FeatureStore
 
 
 # The percentage by which a stock has to beat the S&P500 to be considered a 'buy'
@@ -10,21 +12,12 @@ OUTPERFORMANCE = 10
 def build_data_set():
     """
     Reads the keystats.csv file and prepares it for scikit-learn
-    :return: X_train and y_train numpy arrays
+    :return: X_train (float32) and y_train (boolean) read-only numpy arrays
     """
-    training_data = pd.read_csv("keystats.csv", index_col="Date")
-    training_data.dropna(axis=0, how="any", inplace=True)
-    features = training_data.columns[6:]
-
-    X_train = training_data[features].values
+    store = FeatureStore.load("keystats.csv")
+    X_train = store.X
     # Generate the labels: '1' if a stock beats the S&P500 by more than 10%, else '0'.
-    y_train = list(
-        status_calc(
-            training_data["stock_p_change"],
-            training_data["SP500_p_change"],
-            OUTPERFORMANCE,
-        )
-    )
+    y_train = store.labels(OUTPERFORMANCE)
 
     return X_train, y_train
 
@@ -32,11 +25,11 @@ def build_data_set():
 def predict_stocks():
     X_train, y_train = build_data_set()
     # Remove the random_state parameter to generate actual predictions
-    clf = RandomForestClassifier(n_estimators=100, random_state=0)
+    clf = model_factory.classifier("baseline")
     clf.fit(X_train, y_train)
 
     # Now we get the actual data from which we want to generate predictions.
-    data = pd.read_csv("forward_sample.csv", index_col="Date")
+    data = storage.load_forward_sample("forward_sample.csv", index_col="Date")
     data.dropna(axis=0, how="any", inplace=True)
     features = data.columns[6:]
     X_test = data[features].values
@@ -56,5 +49,9 @@ def predict_stocks():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict which stocks will outperform the S&P500.")
+    model_factory.add_n_jobs_argument(parser)
+    args = parser.parse_args()
+    model_factory.set_default_n_jobs(args.n_jobs)
     print("Building dataset and predicting stocks...")
     predict_stocks()
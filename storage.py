@@ -0,0 +1,251 @@
+"""
+Typed columnar storage for the keystats and price datasets.
+Each dataset is stored as Parquet next to its CSV (e.g keystats.parquet next to keystats.csv), with the
+dtypes fixed up front: float32 features, categorical Ticker and datetime dates. Loaders read the Parquet
+file when it is at least as new as the CSV, and otherwise fall back to parsing the CSV, which stays
+available as an export format.
+Run `python storage.py` to convert the existing CSV datasets.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from price_store import PRICES_FILE, PriceStore, store_path
+
+# Columns of the keystats and forward sample datasets which are not fundamental features.
+NON_FEATURE_COLUMNS = [
+    "Date",
+    "Unix",
+    "Ticker",
+    "Price",
+    "stock_p_change",
+    "SP500",
+    "SP500_p_change",
+    "NIFTY50",
+    "NIFTY50_p_change",
+]
+
+# Wide (dates x tickers) price matrices, which are also kept as a memory-mapped PriceStore.
+PRICE_MATRIX_FILES = ["stock_prices.csv", "indian_stock_prices.csv"]
+
+# The datasets converted by `python storage.py`, and how to load them.
+KEYSTATS_FILES = ["keystats.csv", "indian_keystats.csv"]
+FORWARD_SAMPLE_FILES = ["forward_sample.csv", "indian_forward_sample.csv"]
+PRICE_FILES = [
+    "stock_prices.csv",
+    "sp500_index.csv",
+    "indian_stock_prices.csv",
+    "nifty50_index.csv",
+]
+
+
+def columnar_path(path):
+    """
+    :param path: path of a dataset's CSV file
+    :return: path of the dataset's Parquet file
+    """
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def _read_columnar(path, columns=None):
+    """
+    :return: the Parquet version of the dataset if it is at least as new as the CSV, else None.
+    """
+    columnar = columnar_path(path)
+    if not os.path.exists(columnar):
+        return None
+    if os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(columnar):
+        return None
+    return pd.read_parquet(columnar, columns=columns)
+
+
+def feature_columns(df):
+    """
+    :return: the fundamental feature columns of a keystats or forward sample dataframe.
+    """
+    return [column for column in df.columns if column not in NON_FEATURE_COLUMNS]
+
+
+def csv_date_format(dates):
+    """
+    :param dates: array-like of datetimes, e.g a keystats Date column or index
+    :return: the format of the dates in the CSV datasets, which pandas writes without the time of day if
+             all of the dates are at midnight: '%Y-%m-%d' or '%Y-%m-%d %H:%M:%S'
+    """
+    dates = pd.DatetimeIndex(dates)
+    return "%Y-%m-%d" if (dates == dates.normalize()).all() else "%Y-%m-%d %H:%M:%S"
+
+
+def apply_keystats_dtypes(df, parse_dates=True):
+    """
+    Fix the dtypes of a keystats or forward sample dataframe: float32 features, categorical Ticker and,
+    if parse_dates, datetime Date. The other price columns stay float64.
+    """
+    features = feature_columns(df)
+    df[features] = df[features].astype(np.float32)
+    if "Ticker" in df.columns:
+        df["Ticker"] = df["Ticker"].astype("category")
+    if parse_dates and "Date" in df.columns:
+        df["Date"] = pd.to_datetime(df["Date"])
+    return df
+
+
+def load_keystats(path="keystats.csv", index_col=None, columns=None):
+    """
+    Load a training dataset (keystats.csv or indian_keystats.csv).
+    :param index_col: optionally, the column to use as the index, e.g "Date".
+    :param columns: optionally, only load these columns.
+    :return: the dataframe, with fixed dtypes.
+    """
+    df = _read_columnar(path, columns)
+    if df is None:
+        df = pd.read_csv(path, usecols=columns)
+    df = apply_keystats_dtypes(df)
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+
+def load_forward_sample(path="forward_sample.csv", index_col=None):
+    """
+    Load a forward sample (current fundamentals). Its Date column is not parsed, since the US forward
+    sample has no dates.
+    """
+    df = _read_columnar(path)
+    if df is None:
+        df = pd.read_csv(path)
+    df = apply_keystats_dtypes(df, parse_dates=False)
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+
+def load_prices(path):
+    """
+    Load a price dataset (dates x tickers, or an index's price columns) with a datetime index.
+    """
+    df = _read_columnar(path)
+    if df is None:
+        df = pd.read_csv(path, index_col="Date", parse_dates=True)
+    return df
+
+
+def save_keystats(df, path="keystats.csv", csv=True, parse_dates=True):
+    """
+    Save a keystats or forward sample dataframe as Parquet and, if csv, also export it as CSV.
+    :param path: path of the CSV file; the Parquet file is written next to it.
+    :param parse_dates: whether to store Date as datetime (False for forward samples).
+    """
+    if csv:
+        df.to_csv(path, index=False)
+    df = apply_keystats_dtypes(df.copy(), parse_dates=parse_dates)
+    df.to_parquet(columnar_path(path), index=False)
+
+
+def load_price_store(path):
+    """
+    Load a wide price matrix as a PriceStore: memory-mapped if its store is at least as new as the CSV,
+    otherwise built in memory from the CSV or Parquet file.
+    """
+    store = store_path(path)
+    # The matrix file (not the directory) is rewritten by every save.
+    matrix = os.path.join(store, PRICES_FILE)
+    if os.path.exists(matrix) and not (
+        os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(matrix)
+    ):
+        return PriceStore.open(store)
+    return PriceStore.from_frame(load_prices(path))
+
+
+def save_prices(df, path, csv=True):
+    """
+    Save a price dataframe (indexed by date) as Parquet and, if csv, also export it as CSV.
+    Wide price matrices are also written as a memory-mapped PriceStore.
+    """
+    if csv:
+        df.to_csv(path)
+    df.to_parquet(columnar_path(path))
+    if os.path.basename(path) in PRICE_MATRIX_FILES:
+        PriceStore.from_frame(df).save(store_path(path))
+
+
+class KeystatsChunkWriter:
+    """
+    Writes a keystats dataset chunk by chunk, as CSV and as Parquet row groups, so that the whole
+    dataset never has to be held in memory. Parquet files cannot be appended to, so with append=True
+    only the CSV is extended (loaders then fall back to the CSV until the dataset is converted again).
+    The Parquet file is written to a temporary path and only replaces the dataset's Parquet file when
+    the writer is closed without an error, so an interrupted write never leaves a truncated file.
+    """
+
+    def __init__(self, path, append=False, csv=True):
+        self.path = path
+        self.append = append
+        self.csv = csv
+        self.parquet_writer = None
+        self.n_rows = 0
+
+    def write(self, chunk):
+        if self.csv:
+            first_write = self.n_rows == 0 and not self.append
+            chunk.to_csv(
+                self.path, mode="w" if first_write else "a", header=first_write, index=False
+            )
+        if not self.append:
+            chunk = apply_keystats_dtypes(chunk.copy())
+            # Categories differ between chunks, so store tickers as plain strings.
+            if "Ticker" in chunk.columns:
+                chunk["Ticker"] = chunk["Ticker"].astype(str)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(
+                    self._temporary_path(), table.schema
+                )
+            self.parquet_writer.write_table(table)
+        self.n_rows += len(chunk)
+
+    def _temporary_path(self):
+        return columnar_path(self.path) + ".tmp"
+
+    def close(self, complete=True):
+        """
+        :param complete: whether the dataset was written completely, so that its Parquet file is
+                         installed. Otherwise it is discarded.
+        """
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+            if complete:
+                os.replace(self._temporary_path(), columnar_path(self.path))
+            else:
+                os.remove(self._temporary_path())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+
+def convert_to_columnar(path):
+    """
+    Write the Parquet version of an existing CSV dataset.
+    """
+    name = os.path.basename(path)
+    if name in PRICE_FILES:
+        save_prices(load_prices(path), path, csv=False)
+    elif name in FORWARD_SAMPLE_FILES:
+        save_keystats(load_forward_sample(path), path, csv=False, parse_dates=False)
+    else:
+        save_keystats(load_keystats(path), path, csv=False)
+
+
+if __name__ == "__main__":
+    for path in KEYSTATS_FILES + FORWARD_SAMPLE_FILES + PRICE_FILES:
+        if os.path.exists(path):
+            convert_to_columnar(path)
+            print(f"{path} -> {columnar_path(path)}")
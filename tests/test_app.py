@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("flask")
+
+import app  # noqa: E402
+
+
+def test_backtest_options():
+    assert app.backtest_options({}) == (app.MIN_PROBABILITY_THRESHOLD, None, "equal")
+    assert app.backtest_options({"threshold": "0.8", "window": "3", "weighting": "probability"}) == (
+        0.8, 3, "probability"
+    )
+    for options in [{"threshold": "high"}, {"threshold": "nan"}, {"threshold": "2"},
+                    {"window": "3.5"}, {"window": "0"}, {"weighting": "cap"}]:
+        with pytest.raises(ValueError):
+            app.backtest_options(options)
+
+
+def test_invalid_backtest_is_a_bad_request():
+    client = app.app.test_client()
+    response = client.get("/api/backtest?threshold=high")
+    assert response.status_code == 400
+    assert "threshold" in response.get_json()["error"]
+    response = client.post("/api/backtest/jobs", json={"window": "x"})
+    assert response.status_code == 400
+
+
+def test_dataset_info_dates_are_formatted_as_in_the_csv(tmp_path, monkeypatch):
+    """
+    The dates are parsed when the dataset is loaded, but are returned as they are written in the CSV
+    """
+    import pandas as pd
+    from cache_manager import CacheManager
+
+    keystats_file = tmp_path / "indian_keystats.csv"
+    pd.DataFrame({
+        "Date": ["2015-01-02", "2015-01-01", "2016-03-31"],
+        "Unix": [0, 0, 0],
+        "Ticker": ["A", "B", "A"],
+        "Price": [1.0, 2.0, 3.0],
+        "stock_p_change": [1.0, 2.0, 3.0],
+        "NIFTY50": [1.0, 1.0, 1.0],
+        "NIFTY50_p_change": [0.0, 0.0, 0.0],
+        "f0": [1.0, 2.0, 3.0],
+    }).to_csv(keystats_file, index=False)
+    forward_file = tmp_path / "indian_forward_sample.csv"
+    pd.DataFrame({"Ticker": ["A"], "f0": [1.0]}).to_csv(forward_file, index=False)
+    monkeypatch.setitem(app.config, "keystats_file", str(keystats_file))
+    monkeypatch.setitem(app.config, "forward_file", str(forward_file))
+    monkeypatch.setitem(app.config, "index_column", "NIFTY50_p_change")
+    monkeypatch.setattr(app, "cache", CacheManager())
+
+    response = app.app.test_client().get("/api/dataset_info")
+    assert response.status_code == 200
+    assert response.get_json()["date_range"] == {"start": "2015-01-01", "end": "2016-03-31"}
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from cache_manager import CacheManager
+
+
+def test_single_flight():
+    cache = CacheManager()
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("model", 1, build)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_new_version_is_swapped_in():
+    cache = CacheManager()
+    assert cache.get("data", 1, lambda: "v1") == "v1"
+    assert cache.get("data", 1, lambda: "unused") == "v1"
+    assert cache.get("data", 2, lambda: "v2") == "v2"
+    assert cache.peek("data") == "v2"
+
+
+def test_stale_value_served_while_rebuilding():
+    cache = CacheManager()
+    cache.get("model", 1, lambda: "old")
+    release = threading.Event()
+
+    def build():
+        release.wait()
+        return "new"
+
+    assert cache.get("model", 2, build, stale_ok=True) == "old"
+    assert cache.get("model", 2, build, stale_ok=True) == "old"
+    release.set()
+    for _ in range(100):
+        if cache.peek("model") == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get("model", 2, build) == "new"
+
+
+def test_failed_build_is_not_cached():
+    cache = CacheManager()
+    with pytest.raises(ZeroDivisionError):
+        cache.get("model", 1, lambda: 1 / 0)
+    assert cache.get("model", 1, lambda: "ok") == "ok"
+
+
+def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_failed_background_build_backs_off():
+    cache = CacheManager(retry_after=0.2)
+    cache.get("model", 1, lambda: "old")
+    builds = []
+
+    def failing_build():
+        builds.append(1)
+        raise RuntimeError("training failed")
+
+    assert cache.get("model", 2, failing_build, stale_ok=True) == "old"
+    assert wait_for(lambda: cache.last_failure("model") is not None)
+    # Within the backoff, the previous version is served without building again
+    for _ in range(5):
+        assert cache.get("model", 2, failing_build, stale_ok=True) == "old"
+    assert len(builds) == 1
+    # After it, the build is retried, and its success clears the failure
+    time.sleep(0.25)
+    assert cache.get("model", 2, lambda: "new", stale_ok=True) == "old"
+    assert wait_for(lambda: cache.peek("model") == "new")
+    assert cache.last_failure("model") is None
+
+
+def test_older_build_does_not_replace_newer_version():
+    cache = CacheManager()
+    cache.get("model", 1, lambda: "v1")
+    release = threading.Event()
+
+    def slow_build():
+        release.wait()
+        return "v2"
+
+    assert cache.get("model", 2, slow_build, stale_ok=True) == "v1"
+    assert cache.get("model", 3, lambda: "v3") == "v3"
+    release.set()
+    assert wait_for(lambda: not cache.builds)
+    assert cache.peek("model") == "v3"
@@ -0,0 +1,161 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import downloader
+import fetch_indian_data
+
+
+def write_canned_data(path, tickers, n_dates=500):
+    """
+    Canned prices and fundamentals in the format served by LocalFileSource
+    """
+    dates = pd.bdate_range('2015-01-01', periods=n_dates)
+    for i, ticker in enumerate(tickers):
+        # Some tickers list later than others
+        prices = pd.DataFrame({'Close': np.linspace(100, 200, n_dates) + i}, index=dates)
+        prices.index.name = 'Date'
+        prices.iloc[i:].to_csv(path / f'{ticker}.csv')
+        with open(path / f'{ticker}.json', 'w') as f:
+            json.dump({'currentPrice': 100.0 + i, 'marketCap': 1e9 * i, 'beta': 1.0}, f)
+
+
+def test_token_bucket_rate():
+    bucket = downloader.TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first call is free, the other ten wait 1/50 s each
+    assert time.monotonic() - start >= 0.19
+
+
+def test_call_with_retries():
+    attempts = []
+
+    def flaky(x):
+        attempts.append(x)
+        if len(attempts) < 3:
+            raise ConnectionError('rate limited')
+        return x * 2
+
+    assert downloader.call_with_retries(flaky, 21, retries=3, backoff=0.001) == 42
+    assert len(attempts) == 3
+
+    # The last exception is raised once the retries run out
+    with pytest.raises(ZeroDivisionError):
+        downloader.call_with_retries(lambda x: x / 0, 1, retries=1, backoff=0.001)
+
+
+def test_offline_refresh(tmp_path):
+    """
+    A full refresh from a local stand-in for Yahoo Finance, with 50 ms of latency per request.
+    Serially the prices alone would take 2.5 s.
+    """
+    write_canned_data(tmp_path, fetch_indian_data.NIFTY_50_STOCKS)
+    source = downloader.LocalFileSource(str(tmp_path), latency=0.05)
+
+    start = time.monotonic()
+    prices_df = fetch_indian_data.fetch_stock_prices(source, start='2015-01-01', end='2017-01-01',
+                                                     rate=1000)
+    fundamentals_df = fetch_indian_data.fetch_stock_info(source, rate=1000)
+    elapsed = time.monotonic() - start
+
+    clean_tickers = [t.replace('.NS', '') for t in fetch_indian_data.NIFTY_50_STOCKS]
+    assert list(prices_df.columns) == clean_tickers
+    assert prices_df.index.is_monotonic_increasing
+    assert prices_df['ADANIENT'].notna().all()
+    assert prices_df['ZOMATO'].isnull().sum() == 49
+    assert list(fundamentals_df['Ticker']) == clean_tickers
+    assert elapsed < 1.5
+
+
+def build_from_scratch(source, end, horizon):
+    """
+    The files written by fetch_indian_data.main, for the data up to `end`
+    """
+    nifty_df = fetch_indian_data.fetch_nifty_index(source, start='2015-01-01', end=end)
+    nifty_df.to_csv('nifty50_index.csv')
+    prices_df = fetch_indian_data.fetch_stock_prices(source, start='2015-01-01', end=end, rate=1000)
+    prices_df.to_csv('indian_stock_prices.csv')
+    fundamentals_df = fetch_indian_data.fetch_stock_info(source, rate=1000)
+    fundamentals_df.to_csv('indian_forward_sample.csv', index=False)
+    returns_df = fetch_indian_data.calculate_returns(
+        pd.read_csv('indian_stock_prices.csv', index_col='Date', parse_dates=True),
+        pd.read_csv('nifty50_index.csv', index_col='Date', parse_dates=True), horizon
+    )
+    fetch_indian_data.write_training_data_with_fundamentals(
+        returns_df, pd.read_csv('indian_forward_sample.csv'), 'indian_keystats.csv'
+    )
+
+
+def test_incremental_refresh(tmp_path, monkeypatch):
+    """
+    Refreshing incrementally must give the same files as downloading everything again,
+    while only fetching the new days
+    """
+    tickers = fetch_indian_data.NIFTY_50_STOCKS[:5]
+    monkeypatch.setattr(fetch_indian_data, 'NIFTY_50_STOCKS', tickers)
+    monkeypatch.setattr(fetch_indian_data, 'START_DATE', '2015-01-01')
+    write_canned_data(tmp_path, tickers + ['^NSEI'])
+    source = downloader.LocalFileSource(str(tmp_path))
+
+    full_dir, incremental_dir = tmp_path / 'full', tmp_path / 'incremental'
+    full_dir.mkdir()
+    incremental_dir.mkdir()
+
+    monkeypatch.chdir(full_dir)
+    build_from_scratch(source, end='2016-06-01', horizon=63)
+
+    monkeypatch.chdir(incremental_dir)
+    build_from_scratch(source, end='2016-01-01', horizon=63)
+    n_stored = len(pd.read_csv('indian_keystats.csv'))
+
+    fetched = []
+    fetch_prices = source.fetch_prices
+    monkeypatch.setattr(source, 'fetch_prices',
+                        lambda t, start, end: fetched.append(start) or fetch_prices(t, start, end))
+    fetch_indian_data.refresh_incremental(source, end='2016-06-01', horizon=63)
+
+    assert set(fetched) == {'2016-01-01'}
+    assert len(pd.read_csv('indian_keystats.csv')) > n_stored
+    for name in ['indian_stock_prices.csv', 'nifty50_index.csv', 'indian_keystats.csv']:
+        pd.testing.assert_frame_equal(
+            pd.read_csv(incremental_dir / name), pd.read_csv(full_dir / name)
+        )
+
+
+def test_incremental_refresh_with_new_ticker(tmp_path, monkeypatch):
+    """
+    A ticker added to the universe since the last build is labelled over its full history, so that
+    the refreshed training data holds the same rows as a full rebuild
+    """
+    tickers = fetch_indian_data.NIFTY_50_STOCKS[:5]
+    monkeypatch.setattr(fetch_indian_data, 'START_DATE', '2015-01-01')
+    write_canned_data(tmp_path, tickers + ['^NSEI'])
+    source = downloader.LocalFileSource(str(tmp_path))
+
+    full_dir, incremental_dir = tmp_path / 'full', tmp_path / 'incremental'
+    full_dir.mkdir()
+    incremental_dir.mkdir()
+
+    monkeypatch.setattr(fetch_indian_data, 'NIFTY_50_STOCKS', tickers)
+    monkeypatch.chdir(full_dir)
+    build_from_scratch(source, end='2016-06-01', horizon=63)
+
+    monkeypatch.setattr(fetch_indian_data, 'NIFTY_50_STOCKS', tickers[:4])
+    monkeypatch.chdir(incremental_dir)
+    build_from_scratch(source, end='2016-01-01', horizon=63)
+    monkeypatch.setattr(fetch_indian_data, 'NIFTY_50_STOCKS', tickers)
+    fetch_indian_data.fetch_stock_info(source, rate=1000).to_csv('indian_forward_sample.csv', index=False)
+    fetch_indian_data.refresh_incremental(source, end='2016-06-01', horizon=63)
+
+    def sorted_rows(path):
+        return pd.read_csv(path).sort_values(['Date', 'Ticker']).reset_index(drop=True)
+
+    new_ticker = tickers[4].replace('.NS', '')
+    incremental = sorted_rows(incremental_dir / 'indian_keystats.csv')
+    assert (incremental['Ticker'] == new_ticker).any()
+    pd.testing.assert_frame_equal(incremental, sorted_rows(full_dir / 'indian_keystats.csv'))
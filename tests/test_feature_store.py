@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_store import FeatureStore
+
+
+def make_data():
+    return pd.DataFrame(
+        {
+            "Unix": [0, 1, 2],
+            "Ticker": ["A", "B", "C"],
+            "Price": [1.0, 2.0, 3.0],
+            "stock_p_change": [30.0, 5.0, 12.0],
+            "NIFTY50": [1.0, 1.0, 1.0],
+            "NIFTY50_p_change": [10.0, 10.0, 2.0],
+            "f0": [1.0, np.nan, 3.0],
+            "f1": [0.5, 0.25, np.nan],
+        },
+        index=pd.DatetimeIndex(["2010-01-01", "2010-02-01", "2010-03-01"], name="Date"),
+    )
+
+
+def test_feature_store():
+    data = make_data()
+    store = FeatureStore(data)
+    assert store.features == ["f0", "f1"]
+    assert store.X.dtype == np.float32 and store.X.flags.c_contiguous
+    np.testing.assert_array_equal(store.X, [[1, 0.5], [0, 0.25], [3, 0]])
+    np.testing.assert_array_equal(store.labels(10), [True, False, True])
+    assert store.labels(10) is store.labels(10)
+    np.testing.assert_array_equal(store.returns[:, 1], [10, 10, 2])
+    # The dataset is not modified, and the arrays are read-only
+    assert data["f0"].isna().sum() == 1
+    for array in (store.X, store.labels(10), store.returns, store.tickers):
+        with pytest.raises(ValueError):
+            array[0] = 0
+
+
+def test_label_matrix():
+    store = FeatureStore(make_data())
+    matrix = store.label_matrix([0, 10, 25])
+    np.testing.assert_array_equal(matrix, [[True, True, False], [False, False, False], [True, True, False]])
+    np.testing.assert_array_equal(store.labels(25), matrix[:, 2])
+    assert store.labels(25).flags.c_contiguous and not store.labels(25).flags.writeable
+
+
+def test_fingerprint():
+    data = make_data()
+    assert FeatureStore(data).fingerprint == FeatureStore(data.copy()).fingerprint
+    data.loc[data.index[0], "f0"] = 2.0
+    assert FeatureStore(data).fingerprint != FeatureStore(make_data()).fingerprint
+
+
+def test_matrix_of_float32_features():
+    """
+    Float32 features, as the forward sample is loaded, give a new writable matrix with NaN filled,
+    also for a single row (whose data is already C-contiguous)
+    """
+    store = FeatureStore(make_data())
+    forward = pd.DataFrame({"f0": np.array([np.nan], dtype=np.float32),
+                            "f1": np.array([1], dtype=np.float32)})
+    X = store.matrix(forward)
+    np.testing.assert_array_equal(X, [[0, 1]])
+    assert X.flags.c_contiguous and X.flags.writeable
+    assert forward["f0"].isna().sum() == 1
@@ -0,0 +1,109 @@
+import io
+import numpy as np
+import pandas as pd
+
+import fetch_indian_data
+
+
+def calculate_returns_reference(prices_df, index_df, horizon):
+    """
+    The original date-by-date, ticker-by-ticker loop
+    """
+    returns_data = []
+    for date in prices_df.index[:-horizon]:
+        future_date = prices_df.index[prices_df.index.get_loc(date) + horizon]
+        for ticker in prices_df.columns:
+            current_price = prices_df.loc[date, ticker]
+            future_price = prices_df.loc[future_date, ticker]
+            if pd.notna(current_price) and pd.notna(future_price):
+                if date in index_df.index and future_date in index_df.index:
+                    index_current = index_df.loc[date, 'NIFTY50']
+                    index_future = index_df.loc[future_date, 'NIFTY50']
+                    returns_data.append({
+                        'Date': date.strftime('%Y-%m-%d'),
+                        'Unix': int(date.timestamp()),
+                        'Ticker': ticker,
+                        'Price': current_price,
+                        'stock_p_change': (future_price - current_price) / current_price * 100,
+                        'NIFTY50': index_current,
+                        'NIFTY50_p_change': (index_future - index_current) / index_current * 100,
+                    })
+    return pd.DataFrame(returns_data)
+
+
+def make_prices(n_dates=300):
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2015-01-01', periods=n_dates)
+    prices_df = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_dates, 4)), axis=0)),
+        index=dates, columns=['INFY', 'TCS', 'ITC', 'ZOMATO'],
+    )
+    # Missing prices, e.g a late listing
+    prices_df.iloc[:120, 3] = np.nan
+    prices_df.iloc[50:55, 1] = np.nan
+    index_df = pd.DataFrame({'NIFTY50': np.linspace(8000, 9000, n_dates)}, index=dates)
+    # The index has some missing days
+    index_df = index_df.drop(dates[[10, 11, 200]])
+    return prices_df, index_df
+
+
+def test_calculate_returns_matches_loop():
+    prices_df, index_df = make_prices()
+    for horizon in (63, 252):
+        expected = calculate_returns_reference(prices_df, index_df, horizon)
+        result = fetch_indian_data.calculate_returns(prices_df, index_df, horizon=horizon)
+        assert list(result.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def make_fundamentals(tickers, date='2025-10-01'):
+    return pd.DataFrame({
+        'Ticker': tickers,
+        'Date': date,
+        'Unix': 0,
+        'Price': 1.0,
+        'Market Cap': np.arange(len(tickers)) * 1e9,
+        'Beta': np.linspace(0.5, 1.5, len(tickers)),
+        'NIFTY50': np.nan,
+        'NIFTY50_p_change': np.nan,
+        'stock_p_change': np.nan,
+    })
+
+
+def test_fundamentals_merge(tmp_path):
+    prices_df, index_df = make_prices()
+    returns_df = fetch_indian_data.calculate_returns(prices_df, index_df, horizon=63)
+    # ITC has no fundamentals, and INFY appears twice (the last row wins)
+    fundamentals_df = make_fundamentals(['INFY', 'TCS', 'ZOMATO', 'INFY'])
+
+    result = fetch_indian_data.create_training_data_with_fundamentals(returns_df, fundamentals_df)
+    assert list(result.columns) == fetch_indian_data.TRAINING_BASE_COLS + ['Market Cap', 'Beta']
+    assert len(result) == len(returns_df)
+    pd.testing.assert_frame_equal(result[returns_df.columns], returns_df)
+    assert (result.loc[result['Ticker'] == 'INFY', 'Market Cap'] == 3e9).all()
+    assert result.loc[result['Ticker'] == 'ITC', 'Beta'].isnull().all()
+
+    # Streaming in chunks gives the same file as writing the whole dataframe
+    path = tmp_path / 'keystats.csv'
+    n_rows = fetch_indian_data.write_training_data_with_fundamentals(
+        returns_df, fundamentals_df, path, chunksize=97
+    )
+    assert n_rows == len(result)
+    pd.testing.assert_frame_equal(pd.read_csv(path), pd.read_csv(io.StringIO(result.to_csv(index=False))))
+
+
+def test_point_in_time_fundamentals():
+    returns_df = pd.DataFrame({
+        'Date': ['2015-01-05', '2015-06-01', '2016-01-04', '2015-06-01'],
+        'Unix': 0, 'Ticker': ['INFY', 'INFY', 'INFY', 'TCS'], 'Price': 1.0,
+        'stock_p_change': 0.0, 'NIFTY50': 1.0, 'NIFTY50_p_change': 0.0,
+    })
+    fundamentals_df = pd.concat([
+        make_fundamentals(['INFY', 'TCS'], date='2015-03-01'),
+        make_fundamentals(['INFY'], date='2015-12-01').assign(Beta=2.0),
+    ])
+    result = fetch_indian_data.create_training_data_with_fundamentals(
+        returns_df, fundamentals_df, point_in_time=True
+    )
+    assert list(result['Ticker']) == ['INFY', 'INFY', 'INFY', 'TCS']
+    np.testing.assert_array_equal(result['Beta'], [np.nan, 0.5, 2.0, 1.5])
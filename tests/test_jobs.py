@@ -0,0 +1,70 @@
+import threading
+
+import jobs
+
+
+def test_jobs_are_memoized_by_key():
+    queue = jobs.JobQueue(max_workers=2)
+    calls = []
+
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    job = queue.submit(("square", 3), square, 3)
+    job.finished.wait()
+    assert job.status == jobs.DONE and job.result == 9
+    assert queue.submit(("square", 3), square, 3) is job
+    assert queue.get(job.id) is job
+    assert calls == [3]
+    assert queue.submit(("square", 4), square, 4) is not job
+
+
+def test_pending_job_is_shared():
+    queue = jobs.JobQueue(max_workers=1)
+    release = threading.Event()
+    job = queue.submit("slow", release.wait)
+    assert queue.submit("slow", release.wait) is job
+    release.set()
+    job.finished.wait()
+    assert job.status == jobs.DONE
+
+
+def test_failed_job_is_retried():
+    queue = jobs.JobQueue(max_workers=1)
+    job = queue.submit("fail", lambda: 1 / 0)
+    job.finished.wait()
+    assert job.status == jobs.FAILED
+    assert "division" in job.to_dict()["error"]
+    assert queue.submit("fail", lambda: 1).id != job.id
+
+
+def test_least_recently_used_finished_jobs_are_evicted():
+    queue = jobs.JobQueue(max_workers=1, max_finished=2)
+    first = queue.submit(1, abs, -1)
+    first.finished.wait()
+    second = queue.submit(2, abs, -2)
+    second.finished.wait()
+    # The first job is used again, so the second one is evicted by a third
+    assert queue.submit(1, abs, -1) is first
+    third = queue.submit(3, abs, -3)
+    third.finished.wait()
+    assert len(queue) == 2
+    assert queue.get(second.id) is None
+    assert queue.get(first.id) is first and queue.get(third.id) is third
+    resubmitted = queue.submit(2, abs, -2)
+    assert resubmitted is not second
+    resubmitted.finished.wait()
+    assert resubmitted.result == 2
+
+
+def test_pending_jobs_are_not_evicted():
+    queue = jobs.JobQueue(max_workers=2, max_finished=1)
+    release = threading.Event()
+    slow = queue.submit("slow", release.wait)
+    for i in range(3):
+        queue.submit(i, abs, i).finished.wait()
+    assert queue.get(slow.id) is slow
+    release.set()
+    slow.finished.wait()
+    assert len(queue) == 1
@@ -0,0 +1,64 @@
+import parsing_keystats
+import current_data
+from keystats_extraction import (
+    KeystatsExtractor,
+    FALLBACK_LABELS,
+    extract_features_regex_loop,
+)
+
+# A snippet in the style of the intraQuarter html, including some awkward cases: labels which are
+# prefixes of other labels, abbreviations, 'N/A' with trailing whitespace, '>0' and a missing value.
+SAMPLE_HTML = """
+<table><tr><td class="yfnc_tablehead1">Market Cap (intraday)<font size="-1"><sup>5</sup></font>:</td>
+<td class="yfnc_tabledata1"><span id="yfs_j10_a">24.38B</span></td></tr>
+<tr><td class="yfnc_tablehead1">Enterprise Value/Revenue (ttm)<font size="-1"><sup>3</sup></font>:</td>
+<td class="yfnc_tabledata1">3.51</td></tr>
+<tr><td class="yfnc_tablehead1">Enterprise Value (Jan 1 2010)<font size="-1"><sup>3</sup></font>:</td>
+<td class="yfnc_tabledata1">-21.13M</td></tr>
+<tr><td class="yfnc_tablehead1">Trailing P/E (ttm intraday):</td><td class="yfnc_tabledata1">N/A
+ </td></tr>
+<tr><td class="yfnc_tablehead1">Revenue Per Share (ttm):</td><td class="yfnc_tabledata1">12.07</td></tr>
+<tr><td class="yfnc_tablehead1">Revenue (ttm):</td><td class="yfnc_tabledata1">4.5B</td></tr>
+<tr><td class="yfnc_tablehead1">Profit Margin (ttm):</td><td class="yfnc_tabledata1">12.5%</td></tr>
+<tr><td class="yfnc_tablehead1">Total Cash (mrq):</td><td class="yfnc_tabledata1">>0</td></tr>
+<tr><td class="yfnc_tablehead1">Beta:</td><td class="yfnc_tabledata1">NaN</td></tr>
+<tr><td class="yfnc_tablehead1">Average Volume (3 month)<font size="-1"><sup>3</sup></font>:</td>
+<td class="yfnc_tabledata1">1854430</td></tr>
+<tr><td class="yfnc_tablehead1">Shares Short (prior month)<font size="-1"><sup>3</sup></font>:</td>
+<td class="yfnc_tabledata1">5.08M</td></tr>
+<tr><td class="yfnc_tablehead1">Shares Short (as of Nov 30 2009)<font size="-1"><sup>3</sup></font>:</td>
+<td class="yfnc_tabledata1">4.98M</td></tr>
+<tr><td class="yfnc_tablehead1">Float:</td><td class="yfnc_tabledata1">344.70M</td></tr>
+</table>
+""".replace(",", "")
+
+
+def test_extractor_matches_regex_loop():
+    """
+    The single-pass extractor must give exactly the same values as the per-feature regex loop
+    """
+    extractor = KeystatsExtractor(parsing_keystats.features, fallbacks=FALLBACK_LABELS)
+    expected = extract_features_regex_loop(SAMPLE_HTML, parsing_keystats.features)
+    assert extractor.extract(SAMPLE_HTML) == expected
+
+    # current_data does not use the 'Average Volume' fallback
+    extractor = KeystatsExtractor(current_data.features)
+    expected = extract_features_regex_loop(
+        SAMPLE_HTML, current_data.features, use_fallback=False
+    )
+    assert extractor.extract(SAMPLE_HTML) == expected
+
+
+def test_extractor_values():
+    extractor = KeystatsExtractor(parsing_keystats.features, fallbacks=FALLBACK_LABELS)
+    values = dict(zip(parsing_keystats.features, extractor.extract(SAMPLE_HTML)))
+    assert values["Market Cap"] == 24380000000
+    assert values["Enterprise Value"] == 3.51
+    assert values["Enterprise Value/Revenue"] == 3.51
+    assert values["Trailing P/E"] == "N/A"
+    assert values["Revenue"] == 12.07
+    assert values["Total Cash"] == 0
+    assert values["Beta"] == "N/A"
+    assert values["Avg Vol (3 month)"] == 1854430
+    assert values["Shares Short (as of"] == 4980000
+    assert values["PEG Ratio"] == "N/A"
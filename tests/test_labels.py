@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+import labels
+import utils
+
+
+def test_outperformed_matches_status_calc():
+    stock = np.array([50, 12.003, -10, -31, 15, np.nan])
+    index = np.array([20, 10, -30, -30, 5, 1])
+    for outperformance in [0, 5, 12.2, 15]:
+        y = labels.outperformed(stock, index, outperformance)
+        assert y.dtype == bool
+        assert y.tolist() == [bool(utils.status_calc(s, i, outperformance)) for s, i in zip(stock, index)]
+
+    assert labels.outperformed(stock, index, 10, dtype=np.uint8).tolist() == [1, 0, 1, 0, 1, 0]
+    # A negative level labels the stocks which trailed the index by at most that much
+    assert labels.outperformed(stock, index, -1).tolist() == [True, True, True, True, True, False]
+    assert labels.outperformed(stock, index, -0.5).tolist() == [True, True, True, False, True, False]
+
+
+def test_label_matrix():
+    df = pd.DataFrame(
+        {"stock_p_change": [50.0, 12.0, -10.0], "NIFTY50_p_change": [20.0, 10.0, -30.0]}
+    )
+    levels = [0, 10, 25]
+    y = labels.frame_labels(df, levels, dtype=np.uint8)
+    assert y.shape == (3, 3)
+    assert y.dtype == np.uint8
+    for j, level in enumerate(levels):
+        np.testing.assert_array_equal(
+            y[:, j], labels.outperformed(df["stock_p_change"], df["NIFTY50_p_change"], level)
+        )
+
+    y = labels.label_matrix([-10.0, -12.0, 5.0], [-8.0, -8.0, 0.0], [-3, 0, -10])
+    assert y.tolist() == [[True, False, True], [False, False, True], [True, True, True]]
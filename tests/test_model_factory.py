@@ -0,0 +1,14 @@
+import model_factory
+
+
+def test_classifier_uses_profile_and_n_jobs():
+    clf = model_factory.classifier("high_precision", n_jobs=2)
+    assert clf.n_jobs == 2
+    assert clf.n_estimators == model_factory.PROFILES["high_precision"]["n_estimators"]
+    assert "n_jobs" not in model_factory.PROFILES["high_precision"]
+
+
+def test_default_n_jobs(monkeypatch):
+    monkeypatch.setattr(model_factory, "N_JOBS", 3)
+    assert model_factory.classifier().n_jobs == 3
+    assert model_factory.use_n_jobs(model_factory.classifier(n_jobs=1)).n_jobs == 3
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+import model_registry
+
+
+def test_fingerprint_changes_with_data_and_settings():
+    X = np.arange(12, dtype=float).reshape(6, 2)
+    y = np.array([0, 1, 0, 1, 0, 1])
+    key = model_registry.fingerprint(X, y, {"max_depth": 2}, outperformance=10)
+    assert key == model_registry.fingerprint(X.copy(), y, {"max_depth": 2}, outperformance=10)
+    assert key != model_registry.fingerprint(X + 1, y, {"max_depth": 2}, outperformance=10)
+    assert key != model_registry.fingerprint(X, y, {"max_depth": 3}, outperformance=10)
+    assert key != model_registry.fingerprint(X, y, {"max_depth": 2}, outperformance=20)
+
+
+def test_load_or_train(tmp_path):
+    X = np.arange(12, dtype=float).reshape(6, 2)
+    y = np.array([0, 1, 0, 1, 0, 1])
+    calls = []
+
+    def train():
+        calls.append(1)
+        return DecisionTreeClassifier(random_state=0).fit(X, y)
+
+    key = model_registry.fingerprint(X, y, {})
+    model = model_registry.load_or_train("test", key, train, directory=tmp_path)
+    loaded = model_registry.load_or_train("test", key, train, directory=tmp_path)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(model.predict(X), loaded.predict(X))
+
+    # A new fingerprint trains a new model and removes the old one
+    new_key = model_registry.fingerprint(X, 1 - y, {})
+    model_registry.load_or_train("test", new_key, train, directory=tmp_path)
+    assert len(calls) == 2
+    assert os.listdir(tmp_path) == [os.path.basename(model_registry.model_path("test", new_key))]
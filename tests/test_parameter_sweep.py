@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+import parameter_sweep
+from feature_store import FeatureStore
+
+
+def make_dataset(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 3))
+    data = pd.DataFrame(
+        {
+            "Unix": 0,
+            "Ticker": rng.choice(["A", "B", "C", "D"], n),
+            "Price": 1.0,
+            "stock_p_change": X[:, 0] * 20 + rng.normal(10, 10, n),
+            "SP500": 1.0,
+            "SP500_p_change": rng.normal(5, 5, n),
+            "f0": X[:, 0],
+            "f1": X[:, 1],
+            "f2": X[:, 2],
+        },
+        index=pd.DatetimeIndex(
+            pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, n), unit="D"),
+            name="Date",
+        ),
+    )
+    return FeatureStore(data)
+
+
+def test_parameter_grid():
+    grid = parameter_sweep.parameter_grid(
+        [10, 25], {"max_depth": [3, None]}, base_params={"n_estimators": 5}
+    )
+    assert grid == [
+        (10, {"n_estimators": 5, "max_depth": 3}),
+        (10, {"n_estimators": 5, "max_depth": None}),
+        (25, {"n_estimators": 5, "max_depth": 3}),
+        (25, {"n_estimators": 5, "max_depth": None}),
+    ]
+
+
+def test_sweep_in_process_pool_matches_serial():
+    dataset = make_dataset()
+    args = (dataset, [10, 20], [0.4, 0.6], {"max_depth": [3]}, {"n_estimators": 5, "random_state": 0})
+    serial = parameter_sweep.sweep(*args, n_workers=1)
+    parallel = parameter_sweep.sweep(*args, n_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert len(serial) == 4
+    assert serial[["outperformance_level", "probability_threshold"]].values.tolist() == [
+        [10, 0.4], [10, 0.6], [20, 0.4], [20, 0.6]
+    ]
+    # A higher threshold, with the same model, buys fewer stocks
+    assert (serial["total_trades"].values[1::2] <= serial["total_trades"].values[::2]).all()
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+import parse_cache
+from keystats_extraction import KeystatsExtractor, FALLBACK_LABELS
+
+
+def test_parse_cache(tmp_path):
+    snapshot = tmp_path / "snapshot.html"
+    snapshot.write_text("<td>Beta:</td><td>1.5</td>")
+    path = str(snapshot)
+    cache_path = str(tmp_path / "cache.sqlite")
+
+    with parse_cache.ParseCache(cache_path, key="k") as cache:
+        assert cache.lookup([path])[0] == {}
+        cached, signatures = cache.lookup([path])
+        cache.store(signatures, {path: [1.5, np.nan]})
+
+    # Entries persist, and are only valid for the same file signature and key
+    with parse_cache.ParseCache(cache_path, key="k") as cache:
+        cached, _ = cache.lookup([path])
+        np.testing.assert_array_equal(cached[path], [1.5, np.nan])
+        assert len(cache) == 1
+    with parse_cache.ParseCache(cache_path, key="other") as cache:
+        assert cache.lookup([path])[0] == {}
+
+    snapshot.write_text("<td>Beta:</td><td>2.25</td>")
+    os.utime(path, ns=(0, 0))
+    with parse_cache.ParseCache(cache_path, key="k") as cache:
+        assert cache.lookup([path])[0] == {}
+
+
+def test_extractor_key():
+    features = ["Beta", "Avg Vol (3 month)"]
+    key = parse_cache.extractor_key(KeystatsExtractor(features, fallbacks=FALLBACK_LABELS))
+    assert key == parse_cache.extractor_key(KeystatsExtractor(features, fallbacks=FALLBACK_LABELS))
+    assert key != parse_cache.extractor_key(KeystatsExtractor(features))
+    assert key != parse_cache.extractor_key(KeystatsExtractor(features[:1], fallbacks=FALLBACK_LABELS))
@@ -0,0 +1,186 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import parse_cache
+import parsing_keystats
+import storage
+
+SNAPSHOT = (
+    "<table><tr><td>Market Cap (intraday):</td><td><span>{cap}B</span></td></tr>"
+    "<tr><td>Trailing P/E (ttm):</td><td>{pe}</td></tr>"
+    "<tr><td>Beta:</td><td>N/A</td></tr></table>"
+)
+
+
+def make_keystats_tree(root, tickers, n_snapshots):
+    """
+    Write a small intraQuarter-style directory tree, and matching price data.
+    """
+    statspath = os.path.join(str(root), "_KeyStats") + "/"
+    for i, ticker in enumerate(tickers):
+        os.makedirs(statspath + ticker)
+        for j in range(n_snapshots):
+            date = pd.Timestamp("2005-01-03 10:00:00") + pd.Timedelta(days=40 * j + i)
+            with open(statspath + ticker + "/" + date.strftime("%Y%m%d%H%M%S.html"), "w") as f:
+                f.write(SNAPSHOT.format(cap=i + j, pe=10 + j))
+
+    idx = pd.date_range("2004-01-01", "2012-01-01")
+    trend = np.linspace(100, 300, len(idx))
+    sp500_df = pd.DataFrame({"Adj Close": trend}, index=idx)
+    # The last ticker has no price data, so all of its rows are skipped
+    stock_df = pd.DataFrame(
+        {t.upper(): trend * (1 + k / 10) for k, t in enumerate(tickers[:-1])}, index=idx
+    )
+    return statspath, sp500_df, stock_df
+
+
+def test_parallel_parse_matches_serial(tmp_path, monkeypatch):
+    """
+    Parsing in a process pool must give the same keystats.csv as parsing serially
+    """
+    statspath, sp500_df, stock_df = make_keystats_tree(tmp_path, ["b", "a", "c"], 4)
+    monkeypatch.setattr(parsing_keystats, "statspath", statspath)
+    monkeypatch.chdir(tmp_path)
+
+    serial = parsing_keystats.parse_keystats(sp500_df, stock_df, n_workers=1, cache_path=None)
+    serial_csv = open("keystats.csv").read()
+    parallel = parsing_keystats.parse_keystats(sp500_df, stock_df, n_workers=2, cache_path=None)
+    parallel_csv = open("keystats.csv").read()
+
+    assert serial_csv == parallel_csv
+    assert list(serial.columns) == parsing_keystats.index_columns + parsing_keystats.features
+    # Deterministic order: sorted by ticker, then by date. Ticker 'c' has no prices.
+    assert list(serial["Ticker"]) == ["a"] * 4 + ["b"] * 4
+    assert len(parallel) == 8
+
+
+def test_cached_parse_only_reads_changed_files(tmp_path, monkeypatch):
+    """
+    With the parse cache, parsing again only reads the new or changed files, with the same result
+    """
+    statspath, sp500_df, stock_df = make_keystats_tree(tmp_path, ["b", "a", "c"], 4)
+    monkeypatch.setattr(parsing_keystats, "statspath", statspath)
+    monkeypatch.chdir(tmp_path)
+    cache_path = str(tmp_path / "cache.sqlite")
+
+    parsed = []
+    parse_snapshots = parsing_keystats.parse_snapshots
+
+    def counting_parse_snapshots(paths):
+        parsed.extend(paths)
+        return parse_snapshots(paths)
+
+    monkeypatch.setattr(parsing_keystats, "parse_snapshots", counting_parse_snapshots)
+    parsing_keystats.parse_keystats(sp500_df, stock_df, cache_path=cache_path)
+    assert len(parsed) == 12
+
+    parsed.clear()
+    parsing_keystats.parse_keystats(sp500_df, stock_df, cache_path=cache_path)
+    assert parsed == []
+
+    changed = statspath + "a/" + sorted(os.listdir(statspath + "a"))[1]
+    with open(changed, "w") as f:
+        f.write(SNAPSHOT.format(cap=7, pe="N/A"))
+    cached = parsing_keystats.parse_keystats(sp500_df, stock_df, cache_path=cache_path)
+    assert parsed == [changed]
+    pd.testing.assert_frame_equal(
+        cached, parsing_keystats.parse_keystats(sp500_df, stock_df, cache_path=None)
+    )
+    assert cached["Market Cap"].tolist()[1] == 7e9
+    assert np.isnan(cached["Trailing P/E"].tolist()[1])
+
+
+def test_stream_keystats_matches_parse_keystats(tmp_path, monkeypatch):
+    """
+    Streaming the dataset in chunks must give the same keystats.csv, also when resuming after a failure
+    """
+    statspath, sp500_df, stock_df = make_keystats_tree(tmp_path, ["b", "a", "d", "c"], 4)
+    monkeypatch.setattr(parsing_keystats, "statspath", statspath)
+    monkeypatch.chdir(tmp_path)
+
+    parsing_keystats.parse_keystats(sp500_df, stock_df, cache_path=None)
+    expected_csv = open("keystats.csv").read()
+    os.remove("keystats.csv")
+
+    n_rows = parsing_keystats.stream_keystats(sp500_df, stock_df, "streamed.csv", chunk_rows=5)
+    assert n_rows == 12
+    assert open("streamed.csv").read() == expected_csv
+    pd.testing.assert_frame_equal(
+        storage.load_keystats("streamed.csv"), storage.load_keystats("keystats.parquet")
+    )
+    assert not os.path.exists(parsing_keystats.progress_path("streamed.csv"))
+    # The parse cache is opt-in
+    assert not os.path.exists(parse_cache.DEFAULT_PATH)
+
+    # Fail while labelling ticker 'd', after 'a' and 'b' were written in one chunk
+    label_keystats = parsing_keystats.label_keystats
+
+    def failing_label_keystats(parsed_df, sp500_df, stock_df):
+        if (parsed_df["Ticker"] == "d").any():
+            raise RuntimeError("interrupted")
+        return label_keystats(parsed_df, sp500_df, stock_df)
+
+    monkeypatch.setattr(parsing_keystats, "label_keystats", failing_label_keystats)
+    with pytest.raises(RuntimeError):
+        parsing_keystats.stream_keystats(sp500_df, stock_df, "resumed.csv", chunk_rows=5)
+    assert len(pd.read_csv("resumed.csv")) == 8
+
+    monkeypatch.setattr(parsing_keystats, "label_keystats", label_keystats)
+    n_rows = parsing_keystats.stream_keystats(sp500_df, stock_df, "resumed.csv", resume=True)
+    assert n_rows == 4
+    assert open("resumed.csv").read() == expected_csv
+    assert not os.path.exists("resumed.parquet")
+
+
+def test_label_keystats_matches_lookups():
+    """
+    The vectorized labelling must agree with looking up each snapshot's prices one at a time
+    """
+    idx = pd.date_range("2004-01-01", "2006-01-01")
+    sp500_df = pd.DataFrame({"Adj Close": np.linspace(1000, 1300, len(idx))}, index=idx)
+    stock_df = pd.DataFrame(
+        {"AA": np.linspace(10, 30, len(idx)), "BB": np.linspace(50, 20, len(idx))}, index=idx
+    )
+    stock_df.loc["2005-03-01":"2005-03-05", "BB"] = np.nan
+
+    parsed = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(
+                ["2004-02-03 10:00", "2004-03-01 23:30", "2004-03-02 09:00",
+                 "2004-06-01 10:00", "2005-06-01 10:00"]
+            ),
+            "Unix": 0.0,
+            # 'cc' has no price data, and the 2005 snapshot is less than a year from the end of the data
+            "Ticker": ["aa", "bb", "cc", "bb", "aa"],
+        }
+    )
+    for feature in parsing_keystats.features:
+        parsed[feature] = 1.0
+
+    df = parsing_keystats.label_keystats(parsed, sp500_df, stock_df)
+    assert list(df.columns) == parsing_keystats.index_columns + parsing_keystats.features
+    assert list(df["Ticker"]) == ["aa", "bb", "bb"]
+
+    # The 'bb' price one year after 2004-03-01 is missing, so its change is NaN (dropped by parse_keystats)
+    assert df["stock_p_change"].isnull().tolist() == [False, True, False]
+
+    for _, row in df.dropna().iterrows():
+        current_date = row["Date"].strftime("%Y-%m-%d")
+        one_year_later = (row["Date"] + pd.Timedelta(days=365)).strftime("%Y-%m-%d")
+        stock_price = float(stock_df.loc[current_date, row["Ticker"].upper()])
+        stock_1y_price = float(stock_df.loc[one_year_later, row["Ticker"].upper()])
+        sp500_price = float(sp500_df.loc[current_date, "Adj Close"])
+        sp500_1y_price = float(sp500_df.loc[one_year_later, "Adj Close"])
+        assert row["Price"] == stock_price
+        assert row["SP500"] == sp500_price
+        assert row["stock_p_change"] == round((stock_1y_price - stock_price) / stock_price * 100, 2)
+        assert row["SP500_p_change"] == round((sp500_1y_price - sp500_price) / sp500_price * 100, 2)
+
+
+def test_check_duplicates():
+    df = pd.DataFrame({"Ticker": ["a", "b"], "Market Cap": [1.0, 2.0], "Enterprise Value": [1.0, 3.0]})
+    assert len(parsing_keystats.check_duplicates(df, max_fraction=0.5)) == 1
+    with pytest.raises(ValueError):
+        parsing_keystats.check_duplicates(df, max_fraction=0.1)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import portfolio
+
+
+def make_rows():
+    dates = pd.to_datetime(["2010-03-01", "2010-06-01", "2010-06-01", "2011-02-01", "2011-05-01"])
+    tickers = np.array(["A", "B", "C", "A", "C"])
+    stock_change = np.array([20.0, -10.0, 50.0, 10.0, 30.0])
+    index_change = np.array([5.0, 5.0, 5.0, 0.0, 20.0])
+    selected = np.array([True, True, False, True, True])
+    probabilities = np.array([0.6, 0.9, 0.4, 0.75, 0.25])
+    return dates, tickers, stock_change, index_change, selected, probabilities
+
+
+def test_equal_weight_portfolio():
+    periods = portfolio.simulate(*make_rows())
+    assert list(periods.index.year) == [2010, 2011]
+    np.testing.assert_allclose(periods["portfolio_return"], [5.0, 20.0])
+    np.testing.assert_allclose(periods["index_return"], [5.0, 10.0])
+    np.testing.assert_allclose(periods["hit_rate"], [0.5, 1.0])
+    # A and B at 1/2, then A and C at 1/2: B is sold and C is bought
+    np.testing.assert_allclose(periods["turnover"], [1.0, 1.0])
+
+    metrics = portfolio.risk_metrics(periods)
+    assert metrics["cumulative_return"] == pytest.approx(26.0)
+    assert metrics["max_drawdown"] == 0.0
+    assert metrics["hit_rate"] == pytest.approx(0.75)
+
+
+def test_probability_weighted_portfolio_and_cash():
+    dates, tickers, stock_change, index_change, selected, probabilities = make_rows()
+    selected[3:] = False
+    periods = portfolio.simulate(
+        dates, tickers, stock_change, index_change, selected, probabilities, weighting="probability"
+    )
+    np.testing.assert_allclose(periods["portfolio_return"], [(0.6 * 20 - 0.9 * 10) / 1.5, 0.0])
+    assert periods["n_holdings"].tolist() == [2, 0]
+    assert np.isnan(periods["hit_rate"].iloc[1])
+    np.testing.assert_allclose(periods["turnover"], [1.0, 1.0])
+
+
+def test_drawdown():
+    periods = pd.DataFrame(
+        {"portfolio_return": [10.0, -50.0, 20.0], "index_return": 0.0, "n_holdings": 1,
+         "hit_rate": 1.0, "turnover": 0.0}
+    )
+    assert portfolio.risk_metrics(periods)["max_drawdown"] == pytest.approx(-50.0)
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import predictions
+from cache_manager import CacheManager
+
+
+class CountingModel:
+    """Scores rows by their first feature, and counts the rows it scored"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        return np.column_stack([1 - X[:, 0], X[:, 0]])
+
+
+def test_lru_cache():
+    cache = predictions.LRUCache(maxsize=2)
+    cache.put_many([("a", 1), ("b", 2)])
+    assert cache.get_many(["a", "c"]) == {"a": 1}
+    cache.put_many([("c", 3)])
+    # b was the least recently used
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+
+def test_predictor_batches_and_caches():
+    forward = predictions.ForwardSample(["A", "B", "C"], np.array([[0.1], [0.5], [0.9]]))
+    model = CountingModel()
+    predictor = predictions.Predictor()
+
+    assert predictor.predict_tickers(model, "v1", forward, ["A", "C", "X"]) == {"A": 0.1, "C": 0.9}
+    assert predictor.predict_tickers(model, "v1", forward, ["A", "B", "C"]) == {
+        "A": 0.1, "B": 0.5, "C": 0.9
+    }
+    # One call for A and C, then one for B only
+    assert model.calls == [2, 1]
+    # A new model version is scored again
+    predictor.predict_tickers(model, "v2", forward, ["A", "B", "C"])
+    assert model.calls == [2, 1, 3]
+
+
+def test_rewritten_forward_sample_is_scored_again(tmp_path, monkeypatch):
+    """
+    When the forward file is rewritten, its tickers are scored from the new matrix, not the cache
+    """
+    pytest.importorskip("flask")
+    import app
+    from feature_store import FeatureStore
+
+    columns = ["Unix", "Ticker", "Price", "stock_p_change", "SP500", "SP500_p_change", "f0"]
+    data = pd.DataFrame([[0, "A", 1.0, 1.0, 1.0, 0.0, 0.0]], columns=columns,
+                        index=pd.DatetimeIndex(["2010-01-01"], name="Date"))
+    store = FeatureStore(data)
+    forward_file = tmp_path / "forward_sample.csv"
+    monkeypatch.setitem(app.config, "forward_file", str(forward_file))
+    monkeypatch.setattr(app, "cache", CacheManager())
+    predictor = predictions.Predictor()
+    model = CountingModel()
+
+    def score(f0, mtime):
+        pd.DataFrame({"Ticker": ["A"], "f0": [f0]}).to_csv(forward_file, index=False)
+        os.utime(forward_file, (mtime, mtime))
+        return predictor.predict_tickers(model, "v1", app.load_forward(store), ["A"])["A"]
+
+    assert score(0.25, 1_000_000) == 0.25
+    assert score(0.75, 2_000_000) == 0.75
+    assert model.calls == [1, 1]
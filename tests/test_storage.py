@@ -0,0 +1,151 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+
+
+def make_keystats(n_rows=20):
+    return pd.DataFrame({
+        "Date": pd.date_range("2005-01-03", periods=n_rows).strftime("%Y-%m-%d"),
+        "Unix": np.arange(n_rows) * 86400.0,
+        "Ticker": ["aa", "bb"] * (n_rows // 2),
+        "Price": np.linspace(10, 20, n_rows),
+        "stock_p_change": np.linspace(-5, 5, n_rows),
+        "SP500": 1000.0,
+        "SP500_p_change": 1.5,
+        "Market Cap": np.linspace(1e9, 2e9, n_rows),
+        "Beta": np.nan,
+    })
+
+
+def test_keystats_round_trip(tmp_path):
+    path = str(tmp_path / "keystats.csv")
+    df = make_keystats()
+    storage.save_keystats(df, path)
+    assert os.path.exists(path) and os.path.exists(storage.columnar_path(path))
+
+    loaded = storage.load_keystats(path, index_col="Date")
+    assert isinstance(loaded.index, pd.DatetimeIndex)
+    assert loaded["Ticker"].dtype == "category"
+    assert loaded["Market Cap"].dtype == np.float32
+    assert loaded["Price"].dtype == np.float64
+    # Same columns, in the same order, as reading the CSV
+    assert list(loaded.columns) == list(pd.read_csv(path, index_col="Date").columns)
+    np.testing.assert_allclose(loaded["Market Cap"], df["Market Cap"], rtol=1e-7)
+
+
+def test_newer_csv_wins(tmp_path):
+    """
+    If the CSV has been replaced since the Parquet file was written, the CSV is loaded
+    """
+    path = str(tmp_path / "keystats.csv")
+    storage.save_keystats(make_keystats(), path)
+    make_keystats(10).to_csv(path, index=False)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert len(storage.load_keystats(path)) == 10
+
+
+def test_chunk_writer(tmp_path):
+    path = str(tmp_path / "keystats.csv")
+    df = make_keystats(20)
+    with storage.KeystatsChunkWriter(path) as writer:
+        for start in range(0, 20, 6):
+            writer.write(df.iloc[start:start + 6])
+    assert writer.n_rows == 20
+
+    loaded = storage.load_keystats(path)
+    assert list(loaded["Ticker"]) == list(df["Ticker"])
+    pd.testing.assert_frame_equal(
+        pd.read_csv(path), df, check_dtype=False
+    )
+
+
+def test_interrupted_chunk_writer(tmp_path):
+    """
+    An interrupted write leaves the previous Parquet file (or none), never a truncated one
+    """
+    path = str(tmp_path / "keystats.csv")
+    df = make_keystats(20)
+    with pytest.raises(KeyboardInterrupt):
+        with storage.KeystatsChunkWriter(path) as writer:
+            writer.write(df.iloc[:10])
+            raise KeyboardInterrupt
+    assert os.listdir(tmp_path) == ["keystats.csv"]
+    assert len(storage.load_keystats(path)) == 10
+
+    storage.save_keystats(df, path)
+    with pytest.raises(KeyboardInterrupt):
+        with storage.KeystatsChunkWriter(path) as writer:
+            writer.write(df.iloc[:10])
+            raise KeyboardInterrupt
+    assert sorted(os.listdir(tmp_path)) == ["keystats.csv", "keystats.parquet"]
+    assert len(pd.read_parquet(storage.columnar_path(path))) == 20
+
+
+def test_price_store(tmp_path):
+    """
+    A saved price matrix is memory-mapped, with O(1) lookups and zero-copy columns
+    """
+    from price_store import PriceStore
+
+    dates = pd.bdate_range("2015-01-01", periods=30)
+    df = pd.DataFrame(
+        {"INFY": np.linspace(1, 2, 30), "TCS": np.linspace(3, 4, 30)}, index=dates
+    )
+    df.iloc[3, 1] = np.nan
+    df.index.name = "Date"
+    path = str(tmp_path / "indian_stock_prices.csv")
+    storage.save_prices(df, path)
+
+    store = storage.load_price_store(path)
+    assert isinstance(store.prices, np.memmap)
+    assert store.shape == (30, 2)
+    assert store.price("2015-01-02", "TCS") == np.float32(df.loc["2015-01-02", "TCS"])
+    assert np.isnan(store.price(dates[3], "TCS"))
+
+    column = store.column("INFY")
+    assert np.shares_memory(column, store.prices) and column.flags["C_CONTIGUOUS"]
+    frame = store.to_frame()
+    assert np.shares_memory(frame["TCS"].to_numpy(), store.prices)
+    pd.testing.assert_frame_equal(frame, df.astype(np.float32), check_freq=False)
+
+    # A newer CSV is loaded instead of the stale store
+    df.iloc[:10].to_csv(path)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert not isinstance(storage.load_price_store(path).prices, np.memmap)
+    assert storage.load_price_store(path).shape == (10, 2)
+
+
+def test_price_store_is_replaced_atomically(tmp_path):
+    """
+    Saving a new version does not change a store which is already memory-mapped
+    """
+    from price_store import PriceStore, store_path
+
+    dates = pd.bdate_range("2015-01-01", periods=30, name="Date")
+    df = pd.DataFrame({"INFY": np.linspace(1, 2, 30)}, index=dates)
+    path = str(tmp_path / "stock_prices.csv")
+    storage.save_prices(df, path)
+    mapped = storage.load_price_store(path)
+
+    refreshed = pd.DataFrame({"INFY": np.linspace(5, 6, 40)},
+                             index=pd.bdate_range("2015-01-01", periods=40, name="Date"))
+    storage.save_prices(refreshed, path)
+    np.testing.assert_array_equal(mapped.column("INFY"), df["INFY"].to_numpy(dtype=np.float32))
+    assert storage.load_price_store(path).shape == (40, 1)
+    assert not [name for name in os.listdir(store_path(path)) if name.endswith(".tmp")]
+    assert PriceStore.open(store_path(path)).price("2015-01-01", "INFY") == 5
+
+
+def test_csv_date_format():
+    """
+    Dates are formatted as pandas writes them to CSV: with the time of day only if one of them has one
+    """
+    dates = pd.to_datetime(["2015-01-01", "2015-01-02"])
+    assert dates.strftime(storage.csv_date_format(dates)).tolist() == ["2015-01-01", "2015-01-02"]
+    dates = pd.to_datetime(["2015-01-01", "2007-07-11 05:59:28"], format="ISO8601")
+    assert dates.strftime(storage.csv_date_format(dates)).tolist() == [
+        "2015-01-01 00:00:00", "2007-07-11 05:59:28"
+    ]
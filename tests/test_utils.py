@@ -43,3 +43,89 @@ def test_data_string_to_float():
         utils.data_string_to_float("10k")
     with pytest.raises(ValueError):
         utils.data_string_to_float("2KB")
+
+
+def test_data_strings_to_floats():
+    """
+    The batch converter must agree with data_string_to_float, with NaN instead of 'N/A'
+    """
+    import numpy as np
+
+    strings = ["asdfNaN", ">N/A\n</", ">0", "-3", "4K", "2M", "0.07B", "-100.1K", "-0.1M",
+               "-0.02B", "-0.00", "0.00", "0M", "010K"]
+    expected = [
+        np.nan if value == "N/A" else value
+        for value in map(utils.data_string_to_float, strings)
+    ]
+    np.testing.assert_array_equal(utils.data_strings_to_floats(strings), expected)
+
+    values = utils.data_strings_to_floats([["1.5B", None], ["N/A", "7"]])
+    assert values.dtype == np.float64
+    np.testing.assert_array_equal(values, [[1.5e9, np.nan], [np.nan, 7]])
+
+    for invalid in [">0x", "10k", "2KB"]:
+        with pytest.raises(ValueError):
+            utils.data_strings_to_floats(["1", invalid])
+
+    # A single string (or a single character) must not be modified by stripping its suffix and sign
+    for single in ["12345678901234567K", "74e86K", "-M8476", "-2.5M", "7"]:
+        assert utils.data_strings_to_floats([single])[0] == utils.data_string_to_float(single)
+    for invalid in ["4KM", "2KB"]:
+        with pytest.raises(ValueError):
+            utils.data_strings_to_floats([invalid])
+
+    # The regex captures any whitespace after N/A, including non-ASCII whitespace
+    values = utils.data_strings_to_floats([["1.5K", "N/A\xa0"], ["N/A\n ", None], ["-2M", "3\u2009"]])
+    np.testing.assert_array_equal(values, [[1500, np.nan], [np.nan, np.nan], [-2e6, 3]])
+    with pytest.raises(ValueError):
+        utils.data_strings_to_floats(["1", "N\xa0A"])
+
+
+def test_find_consecutive_duplicates():
+    """
+    Runs of equal neighbouring values are reported once, except zeros and the excluded columns
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(
+        {
+            "Ticker": ["a", "b", "c"],
+            "Price": [5.0, 1.0, 2.0],
+            "x": [5.0, 0.0, 1.0],
+            "y": [3.0, 0.0, 1.0],
+            "z": [3.0, 2.0, 1.0],
+            "w": [3.0, 7.0, np.nan],
+        }
+    )
+    original = df.copy()
+    duplicates = utils.find_consecutive_duplicates(df)
+    assert duplicates["row"].tolist() == [0, 2]
+    assert duplicates["columns"].tolist() == [("y", "z", "w"), ("x", "y", "z")]
+    assert duplicates["value"].tolist() == [3.0, 1.0]
+    pd.testing.assert_frame_equal(df, original)
+
+    assert utils.duplicate_error_check(df.iloc[[1]]).empty
+
+
+def test_row_accumulator():
+    """
+    RowAccumulator must grow past its initial capacity, merge chunks and survive pickling
+    """
+    import pickle
+    import numpy as np
+
+    rows = utils.RowAccumulator(["Ticker", "a", "b"], numeric_columns=["a", "b"], capacity=2)
+    for i in range(5):
+        rows.append([f"t{i}", i, "N/A" if i == 3 else i / 2])
+    assert len(rows) == 5
+
+    chunk = pickle.loads(pickle.dumps(rows))
+    rows.extend(chunk)
+    df = rows.to_frame()
+    assert list(df.columns) == ["Ticker", "a", "b"]
+    assert len(df) == 10
+    assert list(df["Ticker"][:5]) == list(df["Ticker"][5:]) == ["t0", "t1", "t2", "t3", "t4"]
+    assert df["a"].dtype == np.float64
+    assert np.isnan(df["b"][3]) and np.isnan(df["b"][8])
+    assert df["b"].sum() == 2 * (0 + 0.5 + 1 + 2)
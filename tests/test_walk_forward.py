@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import walk_forward
+
+PARAMS = {"n_estimators": 10, "random_state": 0}
+
+
+def make_dataset(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 6 * 365, n), unit="D")
+    X = rng.normal(size=(n, 3))
+    z = np.column_stack([X[:, 0] * 20 + rng.normal(0, 10, n), rng.normal(5, 5, n)])
+    y = z[:, 0] - z[:, 1] >= 10
+    return X, y, z, pd.DatetimeIndex(dates)
+
+
+def test_folds_do_not_train_on_unknown_labels():
+    _, _, _, dates = make_dataset()
+    folds = walk_forward.walk_forward_folds(dates)
+    assert [period.year for period, _, _ in folds] == [2012, 2013, 2014, 2015]
+    for period, train, test in folds:
+        assert dates[train].max() + walk_forward.LABEL_HORIZON < period.start_time
+        assert (dates[test].year == period.year).all()
+
+    # A window of w years holds the w years of rows before the label horizon
+    for window in [1, 2]:
+        rolling = walk_forward.walk_forward_folds(dates, window=window)
+        assert [period.year for period, _, _ in rolling] == [2012, 2013, 2014, 2015]
+        for period, train, _ in rolling:
+            assert dates[train].max() + walk_forward.LABEL_HORIZON < period.start_time
+            years = set(dates[train].year)
+            assert max(years) == period.year - 2 and min(years) >= period.year - 1 - window
+
+    with pytest.raises(ValueError):
+        walk_forward.walk_forward_folds(dates, window=0)
+
+
+def test_parallel_folds_match_sequential():
+    X, y, z, dates = make_dataset()
+    sequential = walk_forward.walk_forward_backtest(X, y, z, dates, PARAMS, n_jobs=1)
+    parallel = walk_forward.walk_forward_backtest(X, y, z, dates, PARAMS, n_jobs=2)
+    pd.testing.assert_frame_equal(sequential, parallel)
+    assert list(sequential.index.year) == [2012, 2013, 2014, 2015]
+    summary = walk_forward.summarize(sequential)
+    assert summary["total_trades"] == sequential["n_trades"].sum()
+
+
+def test_warm_start():
+    X, y, z, dates = make_dataset()
+    results = walk_forward.walk_forward_backtest(
+        X, y, z, dates, PARAMS, warm_start=True, trees_per_period=5
+    )
+    assert len(results) == 4
+    with pytest.raises(ValueError):
+        walk_forward.walk_forward_backtest(X, y, z, dates, PARAMS, window=2, warm_start=True)
@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+
+
 def data_string_to_float(number_string):
     """
     The result of our regex search is a number stored as a string, but we need a float.
@@ -24,43 +28,165 @@ def data_string_to_float(number_string):
         return float(number_string)
 
 
-def duplicate_error_check(df):
+# The multipliers of the unit suffixes of our regex captures, e.g '25M'
+SUFFIX_MULTIPLIERS = {"K": 1e3, "M": 1e6, "B": 1e9}
+# The same, as a lookup table indexed by the last byte of a string
+_SUFFIX_TABLE = np.ones(256)
+for _suffix, _multiplier in SUFFIX_MULTIPLIERS.items():
+    _SUFFIX_TABLE[ord(_suffix)] = _multiplier
+
+
+def data_strings_to_floats(number_strings):
     """
-    A common symptom of failed parsing is when there are consecutive duplicate values. This function was used
-    to find the duplicates and tweak the regex. Any remaining duplicates are probably coincidences.
-    :param df: the dataframe to be checked
-    :return: Prints out a list of the rows containing duplicates, as well as the duplicated values.
+    The batch version of data_string_to_float, for many regex captures at once: the units are looked up
+    in SUFFIX_MULTIPLIERS and the numbers are parsed by NumPy, without a Python call per string.
+    :param number_strings: array-like (of any shape) of the string outputs of our regex, with None for
+                           values which were not found.
+    :return: float64 array of the same shape, with NaN for missing values ('N/A', 'NaN' or None).
+             Raises ValueError if a string is not a number, as data_string_to_float does.
+    """
+    # Our regex captures are almost always ASCII, so they are stored as bytes. None is stored as b'None'.
+    # Captures with other characters (e.g 'N/A\xa0', as the regex allows any whitespace after N/A) are
+    # stored as b'' and left to data_string_to_float.
+    try:
+        strings = np.array(number_strings, dtype=bytes)
+        non_ascii = None
+    except UnicodeEncodeError:
+        captures = np.array(number_strings, dtype=object)
+        non_ascii = np.array([s is not None and not s.isascii() for s in captures.ravel()])
+        strings = np.where(non_ascii.reshape(captures.shape), "", captures).astype(bytes)
+    shape = strings.shape
+    strings = strings.ravel()
+    n_strings = len(strings)
+    if n_strings == 0:
+        return np.empty(shape)
+
+    # View the fixed-width strings as a (characters x strings) array of bytes, which is zero padded, so
+    # that each character position is a contiguous row, processed for all of the strings at once. It is
+    # always a copy (a transpose of one string would be a view), as the suffix and sign are zeroed in it.
+    width = strings.dtype.itemsize
+    codes = strings.view(np.uint8).reshape(n_strings, width).T.copy()
+
+    # Missing values contain 'N/A' or 'NaN' (or are None), zeros are '>0'
+    missing = np.zeros(n_strings, dtype=bool)
+    for token in [b"N/A", b"NaN"]:
+        found = codes[: width - len(token) + 1] == token[0]
+        for offset in range(1, len(token)):
+            found &= codes[offset : width - len(token) + 1 + offset] == token[offset]
+        missing |= found.any(axis=0)
+    missing |= strings == b"None"
+    zero = strings == b">0"
+
+    # Look up the multiplier of the unit suffix, and drop the suffix.
+    last = np.maximum(np.count_nonzero(codes, axis=0) - 1, 0)
+    rows = np.arange(n_strings)
+    last_codes = codes[last, rows]
+    multipliers = _SUFFIX_TABLE[last_codes]
+    codes[last, rows] = np.where(multipliers == 1, last_codes, 0)
+
+    # Plain decimals ('-123.45') are parsed from their digits: the mantissa and the powers of ten are
+    # exact, so mantissa / 10 ** decimals is the correctly rounded value, as float() returns it.
+    minus = codes[0] == ord("-")
+    codes[0, minus] = 0
+    mantissa = np.zeros(n_strings, dtype=np.int64)
+    n_digits = np.zeros(n_strings, dtype=np.int32)
+    decimals = np.zeros(n_strings, dtype=np.int32)
+    n_dots = np.zeros(n_strings, dtype=np.int32)
+    plain = np.ones(n_strings, dtype=bool)
+    for column in codes:
+        digit = column - np.uint8(ord("0"))  # Wraps around below '0', so digits are the values <= 9
+        is_digit = digit <= 9
+        mantissa *= np.uint8(1) + np.uint8(9) * is_digit
+        mantissa += digit * is_digit
+        n_digits += is_digit
+        decimals += is_digit & (n_dots > 0)
+        is_dot = column == ord(".")
+        n_dots += is_dot
+        plain &= is_digit | is_dot | (column == 0)
+    values = mantissa / 10.0**decimals
+    values[minus] = -values[minus]
+    values *= multipliers
+
+    # Anything else (e.g '1e5') is left to data_string_to_float, which raises ValueError if it is not
+    # a number. Missing and zero values are set afterwards.
+    other = ~(plain & (n_dots <= 1) & (n_digits > 0) & (n_digits <= 15) | missing | zero)
+    if non_ascii is not None:
+        other |= non_ascii
+    if other.any():
+        if non_ascii is not None:
+            fallback = captures.ravel()[other].tolist()
+        else:
+            fallback = [s.decode() for s in strings[other].tolist()]
+        values[other] = [
+            np.nan if value == "N/A" else value for value in map(data_string_to_float, fallback)
+        ]
+    values[zero] = 0
+    values[missing] = np.nan
+    return values.reshape(shape)
+
+
+# Some columns often (correctly) have the same value as other columns, so they are not audited.
+DUPLICATE_CHECK_EXCLUDED_COLUMNS = [
+    "Unix",
+    "Price",
+    "stock_p_change",
+    "SP500",
+    "SP500_p_change",
+    "Float",
+    "200-Day Moving Average",
+    "Short Ratio",
+    "Operating Margin",
+]
+
+
+def find_consecutive_duplicates(df, exclude=DUPLICATE_CHECK_EXCLUDED_COLUMNS):
     """
-    # Some columns often (correctly) have the same value as other columns. Remove these.
-    df.drop(
-        [
-            "Unix",
-            "Price",
-            "stock_p_change",
-            "SP500",
-            "SP500_p_change",
-            "Float",
-            "200-Day Moving Average",
-            "Short Ratio",
-            "Operating Margin",
-        ],
-        axis=1,
-        inplace=True,
+    A common symptom of failed parsing is when there are consecutive duplicate values, i.e a row has the
+    same value in neighbouring columns. Each column is compared with the next one for all rows at once.
+    A duplicate value of zero is quite common, so it is not reported.
+    :param df: the dataframe to be checked, which is not modified
+    :param exclude: the columns which are not checked (nor compared across)
+    :return: a dataframe with a row for each run of consecutive duplicates: the row number in df, the
+             columns of the run (a tuple), and the duplicated value.
+    """
+    numeric = df.drop(columns=exclude, errors="ignore").select_dtypes("number")
+    columns = np.array(numeric.columns, dtype=object)
+    X = numeric.to_numpy(dtype=np.float64)
+
+    # same[i, j] is whether X[i, j] == X[i, j + 1], padded with False on both sides so that every run
+    # has a start and an end.
+    same = np.zeros((len(X), max(X.shape[1] + 1, 1)), dtype=bool)
+    same[:, 1:-1] = (X[:, 1:] == X[:, :-1]) & (X[:, 1:] != 0)
+    # np.nonzero returns the starts and ends in the same (row-major) order, so they pair up.
+    rows, starts = np.nonzero(same[:, 1:] & ~same[:, :-1])
+    _, ends = np.nonzero(same[:, :-1] & ~same[:, 1:])
+
+    return pd.DataFrame(
+        {
+            "row": rows,
+            "columns": [tuple(columns[start:end + 1]) for start, end in zip(starts, ends)],
+            "value": X[rows, starts],
+        }
     )
 
-    for i in range(len(df)):
-        # Check if there are any duplicates.
-        if pd.Series(df.iloc[i] == df.iloc[i].shift()).any():
-            duplicates = set(
-                [x for x in list(df.iloc[i]) if list(df.iloc[i]).count(x) > 1]
-            )
-            # A duplicate value of zero is quite common. We want other duplicates.
-            if duplicates != {0}:
-                print(i, df.iloc[i], duplicates, sep="\n")
+
+def duplicate_error_check(df):
+    """
+    This function was used to find the consecutive duplicates (see find_consecutive_duplicates) and
+    tweak the regex. Any remaining duplicates are probably coincidences.
+    :param df: the dataframe to be checked
+    :return: Prints out the rows containing duplicates, as well as the duplicated values, and returns
+             the table of find_consecutive_duplicates.
+    """
+    duplicates = find_consecutive_duplicates(df)
+    for row, group in duplicates.groupby("row", sort=False):
+        print(row, df.iloc[row], set(group["value"]), sep="\n")
+    return duplicates
 
 
 def status_calc(stock, sp500, outperformance=10):
-    """A simple function to classify whether a stock outperformed the S&P500
+    """A simple function to classify whether a stock outperformed the S&P500. For arrays of returns,
+    and for several outperformance levels at once, see the labels module.
     :param stock: stock price
     :param sp500: S&P500 price
     :param outperformance: stock is classified 1 if stock price > S&P500 price + outperformance
@@ -69,3 +195,96 @@ def status_calc(stock, sp500, outperformance=10):
     if outperformance < 0:
         raise ValueError("outperformance must be positive")
     return stock - sp500 >= outperformance
+
+
+class RowAccumulator:
+    """
+    Collects rows column by column, so that a dataframe can be built once at the end instead of appending
+    to it row by row (which is quadratic in the number of rows, and DataFrame.append no longer exists in
+    pandas 2). Numeric columns are stored in preallocated float64 arrays which double in size when full,
+    so they take 8 bytes per value plus at most 2x headroom; 'N/A' is stored as NaN. Other columns
+    (dates, tickers) are stored in lists.
+    """
+
+    def __init__(self, columns, numeric_columns=(), capacity=1024):
+        """
+        :param columns: the column names, in the order in which row values are given.
+        :param numeric_columns: the columns to store as float64.
+        :param capacity: the number of rows to preallocate.
+        """
+        self.columns = list(columns)
+        numeric_columns = set(numeric_columns)
+        self._capacity = max(int(capacity), 1)
+        self._n_rows = 0
+        self._data = {
+            column: np.empty(self._capacity) if column in numeric_columns else []
+            for column in self.columns
+        }
+
+    def __len__(self):
+        return self._n_rows
+
+    def _grow(self, n_rows):
+        """
+        Make room for at least n_rows rows by doubling the numeric arrays.
+        """
+        if n_rows <= self._capacity:
+            return
+        while self._capacity < n_rows:
+            self._capacity *= 2
+        for column, values in self._data.items():
+            if isinstance(values, np.ndarray):
+                grown = np.empty(self._capacity)
+                grown[: self._n_rows] = values[: self._n_rows]
+                self._data[column] = grown
+
+    def append(self, row):
+        """
+        :param row: a list of values, in the order of self.columns
+        """
+        self._grow(self._n_rows + 1)
+        for column, value in zip(self.columns, row):
+            values = self._data[column]
+            if isinstance(values, np.ndarray):
+                values[self._n_rows] = np.nan if value == "N/A" else value
+            else:
+                values.append(value)
+        self._n_rows += 1
+
+    def extend(self, other):
+        """
+        Append all of the rows of another accumulator with the same columns, e.g a chunk from a worker.
+        :param other: a RowAccumulator
+        """
+        self._grow(self._n_rows + len(other))
+        for column, values in self._data.items():
+            other_values = other._data[column][: len(other)]
+            if isinstance(values, np.ndarray):
+                values[self._n_rows : self._n_rows + len(other)] = other_values
+            else:
+                values.extend(other_values)
+        self._n_rows += len(other)
+
+    def __getstate__(self):
+        # Only send the filled part of the arrays between processes.
+        state = self.__dict__.copy()
+        state["_data"] = {
+            column: values[: self._n_rows] for column, values in self._data.items()
+        }
+        state["_capacity"] = max(self._n_rows, 1)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for column, values in self._data.items():
+            if isinstance(values, np.ndarray) and len(values) < self._capacity:
+                self._data[column] = np.resize(values, self._capacity)
+
+    def to_frame(self):
+        """
+        :return: a dataframe with one row per appended row.
+        """
+        return pd.DataFrame(
+            {column: values[: self._n_rows] for column, values in self._data.items()},
+            columns=self.columns,
+        )
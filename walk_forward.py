@@ -0,0 +1,189 @@
+"""
+Walk-forward backtests. Rows are ordered by date and split into calendar periods (years by default);
+each period is predicted by a model trained only on earlier rows, on an expanding or rolling window.
+Because a row's label depends on the price one year after its date, training rows whose label is not
+yet known at the start of the test period are left out (the label horizon).
+Independent folds are fitted in parallel, or, with warm_start, one forest is grown incrementally by
+adding trees for each new period. The result is one row of metrics and returns per test period.
+"""
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, precision_score
+
+import model_factory
+
+# The label of a row compares the returns over this period after its date
+LABEL_HORIZON = pd.Timedelta(days=365)
+
+
+def walk_forward_folds(dates, freq="Y", window=None, label_horizon=LABEL_HORIZON):
+    """
+    :param dates: the date of every row, in any order
+    :param freq: the length of a test period, as a pandas period frequency
+    :param window: train on `window` periods of rows (a rolling window), or on all earlier rows if None
+                   (an expanding window). The window ends where the label horizon starts, so it holds
+                   `window` periods of rows whose labels are known: e.g with yearly periods, window=1
+                   tests 2010 on a model trained on the rows of 2008.
+    :param label_horizon: rows dated less than this before the test period are not trained on
+    :return: list of (period, train_rows, test_rows) tuples, where the rows are positions in dates.
+             Periods without training rows are skipped.
+    """
+    if window is not None and window < 1:
+        raise ValueError("window must be at least one period")
+    dates = pd.DatetimeIndex(dates)
+    order = np.argsort(dates.values, kind="stable")
+    sorted_dates = dates.values[order]
+    periods = pd.period_range(dates.min(), dates.max(), freq=freq)
+
+    folds = []
+    for period in periods:
+        test_start = np.searchsorted(sorted_dates, period.start_time.to_datetime64())
+        test_end = np.searchsorted(sorted_dates, period.end_time.to_datetime64(), side="right")
+        train_end = np.searchsorted(
+            sorted_dates, (period.start_time - label_horizon).to_datetime64()
+        )
+        train_start = 0
+        if window is not None:
+            train_start = np.searchsorted(
+                sorted_dates, ((period - window).start_time - label_horizon).to_datetime64()
+            )
+        if test_end > test_start and train_end > train_start:
+            folds.append((period, order[train_start:train_end], order[test_start:test_end]))
+    return folds
+
+
+def _fit(params, X, y, n_jobs):
+    return model_factory.build_classifier(params, n_jobs=n_jobs).fit(X, y)
+
+
+def _outperform_probability(clf, X):
+    return clf.predict_proba(X)[:, list(clf.classes_).index(True)]
+
+
+def walk_forward_predict(
+    X,
+    y,
+    dates,
+    params,
+    freq="Y",
+    window=None,
+    label_horizon=LABEL_HORIZON,
+    warm_start=False,
+    trees_per_period=None,
+    n_jobs=None,
+):
+    """
+    Predict every period with a model trained on earlier periods.
+    :param X: the features
+    :param y: the boolean labels (the stock outperformed the index)
+    :param dates: the date of every row
+    :param params: the RandomForest hyperparameters, e.g model_factory.PROFILES["baseline"]
+    :param freq, window, label_horizon: see walk_forward_folds
+    :param warm_start: instead of fitting a model per fold, grow one forest, adding trees_per_period
+                       trees (default: a quarter of n_estimators) fitted on the expanded window for
+                       each new period. Only for expanding windows; the folds then run sequentially.
+    :param n_jobs: number of folds fitted in parallel (default model_factory.N_JOBS). With one job,
+                   the trees of each fold are fitted in parallel instead.
+    :return: the folds (see walk_forward_folds) and the out-of-sample probability that each row
+             outperforms, which is NaN for rows outside of the test periods.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y, dtype=bool)
+    # A training window with a single class cannot predict outperformance
+    folds = [fold for fold in walk_forward_folds(dates, freq, window, label_horizon)
+             if len(np.unique(y[fold[1]])) == 2]
+    probabilities = np.full(len(y), np.nan)
+
+    if warm_start:
+        if window is not None:
+            raise ValueError("warm_start needs an expanding window")
+        params = dict(params, warm_start=True)
+        trees_per_period = trees_per_period or max(params.get("n_estimators", 100) // 4, 1)
+        clf = model_factory.build_classifier(params)
+        for i, (_, train, test) in enumerate(folds):
+            if i > 0:
+                clf.set_params(n_estimators=clf.n_estimators + trees_per_period)
+            clf.fit(X[train], y[train])
+            probabilities[test] = _outperform_probability(clf, X[test])
+    else:
+        n_jobs = model_factory.N_JOBS if n_jobs is None else n_jobs
+        if n_jobs == 1:
+            models = [_fit(params, X[train], y[train], None) for _, train, _ in folds]
+        else:
+            models = Parallel(n_jobs=n_jobs)(
+                delayed(_fit)(params, X[train], y[train], 1) for _, train, _ in folds
+            )
+        for clf, (_, _, test) in zip(models, folds):
+            probabilities[test] = _outperform_probability(clf, X[test])
+
+    return folds, probabilities
+
+
+def score_folds(folds, probabilities, y, z, threshold=0.5):
+    """
+    :param folds, probabilities: the result of walk_forward_predict
+    :param y: the boolean labels
+    :param z: 2-D array of the stock's and the index's percentage change, used to compute returns
+    :param threshold: minimum predicted probability for a stock to be bought
+    :return: dataframe with one row of metrics per test period, indexed by the period's start date.
+             Returns are in percent, averaged over the period's trades; a period without trades has
+             zero returns.
+    """
+    y = np.asarray(y, dtype=bool)
+    z = np.asarray(z)
+    results = []
+    for period, train, test in folds:
+        y_test = y[test]
+        y_pred = probabilities[test] >= threshold
+        picked = z[test][y_pred]
+        n_trades = len(picked)
+        stock_return = picked[:, 0].mean() if n_trades else 0.0
+        market_return = picked[:, 1].mean() if n_trades else 0.0
+        results.append({
+            "period": period.start_time,
+            "n_train": len(train),
+            "n_test": len(test),
+            "n_trades": n_trades,
+            "n_hits": int(np.sum(y_pred & y_test)),
+            "accuracy": accuracy_score(y_test, y_pred),
+            "precision": precision_score(y_test, y_pred, zero_division=0),
+            "stock_return": stock_return,
+            "market_return": market_return,
+            "excess_return": stock_return - market_return,
+        })
+    return pd.DataFrame(results).set_index("period") if results else pd.DataFrame()
+
+
+def walk_forward_backtest(X, y, z, dates, params, threshold=0.5, **kwargs):
+    """
+    :param threshold: minimum predicted probability for a stock to be bought
+    :param kwargs: the options of walk_forward_predict
+    :return: dataframe with one row of metrics per test period, see score_folds
+    """
+    folds, probabilities = walk_forward_predict(X, y, dates, params, **kwargs)
+    return score_folds(folds, probabilities, y, z, threshold)
+
+
+def summarize(results):
+    """
+    :param results: the per-period results of walk_forward_backtest
+    :return: dict of the metrics over all test periods. Returns are averaged over all trades.
+    """
+    n_trades = int(results["n_trades"].sum()) if len(results) else 0
+    if n_trades == 0:
+        stock_return = market_return = 0.0
+    else:
+        stock_return = (results["stock_return"] * results["n_trades"]).sum() / n_trades
+        market_return = (results["market_return"] * results["n_trades"]).sum() / n_trades
+    return {
+        "periods": len(results),
+        "accuracy": float((results["accuracy"] * results["n_test"]).sum() / results["n_test"].sum())
+        if len(results) else 0.0,
+        "precision": float(results["n_hits"].sum() / n_trades) if n_trades else 0.0,
+        "total_trades": n_trades,
+        "avg_stock_return": float(stock_return),
+        "avg_market_return": float(market_return),
+        "outperformance": float(stock_return - market_return),
+    }